@@ -1,13 +1,170 @@
 # api/app.py
+import asyncio
+import os
+import sys
+import threading
 import uvicorn
-from fastapi import FastAPI, HTTPException, Response
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any
+from fastapi import Body, Depends, FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 import numpy as np
-from sklearn.ensemble import IsolationForest
+import time
 from datetime import datetime, timezone
 
+import config
+from api.batcher import MicroBatcher, QueueFullError
+from api.dedup import DedupCache, KeyReuseError, event_digest, event_key, request_key
+from api.history import EventHistory
+from api.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, MetricsMiddleware
+from api.procmem import read_memory
+from api.registry import ModelRegistry, valid_tenant
+from api.stream import EventBroadcaster
+from models import codec
+from models.artifact import try_load
+from models.encoder import SimpleEncoder
+from models.engines import build_engine
+from models.features import FeatureEngine
+from models.quantiles import ScoreThresholds
+from models.refresh import ModelBundle, ModelRefresher, Reservoir
+from models.sink import EventSink
+from models.train import train_artifact
 
-app = FastAPI(title="Anomaly Guardian - Ingestion API", version="0.1")
+
+# optional micro-batcher in front of the model (see MICROBATCH_* in config.py)
+batcher = None
+# optional background refit (see RETRAIN_* in config.py); reservoir holds the sampled rows
+refresher = None
+reservoir = None
+# the model loads in a background thread so the server can bind at once; see warm_up()
+bundle = None
+features = None
+ready = threading.Event()
+ready_async = None  # asyncio twin of ``ready`` that /ingest requests wait on
+warmup_error = None
+warmup_seconds = None
+warmup_waiting = 0
+_warmup_lock = threading.Lock()
+started_at = time.monotonic()
+
+
+def swap_bundle(new_bundle):
+    global bundle
+    bundle = new_bundle
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global batcher, refresher, reservoir, ready_async
+    loop = asyncio.get_running_loop()
+    ready_async = asyncio.Event()
+
+    def warm_up_and_signal():
+        if warm_up():
+            loop.call_soon_threadsafe(ready_async.set)
+
+    threading.Thread(target=warm_up_and_signal, name="model-warmup", daemon=True).start()
+    if broadcaster is not None:
+        broadcaster.start()
+    if sink is not None:
+        sink.start()
+    thresholds.start(config.SCORE_SKETCH_SYNC_S)
+    if config.MICROBATCH_ENABLED:
+        batcher = MicroBatcher(
+            partial(annotate_events, copy=False),
+            window_ms=config.MICROBATCH_WINDOW_MS,
+            max_batch=config.MICROBATCH_MAX_SIZE,
+            max_queue=config.MICROBATCH_QUEUE_DEPTH,
+        )
+        await batcher.start()
+    try:
+        yield
+    finally:
+        if batcher is not None:
+            await batcher.stop()
+            batcher = None
+        if refresher is not None:
+            await run_in_threadpool(refresher.stop)
+            refresher = reservoir = None
+        if broadcaster is not None:
+            broadcaster.stop()
+        if history is not None:
+            await run_in_threadpool(history.flush)
+        if sink is not None:
+            await run_in_threadpool(sink.stop)
+        await run_in_threadpool(thresholds.stop)
+
+
+app = FastAPI(title="Anomaly Guardian - Ingestion API", version="0.1", lifespan=lifespan)
+
+# per-stage latency histograms and counters for /metrics; None when METRICS_ENABLED=0
+metrics = Metrics() if config.METRICS_ENABLED else None
+if metrics is not None:
+    app.add_middleware(MetricsMiddleware, metrics=metrics, paths=("/ingest", "/ingest/batch"))
+
+# annotated events served by /events and /stats; None when HISTORY_ENABLED=0
+history = EventHistory(
+    config.HISTORY_MAX_EVENTS,
+    config.HISTORY_RETENTION_S,
+    config.HISTORY_PARTITION_S,
+    config.HISTORY_DIR,
+) if config.HISTORY_ENABLED else None
+
+# SSE fan-out of annotated events on /stream; None when STREAM_ENABLED=0
+broadcaster = EventBroadcaster(
+    config.STREAM_QUEUE_SIZE,
+    config.STREAM_DROP_POLICY,
+    config.STREAM_MAX_CLIENTS,
+    config.STREAM_HEARTBEAT_S,
+) if config.STREAM_ENABLED else None
+
+# rotating segment files of annotated events (NDJSON or Parquet); None unless SINK_DIR is set
+sink = EventSink(
+    config.SINK_DIR,
+    config.SINK_FORMAT,
+    max_segment_bytes=int(config.SINK_SEGMENT_MB * (1 << 20)),
+    max_segment_seconds=config.SINK_SEGMENT_S,
+    flush_interval=config.SINK_FLUSH_INTERVAL_S,
+    max_buffer=config.SINK_BUFFER_EVENTS,
+    fsync=config.SINK_FSYNC,
+) if config.SINK_DIR else None
+
+# live percentiles of recent raw scores; the cut-off and scale when ADAPTIVE_THRESHOLDS=1
+thresholds = ScoreThresholds(
+    config.SCORE_SKETCH_K,
+    config.SCORE_SKETCH_WINDOW,
+    config.THRESHOLD_QUANTILE,
+    config.THRESHOLD_MIN_SAMPLES,
+    adaptive=config.ADAPTIVE_THRESHOLDS,
+    directory=config.SCORE_SKETCH_DIR,
+)
+
+
+def tenant_thresholds():
+    # per-tenant percentiles stay in this worker: no SCORE_SKETCH_DIR sharing
+    return ScoreThresholds(
+        config.SCORE_SKETCH_K,
+        config.SCORE_SKETCH_WINDOW,
+        config.THRESHOLD_QUANTILE,
+        config.THRESHOLD_MIN_SAMPLES,
+        adaptive=config.ADAPTIVE_THRESHOLDS,
+    )
+
+
+# per-tenant models loaded on demand; None unless TENANT_MODEL_DIR is set
+registry = ModelRegistry(
+    config.TENANT_MODEL_DIR,
+    int(config.TENANT_MEMORY_MB * (1 << 20)),
+    config.DETECTOR_ENGINE,
+    tenant_thresholds,
+) if config.TENANT_MODEL_DIR else None
+
+# annotations of recently ingested events, replayed for retries; None when DEDUP_MODE=off
+dedup = DedupCache(config.DEDUP_MAX_ENTRIES, config.DEDUP_TTL_S) if config.DEDUP_MODE != "off" else None
 
 
 # --- Simple Pydantic model for incoming events ---
@@ -19,84 +176,287 @@ class Event(BaseModel):
     ip: str
 
 
-# --- SimpleEncoder (same logic as detector) ---
-class SimpleEncoder:
-    def __init__(self):
-        self.user_map = {}
-        self.event_map = {}
-        self.next_user = 1
-        self.next_event = 1
-
-    def encode(self, event: dict):
-        u = event.get("user", "user_0")
-        if u not in self.user_map:
-            self.user_map[u] = self.next_user
-            self.next_user += 1
-        user_id = self.user_map[u]
-
-        e = event.get("event_type", "unknown")
-        if e not in self.event_map:
-            self.event_map[e] = self.next_event
-            self.next_event += 1
-        event_id = self.event_map[e]
-
-        ip = event.get("ip", "0.0.0.0")
-        try:
-            last_octet = int(ip.strip().split(".")[-1])
-        except Exception:
-            last_octet = 0
+# --- Load the saved model (or build a tiny in-memory one) on startup ---
+encoder = SimpleEncoder()
 
-        try:
-            resp = int(event.get("response_time_ms", 0))
-        except Exception:
-            resp = 0
 
-        return [user_id, event_id, last_octet, resp]
+def fit_missing_artifact():
+    """Fit a model when MODEL_PATH has none.
 
+    Under api.serve (MODEL_SAVE_IF_MISSING=1) the model is also saved, under
+    a file lock: the first worker fits it, the others wait and load that copy
+    instead of each fitting their own.
+    """
+    if not config.MODEL_SAVE_IF_MISSING:
+        return train_artifact(config.TRAINING_DATA_SIZE)
+    import fcntl
 
-# --- Build a tiny in-memory model on startup ---
-encoder = SimpleEncoder()
+    path = config.MODEL_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            train_artifact(seed=42).save(path)  # save() renames into place, never half-written
+    return try_load(path) or train_artifact(config.TRAINING_DATA_SIZE)
+
+
+def load_bundle():
+    """Use the trained artifact from `python -m models.train`; fit only as a fallback.
+
+    The bundle's scorer is the DETECTOR_ENGINE engine: for "iforest" the
+    compiled forest (memory-mapped from the artifact, shared by all workers)
+    or the sklearn model when COMPILED_SCORER=0, which a background refit
+    replaces; for "hst" Half-Space Trees that learn from every scored batch.
+    """
+    global features
+    artifact = try_load(config.MODEL_PATH) or fit_missing_artifact()
+    artifact.restore_encoder(encoder)
+    # rolling per-user/per-IP stats, only if the model was trained with them
+    features = FeatureEngine() if artifact.stream_features else None
+    engine, score_min, score_max = build_engine(config.DETECTOR_ENGINE, artifact, encoder)
+    # the first calls pay for page faults on the mapped arrays and numpy's lazy setup
+    engine.decision_function(np.zeros((config.WARMUP_ROWS, len(artifact.feature_names))))
+    return ModelBundle(
+        engine,
+        score_min,
+        score_max,
+        trained_at=artifact.trained_at,
+        n_rows=artifact.n_rows,
+    )
 
 
-def build_training_and_model():
-    import random
+def warm_up():
+    """Load and warm the model, then start what depends on it; True once ready.
+
+    Runs on a thread from the lifespan; scripts that use this module without
+    a server (benchmarks) call it directly. Safe to call more than once.
+    """
+    global bundle, refresher, reservoir, warmup_error, warmup_seconds
+    with _warmup_lock:
+        if ready.is_set():
+            return True
+        start = time.perf_counter()
+        try:
+            loaded = load_bundle()
+        except Exception as e:
+            warmup_error = str(e) or type(e).__name__
+            print(f"Model warm-up failed: {warmup_error}", file=sys.stderr)
+            return False
+        bundle = loaded
+        # refits only make sense for a batch-fit engine; a streaming one keeps learning
+        if config.RETRAIN_INTERVAL_S > 0 and not bundle.scorer.streaming:
+            reservoir = Reservoir(config.RESERVOIR_SIZE)
+            refresher = ModelRefresher(reservoir, lambda: bundle, swap_bundle)
+            refresher.start()
+        warmup_seconds = round(time.perf_counter() - start, 3)
+        warmup_error = None
+        ready.set()
+        return True
 
-    rows = []
-    for _ in range(500):  # Reduced from 1000 to 500 for faster startup
-        user = f"user_{random.randint(1,20)}"
-        event_type = random.choice(["login_success", "api_access", "password_change"])
-        ip = f"192.168.1.{random.randint(1,240)}"
-        response_time = random.randint(50, 400)
-        rows.append({"user": user, "event_type": event_type, "ip": ip, "response_time_ms": response_time})
-    X = np.array([encoder.encode(r) for r in rows], dtype=float)
-    m = IsolationForest(n_estimators=50, contamination=0.02, random_state=42)  # Reduced estimators
-    m.fit(X)
-    return m
 
+def retry_after():
+    return {"Retry-After": str(config.WARMUP_RETRY_AFTER_S)}
 
-model = build_training_and_model()
 
+async def require_ready():
+    """Hold ingest requests while the model warms up.
 
-def annotate_event(event: dict):
-    x = np.array(encoder.encode(event), dtype=float).reshape(1, -1)
-    score = model.decision_function(x)[0]
-    pred = model.predict(x)[0]
+    Up to WARMUP_QUEUE_MAX requests wait at most WARMUP_WAIT_S; the rest,
+    and everything after a failed warm-up, get 503 with Retry-After.
+    """
+    global warmup_waiting
+    if ready.is_set():
+        return
+    if ready_async is None or warmup_error is not None or warmup_waiting >= config.WARMUP_QUEUE_MAX:
+        raise HTTPException(status_code=503, detail="model is not ready", headers=retry_after())
+    warmup_waiting += 1
     try:
-        raw_score = float(score)
-    except Exception:
-        raw_score = float(np.asarray(score).item())
-    anomaly_score = (raw_score - (-0.5)) / (0.5 - (-0.5))
-    anomaly_score = max(0.0, min(1.0, float(anomaly_score)))
-    anomaly_flag = bool(pred == -1)
-    out = event.copy()
-    out["anomaly_score"] = round(anomaly_score, 4)
-    out["anomaly_flag"] = anomaly_flag
-    # ensure timestamp exists
-    if not out.get("timestamp"):
-        out["timestamp"] = datetime.now(timezone.utc).isoformat()
+        await asyncio.wait_for(ready_async.wait(), config.WARMUP_WAIT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="model is still warming up", headers=retry_after())
+    finally:
+        warmup_waiting -= 1
+
+
+def annotate_events(events: list[dict], copy=True, tenant=None):
+    """Score a list of event dicts with a single decision_function pass.
+
+    With ``copy=False`` the annotations are added to the given dicts in place,
+    for callers that built them just for this call. With ``tenant`` the
+    tenant's own model scores them (loaded on first use, see api/registry.py)
+    and the events are tagged with it; events of a tenant without a model
+    are scored by the default one and not tagged.
+    """
+    if not events:
+        return []
+    model = registry.get(tenant) if tenant is not None else None
+    tag = model.tenant if model is not None else None
+    if model is not None:
+        # tenant models are not refit, so their rows skip the reservoir
+        enc, feats, current, score_thresholds, sample = model.encoder, model.features, model.bundle, model.thresholds, None
+    else:
+        # read the bundle once: a refit may swap it while this call runs
+        enc, feats, current, score_thresholds, sample = encoder, features, bundle, thresholds, reservoir
+    t0 = time.perf_counter()
+    X = enc.encode_many(events)
+    if feats is not None:
+        X = np.hstack([X, feats.transform_many(events, time.time())])
+    if sample is not None:
+        sample.add_many(X)
+    t1 = time.perf_counter()
+    # a streaming engine learns the batch after scoring it
+    scores = current.scorer.score_and_learn(X)
+    # below 0 is what IsolationForest.predict() flags, or, with ADAPTIVE_THRESHOLDS,
+    # below the live THRESHOLD_QUANTILE percentile of recent scores
+    anomaly_scores, flags = score_thresholds.score(scores, current.score_min, current.score_max)
+    if metrics is not None:
+        metrics.observe("encode", t1 - t0)
+        metrics.observe("score", time.perf_counter() - t1)
+        metrics.inc("events_total", len(events))
+        metrics.inc("anomalies_total", int(np.count_nonzero(flags)))
+    now = None
+    out = []
+    for ev, anomaly_score, anomaly_flag in zip(events, anomaly_scores.tolist(), flags.tolist()):
+        annotated = ev.copy() if copy else ev
+        annotated["anomaly_score"] = round(anomaly_score, 4)
+        annotated["anomaly_flag"] = anomaly_flag
+        if tag is not None:
+            annotated["tenant"] = tag
+        # ensure timestamp exists
+        if not annotated.get("timestamp"):
+            if now is None:
+                now = datetime.now(timezone.utc).isoformat()
+            annotated["timestamp"] = now
+        out.append(annotated)
+    first_seq = history.add_many(out) if history is not None else None
+    if broadcaster is not None:
+        broadcaster.publish(out, first_seq)
+    if sink is not None:
+        sink.submit(out)  # only enqueues; the sink's thread writes
     return out
 
 
+def annotate_event(event: dict, copy=True, tenant=None):
+    return annotate_events([event], copy=copy, tenant=tenant)[0]
+
+
+def request_tenant(request: Request):
+    """The ``tenant`` query parameter or X-Tenant header; None without one or without a registry."""
+    if registry is None:
+        return None
+    tenant = request.query_params.get("tenant") or request.headers.get("x-tenant")
+    if tenant is None:
+        return None
+    if not valid_tenant(tenant):
+        raise HTTPException(status_code=400, detail=f"invalid tenant {tenant!r}: use 1-64 letters, digits, '_', '.' or '-'")
+    return tenant
+
+
+def request_idempotency_key(request: Request):
+    """The Idempotency-Key header; None without one or with DEDUP_MODE=off."""
+    if dedup is None:
+        return None
+    key = request.headers.get("idempotency-key")
+    if key is not None and not 0 < len(key) <= 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-255 characters")
+    return key
+
+
+def dedup_keys(events, tenant=None, idempotency_key=None, positions=None):
+    """Dedup cache keys for parsed events, or None when they are not deduplicated.
+
+    A single event uses the Idempotency-Key as is; batch items add their
+    ``positions`` in the request. Without a key, DEDUP_MODE=content keys
+    on the fields of events that carry a timestamp; the others get None.
+    """
+    if dedup is None or not events:
+        return None
+    if idempotency_key is not None:
+        if positions is None:
+            return [request_key(idempotency_key, tenant)]
+        return [request_key(idempotency_key, tenant, i) for i in positions]
+    if config.DEDUP_MODE == "content":
+        keys = [event_key(ev, tenant) for ev in events]
+        return keys if any(key is not None for key in keys) else None
+    return None
+
+
+def claim_keys(keys, events):
+    """dedup.claim_many for parsed ``events``; a reused Idempotency-Key is a 422."""
+    try:
+        return dedup.claim_many(keys, [event_digest(ev) for ev in events])
+    except KeyReuseError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def validation_errors(exc: ValidationError):
+    """Plain, JSON-safe view of a pydantic ValidationError."""
+    return [{"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]} for err in exc.errors()]
+
+
+def fast_event(payload):
+    """Event(**payload).dict() for well-typed payloads, without pydantic.
+
+    Returns None when any field would need pydantic's coercion or error
+    reporting; callers then validate through the Event model as usual.
+    """
+    if type(payload) is not dict:
+        return None
+    timestamp = payload.get("timestamp")
+    user = payload.get("user")
+    event_type = payload.get("event_type")
+    response_time_ms = payload.get("response_time_ms")
+    ip = payload.get("ip")
+    if (
+        (timestamp is not None and type(timestamp) is not str)
+        or type(user) is not str
+        or type(event_type) is not str
+        or type(response_time_ms) is not int
+        or type(ip) is not str
+    ):
+        return None
+    return {
+        "timestamp": timestamp,
+        "user": user,
+        "event_type": event_type,
+        "response_time_ms": response_time_ms,
+        "ip": ip,
+    }
+
+
+def parse_event(payload):
+    """Validate one incoming event dict; raises pydantic's ValidationError."""
+    if config.FAST_CODEC:
+        ev = fast_event(payload)
+        if ev is not None:
+            return ev
+    return Event(**payload).dict()
+
+
+def parse_body(body: bytes):
+    """Decode a raw JSON request body, reporting bad JSON the way FastAPI does."""
+    try:
+        return codec.loads(body)
+    except ValueError as e:
+        error = {"type": "json_invalid", "loc": ("body", getattr(e, "pos", 0)), "msg": "JSON decode error",
+                 "input": {}, "ctx": {"error": getattr(e, "msg", str(e))}}
+        raise RequestValidationError([error], body=body)
+
+
+def dump_timed(content):
+    """codec.dumps, recorded as the "serialize" stage."""
+    start = time.perf_counter()
+    data = codec.dumps(content)
+    if metrics is not None:
+        metrics.observe("serialize", time.perf_counter() - start)
+    return data
+
+
+def json_bytes(content):
+    """Pre-serialized JSON response, skipping FastAPI's encoder pass."""
+    return Response(content=dump_timed(content), media_type="application/json")
+
+
 # --- API routes ---
 @app.get("/")
 def root():
@@ -109,14 +469,444 @@ def health_head():
     return Response(status_code=200)
 
 
-@app.post("/ingest")
-def ingest(event: Event):
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process serves requests, whether or not the model is loaded yet."""
+    return {"status": "ok", "uptime_s": round(time.monotonic() - started_at, 3)}
+
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once the model is loaded and warmed, else 503 with Retry-After."""
+    if ready.is_set():
+        return {"status": "ready", "warmup_s": warmup_seconds}
+    body = {"status": "failed" if warmup_error is not None else "warming", "error": warmup_error}
+    return Response(content=codec.dumps(body), status_code=503, media_type="application/json", headers=retry_after())
+
+
+@app.get("/debug/encoder")
+def debug_encoder():
+    """Vocabulary sizes, overflow and eviction counts of the shared encoder."""
+    return encoder.stats()
+
+
+@app.get("/debug/features")
+def debug_features():
+    """Entities tracked by the rolling feature engine (empty if the model does not use it)."""
+    return features.stats() if features is not None else {}
+
+
+@app.get("/debug/model")
+def debug_model():
+    """The model in use and, when RETRAIN_INTERVAL_S is set, the background refit stats."""
+    current = bundle
+    if current is None:
+        return {"ready": False, "error": warmup_error}
+    out = {"version": current.version, "trained_at": current.trained_at, "n_rows": current.n_rows,
+           **current.scorer.stats()}
+    if refresher is not None:
+        out["refresh"] = refresher.stats()
+    return out
+
+
+@app.get("/debug/stream")
+def debug_stream():
+    """Subscriber count and published/dropped totals of the /stream fan-out."""
+    return broadcaster.stats() if broadcaster is not None else {}
+
+
+@app.get("/debug/sink")
+def debug_sink():
+    """Buffered/written/dropped counts and the open segment of the event sink."""
+    return sink.stats() if sink is not None else {}
+
+
+def metric_gauges():
+    """(name, help, value, labels) gauges sampled when /metrics is scraped."""
+    current = bundle
+    vocab = "Distinct values in the bounded encoder vocabularies."
+    gauges = [
+        ("encoder_vocabulary_size", vocab, len(encoder.users), 'vocabulary="user"'),
+        ("encoder_vocabulary_size", vocab, len(encoder.event_types), 'vocabulary="event_type"'),
+        ("model_ready", "1 once the model is loaded and warmed up.", int(ready.is_set()), ""),
+    ]
+    if current is not None:
+        trained_at = datetime.fromisoformat(current.trained_at)
+        gauges.append(("model_age_seconds", "Seconds since the model in use was trained.",
+                       round(time.time() - trained_at.timestamp(), 3), ""))
+        gauges.append(("model_version", "Model swaps since startup (background refits).", current.version, ""))
+    if batcher is not None:
+        gauges.append(("microbatch_queue_depth", "Events waiting in the micro-batcher.", batcher.qsize(), ""))
+    if broadcaster is not None:
+        gauges.append(("stream_subscribers", "Clients connected to /stream.", len(broadcaster.subscribers), ""))
+        gauges.append(("stream_dropped_events", "Events dropped for slow /stream subscribers.", broadcaster.dropped, ""))
+    if history is not None:
+        gauges.append(("history_events", "Annotated events retained for /events and /stats.", len(history), ""))
+    if sink is not None:
+        stats = sink.stats()
+        gauges.append(("sink_buffered_events", "Annotated events waiting for the sink's flusher.", stats["buffered"], ""))
+        gauges.append(("sink_written_events", "Annotated events written to sink segments.", stats["written"], ""))
+        gauges.append(("sink_dropped_events", "Annotated events dropped because the sink buffer was full.",
+                       stats["dropped"], ""))
+        gauges.append(("sink_lost_events", "Annotated events lost to failed sink writes.", stats["lost"], ""))
+    if registry is not None:
+        stats = registry.stats()
+        gauges.append(("tenant_models_loaded", "Tenant models held in memory.", stats["loaded"], ""))
+        gauges.append(("tenant_models_bytes", "Estimated memory of the loaded tenant models.", stats["used_bytes"], ""))
+        for key in ("hits", "misses", "loads", "evictions", "fallbacks"):
+            gauges.append(("tenant_model_lookups", "Tenant model lookups by outcome since startup.",
+                           stats[key], f'outcome="{key}"'))
+    if dedup is not None:
+        stats = dedup.stats()
+        gauges.append(("dedup_entries", "Annotations held for replaying retried events.", stats["entries"], ""))
+        gauges.append(("dedup_bytes", "Estimated memory of the dedup cache.", stats["bytes"], ""))
+        for key in ("hits", "waits", "misses"):
+            gauges.append(("dedup_lookups", "Dedup cache lookups by outcome since startup.",
+                           stats[key], f'outcome="{key}"'))
+    if refresher is not None:
+        stats = refresher.stats()
+        for key in ("retrains", "failures", "skipped"):
+            gauges.append(("refresh_runs", "Background refits by outcome since startup.", stats[key], f'outcome="{key}"'))
+        if stats["last_fit_seconds"] is not None:
+            gauges.append(("refresh_last_fit_seconds", "Fit time of the latest background refit.",
+                           round(stats["last_fit_seconds"], 3), ""))
+        gauges.append(("refresh_fit_seconds_total", "Fit time of all background refits.",
+                       round(stats["total_fit_seconds"], 3), ""))
+        gauges.append(("reservoir_rows", "Rows held in the refit reservoir.", stats["reservoir"]["filled"], ""))
+        gauges.append(("reservoir_size", "Capacity of the refit reservoir.", stats["reservoir"]["size"], ""))
+        gauges.append(("reservoir_seen", "Rows offered to the refit reservoir since startup.",
+                       stats["reservoir"]["seen"], ""))
+    threshold = thresholds.stats()["threshold"]
+    if threshold is not None:
+        gauges.append(("score_threshold", "Live THRESHOLD_QUANTILE percentile of recent raw scores.", threshold, ""))
+    if features is not None:
+        stats = features.stats()
+        gauges.append(("feature_entities", "Entities tracked by the rolling feature engine.",
+                       stats["users"], 'kind="user"'))
+        gauges.append(("feature_entities", "Entities tracked by the rolling feature engine.",
+                       stats["ips"], 'kind="ip"'))
+    return gauges
+
+
+def metrics_endpoint():
+    """Prometheus text format: stage histograms, counters and gauges of this worker."""
+    return Response(content=metrics.render(metric_gauges()), media_type=METRICS_CONTENT_TYPE)
+
+
+if metrics is not None:
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"])
+
+
+def parse_since(value):
+    """Epoch seconds or an ISO-8601 timestamp (UTC if no offset) -> epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"since must be epoch seconds or an ISO timestamp, got {value!r}")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def list_events(
+    since: str | None = None,
+    cursor: int | None = None,
+    user: str | None = None,
+    event_type: str | None = None,
+    limit: int = 100,
+):
+    """Annotated events from the server-side history, oldest first.
+
+    ``since`` filters on ingest time. Pass the returned ``cursor`` back to get
+    only the events ingested after the previous call; ``more`` means the page
+    was cut at ``limit`` and another call will continue from there.
+    """
+    limit = min(max(limit, 1), config.HISTORY_QUERY_LIMIT)
+    result = history.query(None if since is None else parse_since(since), cursor, user, event_type, limit)
+    return Response(content=codec.dumps(result), media_type="application/json")
+
+
+def event_stats(window: float = 300):
+    """Rolling aggregates over the last ``window`` seconds, with one series point per partition."""
+    window = min(max(window, config.HISTORY_PARTITION_S), config.HISTORY_RETENTION_S or window)
+    return Response(content=codec.dumps(history.stats(window)), media_type="application/json")
+
+
+if history is not None:
+    app.add_api_route("/events", list_events, methods=["GET"])
+    app.add_api_route("/stats", event_stats, methods=["GET"])
+
+
+async def stream_events(
+    request: Request,
+    user: str | None = None,
+    event_type: str | None = None,
+    anomalies_only: bool = False,
+    min_score: float | None = None,
+    cursor: int | None = None,
+):
+    """Server-Sent Events: annotated events as they are scored, flagged ones as "alert".
+
+    Filters are applied on the server. Reconnecting with ``Last-Event-ID``
+    (or ``cursor``) first replays what was missed from the history.
+    """
+    sub = broadcaster.subscribe(user=user, event_type=event_type, anomalies_only=anomalies_only, min_score=min_score)
+    if sub is None:
+        raise HTTPException(status_code=503, detail="too many stream subscribers", headers={"Retry-After": "5"})
+    last_id = request.headers.get("last-event-id")
+    after = int(last_id) if last_id and last_id.isdigit() else cursor
+    backlog = []
+    if after is not None and history is not None:
+        # subscribed first, so nothing falls between the replay and the live events
+        picked, _, _ = await run_in_threadpool(history.select, None, after, user, event_type, config.HISTORY_QUERY_LIMIT)
+        backlog = [(seq, event) for seq, event in picked if sub.matches(event)]
+    return StreamingResponse(
+        broadcaster.messages(sub, backlog, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+if broadcaster is not None:
+    app.add_api_route("/stream", stream_events, methods=["GET"])
+
+
+@app.get("/scores")
+def score_distribution(sketch: bool = False):
+    """Percentiles of recent raw scores and the live threshold; ``sketch=true`` adds the
+    mergeable sketch state (levels of items, level h weighing 2**h)."""
+    return Response(content=codec.dumps(thresholds.stats(sketch=sketch)), media_type="application/json")
+
+
+@app.get("/debug/tenants")
+def debug_tenants():
+    """Loaded tenant models (most recently used first), memory use and cache hit/miss counts."""
+    return registry.stats() if registry is not None else {}
+
+
+@app.get("/debug/dedup")
+def debug_dedup():
+    """Size, memory and hit/miss counts of the cache that answers retried events."""
+    return dedup.stats() if dedup is not None else {}
+
+
+@app.get("/debug/memory")
+def debug_memory():
+    """Memory of the worker process that served this request (see api/serve.py)."""
+    return read_memory()
+
+
+async def score_one(ev: dict, tenant=None, idempotency_key=None):
+    """Annotate a freshly parsed event, or replay the annotation of an earlier copy of it."""
+    keys = dedup_keys([ev], tenant, idempotency_key)
+    if keys is None:
+        return await annotate_one(ev, tenant)
+    (pending,) = claim_keys(keys, [ev])
+    if pending is not None:
+        try:
+            # shielded: timing out must not cancel the first copy's future
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending)), config.DEDUP_WAIT_S)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="an earlier copy of this event is still being scored",
+                                headers={"Retry-After": "1"})
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
     try:
-        ev = event.dict()
-        annotated = annotate_event(ev)
-        return {"success": True, "annotated_event": annotated}
+        annotated = await annotate_one(ev, tenant)
+    except BaseException as e:
+        dedup.release_many(keys, e)
+        raise
+    dedup.put_many(keys, [annotated])
+    return annotated
+
+
+async def annotate_one(ev: dict, tenant=None):
+    """Annotate one event through the batcher or the threadpool.
+
+    Tenant events skip the batcher, whose batches all go to the default model.
+    """
+    if tenant is not None:
+        try:
+            return await run_in_threadpool(annotate_event, ev, copy=False, tenant=tenant)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    if batcher is not None:
+        try:
+            pending = batcher.submit(ev)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=f"ingest queue is full: {e}", headers={"Retry-After": "1"})
+    try:
+        if batcher is not None:
+            return await pending
+        return await run_in_threadpool(annotate_event, ev, copy=False)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def annotate_deduped(events, keys, tenant=None):
+    """annotate_events for the events whose keys are not in the dedup cache; the
+    others get the cached annotation, or None if an earlier copy is still pending."""
+    claims = claim_keys(keys, events)
+    own = [i for i, claim in enumerate(claims) if claim is None]
+    own_keys = [keys[i] for i in own]
+    try:
+        scored = annotate_events([events[i] for i in own], copy=False, tenant=tenant)
+    except BaseException as e:
+        dedup.release_many(own_keys, e)
+        raise
+    # before waiting: a repeat within this batch waits on one of these
+    dedup.put_many(own_keys, scored)
+    out = [None] * len(events)
+    for i, annotated in zip(own, scored):
+        out[i] = annotated
+    deadline = time.monotonic() + config.DEDUP_WAIT_S
+    for i, claim in enumerate(claims):
+        if claim is not None:
+            try:
+                out[i] = claim.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception:
+                pass
+    return out
+
+
+def annotate_items(events: list, tenant=None, idempotency_key=None):
+    """Validate batch items one by one and annotate the valid ones together."""
+    if len(events) > config.MAX_BATCH_EVENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"batch of {len(events)} events exceeds the limit of {config.MAX_BATCH_EVENTS}",
+        )
+
+    start = time.perf_counter()
+    results = [None] * len(events)
+    valid_idx = []
+    valid_events = []
+    for i, item in enumerate(events):
+        if not isinstance(item, dict):
+            error = {"loc": [], "msg": "event must be a JSON object", "type": "dict_type"}
+            results[i] = {"index": i, "success": False, "error": [error]}
+            continue
+        try:
+            ev = parse_event(item)
+        except ValidationError as e:
+            results[i] = {"index": i, "success": False, "error": validation_errors(e)}
+            continue
+        valid_idx.append(i)
+        valid_events.append(ev)
+    if metrics is not None:
+        metrics.observe("parse", time.perf_counter() - start)
+        if len(valid_events) < len(events):
+            metrics.inc("rejected_events_total", len(events) - len(valid_events))
+
+    keys = dedup_keys(valid_events, tenant, idempotency_key, valid_idx)
+    try:
+        if keys is None:
+            annotated = annotate_events(valid_events, copy=False, tenant=tenant)
+        else:
+            annotated = annotate_deduped(valid_events, keys, tenant)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    for i, ann in zip(valid_idx, annotated):
+        if ann is None:
+            error = {"loc": [], "msg": "an earlier copy of this event could not be scored", "type": "duplicate_failed"}
+            results[i] = {"index": i, "success": False, "error": [error]}
+            continue
+        results[i] = {"index": i, "success": True, "annotated_event": ann}
+
+    return {
+        "success": True,
+        "count": len(events),
+        "accepted": len(valid_events),
+        "rejected": len(events) - len(valid_events),
+        "results": results,
+    }
+
+
+# what FastAPI answers for an empty or JSON null body on a required Body(...)
+MISSING_BODY = {"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}
+
+
+def validate_body(payload, start):
+    """The event in a single-event /ingest body, or FastAPI's 422 for it.
+
+    Records the time since ``start`` as the "parse" stage.
+    """
+    if payload is None:
+        raise RequestValidationError([MISSING_BODY], body=None)
+    if not isinstance(payload, dict):
+        error = {"type": "model_attributes_type", "loc": ("body",),
+                 "msg": "Input should be a valid dictionary or object to extract fields from", "input": payload}
+        raise RequestValidationError([error], body=payload)
+    try:
+        ev = parse_event(payload)
+    except ValidationError as e:
+        errors = [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        raise RequestValidationError(errors, body=payload)
+    if metrics is not None:
+        metrics.observe("parse", time.perf_counter() - start)
+    return ev
+
+
+async def ingest(request: Request, payload: Any = Body(...)):
+    # validated here rather than as an Event parameter, so the "parse" stage covers pydantic
+    ev = validate_body(payload, time.perf_counter())
+    annotated = await score_one(ev, request_tenant(request), request_idempotency_key(request))
+    # serialized here, so the "serialize" stage is recorded on this path too
+    return json_bytes({"success": True, "annotated_event": annotated})
+
+
+def ingest_batch(request: Request, events: list = Body(...)):
+    """Annotate many events at once.
+
+    Items are validated one by one; an invalid item is reported at its index
+    and does not fail the rest of the batch. Results keep the request order.
+    """
+    return json_bytes(annotate_items(events, request_tenant(request), request_idempotency_key(request)))
+
+
+# FAST_CODEC=1 variants: parse the raw body with models.codec, skip pydantic
+# for well-typed events and return pre-serialized bytes. Same responses.
+async def ingest_fast(request: Request):
+    tenant = request_tenant(request)
+    idempotency_key = request_idempotency_key(request)
+    body = await request.body()
+    start = time.perf_counter()
+    ev = validate_body(parse_body(body) if body else None, start)
+    annotated = await score_one(ev, tenant, idempotency_key)
+    return json_bytes({"success": True, "annotated_event": annotated})
+
+
+def annotate_batch_body(body: bytes, tenant=None, idempotency_key=None):
+    events = parse_body(body) if body else None
+    if events is None:
+        raise RequestValidationError([MISSING_BODY], body=None)
+    if not isinstance(events, list):
+        error = {"type": "list_type", "loc": ("body",), "msg": "Input should be a valid list", "input": events}
+        raise RequestValidationError([error], body=events)
+    return dump_timed(annotate_items(events, tenant, idempotency_key))
+
+
+async def ingest_batch_fast(request: Request):
+    tenant, idempotency_key = request_tenant(request), request_idempotency_key(request)
+    content = await run_in_threadpool(annotate_batch_body, await request.body(), tenant, idempotency_key)
+    return Response(content=content, media_type="application/json")
+
+
+ingest_deps = [Depends(require_ready)]
+if config.FAST_CODEC:
+    app.add_api_route("/ingest", ingest_fast, methods=["POST"], dependencies=ingest_deps)
+    app.add_api_route("/ingest/batch", ingest_batch_fast, methods=["POST"], dependencies=ingest_deps)
+else:
+    app.add_api_route("/ingest", ingest, methods=["POST"], dependencies=ingest_deps)
+    app.add_api_route("/ingest/batch", ingest_batch, methods=["POST"], dependencies=ingest_deps)
 
 
 # run locally with: uvicorn api.app:app --reload --port 8000
@@ -0,0 +1,78 @@
+# api/batcher.py
+import asyncio
+
+
+class QueueFullError(Exception):
+    """Raised by MicroBatcher.submit() when the pending queue is at capacity."""
+
+
+class MicroBatcher:
+    """Merge concurrent single-event requests into one model call.
+
+    Callers ``await batcher.submit(event)``. A background task takes the first
+    pending event, waits up to ``window_ms`` for more to arrive (or until
+    ``max_batch`` are pending), scores them together with ``score_fn`` in the
+    default executor and resolves every caller's future with its own result.
+    """
+
+    def __init__(self, score_fn, window_ms=2.0, max_batch=256, max_queue=4096):
+        self.score_fn = score_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.max_queue = max(1, max_queue)
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # fail anything still waiting so no request hangs on shutdown
+        while self._queue is not None and not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("batcher stopped"))
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, event: dict):
+        """Queue one event and return a future for its annotated result."""
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((event, fut))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.max_queue} events already pending")
+        return fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.window and self._queue.qsize() + 1 < self.max_batch:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # drop callers that went away (client disconnect cancels the future)
+            batch = [(ev, fut) for ev, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(None, self.score_fn, [ev for ev, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), annotated in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(annotated)
@@ -0,0 +1,181 @@
+# api/client.py
+"""Pooled async client for the ingest API, used by the dashboards and the simulator.
+
+One aiohttp session (keep-alive connection pool of ``concurrency``
+connections) is reused for every call. ``send`` posts events through
+/ingest/batch in chunks of ``batch_size`` and falls back to concurrent
+single-event /ingest calls when the server has no batch endpoint. Every
+request has its own deadline, and a failed request only fails the events it
+carried: results come back per event, in input order, in the same shape as
+the /ingest/batch items.
+
+With ``retries`` > 0, answers of 429 or 503 (queue full, model still
+warming up) are retried after the server's Retry-After. With
+``idempotency``, every request carries an Idempotency-Key that its retries
+reuse, so an event the server did score before answering is not scored
+twice. Both are off by default, so load generators see backpressure as it
+happens and don't fill the server's dedup cache; the dashboards turn them on.
+
+Streamlit scripts are synchronous, so ``SyncIngestClient`` runs an
+IngestClient on a private event loop thread and blocks on its results.
+"""
+import asyncio
+import json
+import threading
+import uuid
+
+import aiohttp
+
+RETRY_STATUSES = (429, 503)
+
+
+class IngestClient:
+    def __init__(self, base_url, concurrency=8, timeout=30.0, batch_size=100, retries=0, max_retry_wait=10.0,
+                 idempotency=False):
+        self.base_url = base_url.rstrip("/")
+        self.retries = max(0, retries)
+        self.idempotency = idempotency
+        self.max_retry_wait = max_retry_wait
+        self.concurrency = max(1, concurrency)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.batch_size = max(1, batch_size)
+        self.batch_supported = None  # unknown until /ingest/batch has answered once
+        self.session = None
+        self._slots = None
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            # requests wait here, so the deadline only runs once a connection is free
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def post(self, path, body):
+        """POST raw JSON bytes; returns (status, response bytes). Raises on network errors/timeouts."""
+        await self.open()
+        headers = {"Content-Type": "application/json"}
+        if self.idempotency:
+            headers["Idempotency-Key"] = uuid.uuid4().hex
+        for attempt in range(self.retries + 1):
+            async with self._slots:
+                async with self.session.post(self.base_url + path, data=body, headers=headers) as resp:
+                    status, data = resp.status, await resp.read()
+                    retry_after = resp.headers.get("Retry-After")
+            if status not in RETRY_STATUSES or attempt == self.retries:
+                return status, data
+            # waits without holding a connection slot
+            await asyncio.sleep(retry_delay(retry_after, self.max_retry_wait))
+
+    async def send(self, events):
+        """Annotate ``events``; one result dict per event, in order.
+
+        Successful items are ``{"index", "success": True, "annotated_event"}``,
+        failed ones ``{"index", "success": False, "error"}``.
+        """
+        if not events:
+            return []
+        results = [None] * len(events)
+        chunks = [(i, events[i:i + self.batch_size]) for i in range(0, len(events), self.batch_size)]
+        if self.batch_supported is None and len(chunks) > 1:
+            # find out whether /ingest/batch exists before fanning out
+            await self._send_chunk(*chunks[0], results)
+            chunks = chunks[1:]
+        await asyncio.gather(*(self._send_chunk(start, chunk, results) for start, chunk in chunks))
+        return results
+
+    async def _send_chunk(self, start, chunk, results):
+        if self.batch_supported is False or (len(chunk) == 1 and self.batch_supported is None):
+            await asyncio.gather(*(self._send_one(start + i, event, results) for i, event in enumerate(chunk)))
+            return
+        try:
+            status, data = await self.post("/ingest/batch", json.dumps(chunk).encode())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._fail(results, start, len(chunk), error_text(e))
+            return
+        if status in (404, 405):
+            self.batch_supported = False
+            await self._send_chunk(start, chunk, results)
+            return
+        self.batch_supported = True
+        if status >= 400:
+            self._fail(results, start, len(chunk), f"HTTP {status}: {data[:200].decode(errors='replace')}")
+            return
+        try:
+            items = [(start + item["index"], item) for item in json.loads(data)["results"]]
+            if any(not start <= index < start + len(chunk) for index, _ in items):
+                raise ValueError("result index out of range")
+        except (ValueError, KeyError, TypeError) as e:
+            self._fail(results, start, len(chunk), f"unexpected response: {error_text(e)}")
+            return
+        for index, item in items:
+            results[index] = {**item, "index": index}
+
+    async def _send_one(self, index, event, results):
+        try:
+            status, data = await self.post("/ingest", json.dumps(event).encode())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            results[index] = {"index": index, "success": False, "error": error_text(e)}
+            return
+        if status >= 400:
+            results[index] = {"index": index, "success": False,
+                              "error": f"HTTP {status}: {data[:200].decode(errors='replace')}"}
+            return
+        try:
+            annotated = json.loads(data)["annotated_event"]
+        except (ValueError, KeyError, TypeError) as e:
+            results[index] = {"index": index, "success": False, "error": f"unexpected response: {error_text(e)}"}
+            return
+        results[index] = {"index": index, "success": True, "annotated_event": annotated}
+
+    @staticmethod
+    def _fail(results, start, n, error):
+        for i in range(start, start + n):
+            results[i] = {"index": i, "success": False, "error": error}
+
+
+def retry_delay(retry_after, max_wait):
+    """Seconds to wait from a Retry-After header (seconds form; 1 s if absent or a date)."""
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = 1.0
+    return min(max(delay, 0.0), max_wait)
+
+
+def error_text(exc):
+    if isinstance(exc, asyncio.TimeoutError):
+        return "request timed out"
+    return str(exc) or type(exc).__name__
+
+
+class SyncIngestClient:
+    """Blocking facade over IngestClient for synchronous callers (Streamlit)."""
+
+    def __init__(self, base_url, concurrency=8, timeout=30.0, batch_size=100, retries=0, idempotency=False):
+        self.client = IngestClient(base_url, concurrency, timeout, batch_size, retries=retries, idempotency=idempotency)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="ingest-client", daemon=True)
+        self._thread.start()
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def send(self, events):
+        return self._call(self.client.send(list(events)))
+
+    def close(self):
+        self._call(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
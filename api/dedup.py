@@ -0,0 +1,168 @@
+# api/dedup.py
+"""Bounded, time-limited cache of annotations for retried /ingest events.
+
+Clients that retry on 5xx/429 (the dashboards' requests sessions do) can
+resend an event the server already scored, which would count it twice and
+learn it twice. Each event gets a key, either from the client's
+``Idempotency-Key`` or from a hash of its content; only events with a
+timestamp get a content key, since identical events without one are
+normal traffic, not resends. Entries also keep a digest of the event, so
+reusing a key for a different event is refused. The first request to
+claim a key scores the event and stores the annotation. Later requests with
+the key get the stored annotation back without scoring, until ``ttl``
+seconds have passed. A retry that arrives while the first request is still
+scoring waits for that result.
+
+Keys are kept as 16-byte digests and annotations as JSON bytes, so memory
+is bounded by ``max_entries``. Entries expire in insertion order; once the
+cache is full the oldest entries are dropped.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from models import codec
+
+# rough per-entry cost of the dict slot, the key and the tuple, on top of the annotation bytes
+ENTRY_OVERHEAD = 200
+
+
+def digest(*parts):
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).digest()
+
+
+class KeyReuseError(ValueError):
+    """An idempotency key came back with a different event than the one it was first used for."""
+
+
+def event_digest(event):
+    """Digest of a parsed event's fields."""
+    return digest(str(event.get("timestamp")), event["user"], event["event_type"], str(event["response_time_ms"]),
+                  event["ip"])
+
+
+def event_key(event, tenant=None):
+    """Key for ``event`` from its fields, or None without a timestamp to tell resends from repeats."""
+    if not event.get("timestamp"):
+        return None
+    return digest(tenant or "", event_digest(event).hex())
+
+
+def request_key(idempotency_key, tenant=None, index=None):
+    """Key from a client's Idempotency-Key; a batch's items get one each, by position."""
+    return digest(tenant or "", idempotency_key, "" if index is None else str(index))
+
+
+class DedupCache:
+    def __init__(self, max_entries=100_000, ttl=600.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, event digest, annotation JSON bytes), oldest first
+        self.pending = {}  # key -> (event digest, Future of an annotation being computed)
+        self.nbytes = 0
+        self.hits = 0
+        self.waits = 0  # duplicates that arrived while the first copy was being scored
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.conflicts = 0  # keys reused for a different event
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def claim_many(self, keys, digests):
+        """For each key, None if the caller must score that event and then call
+        ``put_many`` or ``release_many``, else a Future of its annotation.
+
+        ``digests`` are the events' ``event_digest``s. A None key is not
+        deduplicated. Raises KeyReuseError, claiming nothing, if any key is
+        held for a different event.
+        """
+        out = []
+        with self._lock:
+            self._expire(time.monotonic())
+            for key, event in zip(keys, digests):
+                entry = self.entries.get(key)
+                held = entry[1] if entry is not None else self.pending.get(key, (event,))[0]
+                if held != event:
+                    self.conflicts += 1
+                    raise KeyReuseError("Idempotency-Key was already used for a different event")
+            for key, event in zip(keys, digests):
+                if key is None:
+                    out.append(None)
+                    continue
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    future = Future()
+                    future.set_result(codec.loads(entry[2]))
+                    out.append(future)
+                    continue
+                pending = self.pending.get(key)
+                if pending is not None:
+                    self.waits += 1
+                    out.append(pending[1])
+                    continue
+                self.misses += 1
+                self.pending[key] = (event, Future())
+                out.append(None)
+        return out
+
+    def put_many(self, keys, annotated):
+        """Store the annotations of claimed keys and hand them to waiting duplicates."""
+        claimed = [(key, ann) for key, ann in zip(keys, annotated) if key is not None]
+        values = [codec.dumps(ann) for _, ann in claimed]
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for (key, ann), value in zip(claimed, values):
+                pending = self.pending.pop(key, None)
+                if pending is None:
+                    continue  # released meanwhile
+                event, future = pending
+                self.entries[key] = (expires_at, event, value)
+                self.nbytes += len(value) + ENTRY_OVERHEAD
+                future.set_result(ann)
+            while len(self.entries) > self.max_entries:
+                _, (_, _, value) = self.entries.popitem(last=False)
+                self.nbytes -= len(value) + ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def release_many(self, keys, error):
+        """Give up claimed keys after scoring failed; waiting duplicates get ``error``."""
+        with self._lock:
+            for key in keys:
+                pending = self.pending.pop(key, None)
+                if pending is not None:
+                    pending[1].set_exception(error)
+
+    def _expire(self, now):
+        # every entry lives for the same ttl, so the oldest expire first
+        while self.entries:
+            key, (expires_at, _, value) = next(iter(self.entries.items()))
+            if expires_at > now:
+                break
+            del self.entries[key]
+            self.nbytes -= len(value) + ENTRY_OVERHEAD
+            self.expired += 1
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            lookups = self.hits + self.waits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "bytes": self.nbytes,
+                "pending": len(self.pending),
+                "hits": self.hits,
+                "waits": self.waits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.waits) / lookups, 4) if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "conflicts": self.conflicts,
+            }
@@ -0,0 +1,346 @@
+# api/history.py
+"""Bounded in-memory history of annotated events, partitioned by ingest time.
+
+Events are appended to the partition covering their ingest second. Each
+partition indexes its events by user and event type and keeps running
+aggregates, so /events filters and /stats sums touch only the partitions
+and rows they need. A partition is also closed once it holds an eighth of
+the event cap, so dropping the oldest partitions whole keeps the history
+within ``max_events`` however busy one interval is, and within
+``retention_seconds``. With ``directory`` set, closed partitions (and the
+open one at shutdown) are saved as NDJSON by a background thread and
+reloaded on start.
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+
+def parse_name(name):
+    """(start, first seq) of a partition file name, or None if it is not one."""
+    start, _, seq_start = name[:-len(".ndjson")].partition("-")
+    try:
+        return int(start), int(seq_start)
+    except ValueError:
+        return None
+
+
+class Partition:
+    __slots__ = (
+        "start", "seq_start", "events", "received", "by_user", "by_type",
+        "anomalies", "type_counts", "user_anomalies", "rt_sum", "rt_max", "score_sum",
+    )
+
+    def __init__(self, start, seq_start):
+        self.start = start
+        self.seq_start = seq_start  # seq of events[0]
+        self.events = []
+        self.received = []  # ingest time per event
+        self.by_user = {}  # user -> positions in events
+        self.by_type = {}
+        self.anomalies = 0
+        self.type_counts = {}
+        self.user_anomalies = {}
+        self.rt_sum = 0
+        self.rt_max = 0
+        self.score_sum = 0.0
+
+    @property
+    def seq_end(self):
+        return self.seq_start + len(self.events)  # one past the last seq
+
+    def add(self, event, received):
+        pos = len(self.events)
+        self.events.append(event)
+        self.received.append(received)
+        user = event.get("user")
+        event_type = event.get("event_type")
+        self.by_user.setdefault(user, []).append(pos)
+        self.by_type.setdefault(event_type, []).append(pos)
+        self.type_counts[event_type] = self.type_counts.get(event_type, 0) + 1
+        if event.get("anomaly_flag"):
+            self.anomalies += 1
+            self.user_anomalies[user] = self.user_anomalies.get(user, 0) + 1
+        try:
+            rt = int(event.get("response_time_ms") or 0)
+        except (TypeError, ValueError):
+            rt = 0
+        self.rt_sum += rt
+        self.rt_max = max(self.rt_max, rt)
+        self.score_sum += float(event.get("anomaly_score") or 0.0)
+
+    def positions(self, user=None, event_type=None):
+        """Positions matching the filters, in insertion order (uses the smaller index)."""
+        if user is None and event_type is None:
+            return range(len(self.events))
+        if user is not None and event_type is not None:
+            by_user = self.by_user.get(user, ())
+            by_type = self.by_type.get(event_type, ())
+            small, other = (by_user, set(by_type)) if len(by_user) <= len(by_type) else (by_type, set(by_user))
+            return [p for p in small if p in other]
+        if user is not None:
+            return self.by_user.get(user, ())
+        return self.by_type.get(event_type, ())
+
+
+class EventHistory:
+    """Time-partitioned, size-bounded event history with indexes and aggregates."""
+
+    def __init__(self, max_events=100_000, retention_seconds=3600, partition_seconds=60, directory=None):
+        self.max_events = max(1, int(max_events))
+        # partitions are dropped whole, so none may hold more than a slice of the cap
+        self.partition_events = max(1, self.max_events // 8)
+        self.retention_seconds = retention_seconds
+        self.partition_seconds = max(1, int(partition_seconds))
+        self.directory = directory or None
+        self.partitions = deque()
+        self.size = 0
+        self.next_seq = 1
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._writes = None  # (action, partition, events to save) for the writer thread
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._writes = queue.Queue()
+            threading.Thread(target=self._write_loop, name="history-writer", daemon=True).start()
+            self._load()
+
+    def __len__(self):
+        return self.size
+
+    # --- writes ---
+
+    def add_many(self, events, now=None):
+        """Append a batch; returns the seq given to its first event (the rest follow on)."""
+        if not events:
+            return None
+        now = time.time() if now is None else now
+        start = now - now % self.partition_seconds
+        with self._lock:
+            first = self.next_seq
+            part = self.partitions[-1] if self.partitions else None
+            i = 0
+            while i < len(events):
+                if part is None or part.start < start or len(part.events) >= self.partition_events:
+                    if part is not None:
+                        self._seal(part)
+                    part = Partition(start, self.next_seq)
+                    self.partitions.append(part)
+                take = events[i:i + self.partition_events - len(part.events)]
+                for event in take:
+                    part.add(event, now)
+                self.next_seq += len(take)
+                self.size += len(take)
+                i += len(take)
+                self._evict(now)
+        return first
+
+    def _evict(self, now):
+        cutoff = now - self.retention_seconds if self.retention_seconds else None
+        while len(self.partitions) > 1 and (
+            self.size > self.max_events or (cutoff is not None and self.partitions[0].start + self.partition_seconds <= cutoff)
+        ):
+            old = self.partitions.popleft()
+            self.size -= len(old.events)
+            self.dropped += len(old.events)
+            self._remove_file(old)
+
+    # --- reads ---
+
+    def query(self, since=None, cursor=None, user=None, event_type=None, limit=100):
+        """Events ingested at/after ``since`` (epoch s) and with seq above ``cursor``.
+
+        With a cursor the oldest ``limit`` matches come first, so a client can
+        page forward through deltas; without one the newest ``limit`` are
+        returned. Results are always in ingest order. Returns a dict with the
+        events, the cursor to pass next time and whether more matches remain.
+        """
+        forward = cursor is not None
+        picked, more, latest = self.select(since, cursor, user, event_type, limit)
+        return {
+            "events": [event for _, event in picked],
+            # everything up to the newest seq has been seen unless a forward page was cut short
+            "cursor": picked[-1][0] if forward and more else latest,
+            "more": more,
+            "retained": self.size,
+        }
+
+    def select(self, since=None, cursor=None, user=None, event_type=None, limit=100):
+        """The matches behind ``query``: ([(seq, event)], more, newest seq)."""
+        limit = max(1, int(limit))
+        forward = cursor is not None
+        cursor = cursor or 0
+        picked = []  # (seq, event)
+        more = False
+        with self._lock:
+            if cursor >= self.next_seq:
+                cursor = 0  # issued before a restart: start over
+            parts = list(self.partitions) if forward else list(reversed(self.partitions))
+            for part in parts:
+                if part.seq_end - 1 <= cursor or (since is not None and part.start + self.partition_seconds <= since):
+                    if forward:
+                        continue
+                    break  # older partitions cannot match either
+                positions = part.positions(user, event_type)
+                if not forward:
+                    positions = reversed(positions)
+                for pos in positions:
+                    seq = part.seq_start + pos
+                    if seq <= cursor or (since is not None and part.received[pos] < since):
+                        continue
+                    if len(picked) == limit:
+                        more = True
+                        break
+                    picked.append((seq, part.events[pos]))
+                if more:
+                    break
+            latest = self.next_seq - 1
+        if not forward:
+            picked.reverse()
+        return picked, more, latest
+
+    def stats(self, window=300, now=None):
+        """Totals over the last ``window`` seconds plus one point per partition."""
+        now = time.time() if now is None else now
+        since = now - window
+        totals = {"events": 0, "anomalies": 0, "rt_sum": 0, "rt_max": 0, "score_sum": 0.0}
+        type_counts = {}
+        user_anomalies = {}
+        series = []
+        with self._lock:
+            for part in self.partitions:
+                if part.start + self.partition_seconds <= since:
+                    continue
+                n = len(part.events)
+                totals["events"] += n
+                totals["anomalies"] += part.anomalies
+                totals["rt_sum"] += part.rt_sum
+                totals["rt_max"] = max(totals["rt_max"], part.rt_max)
+                totals["score_sum"] += part.score_sum
+                for key, count in part.type_counts.items():
+                    type_counts[key] = type_counts.get(key, 0) + count
+                for key, count in part.user_anomalies.items():
+                    user_anomalies[key] = user_anomalies.get(key, 0) + count
+                if series and series[-1]["start"] == part.start:
+                    point = series[-1]  # a busy interval split over several partitions
+                else:
+                    point = {"start": part.start, "events": 0, "anomalies": 0, "rt_sum": 0, "rt_max": 0,
+                             "score_sum": 0.0}
+                    series.append(point)
+                point["events"] += n
+                point["anomalies"] += part.anomalies
+                point["rt_sum"] += part.rt_sum
+                point["rt_max"] = max(point["rt_max"], part.rt_max)
+                point["score_sum"] += part.score_sum
+            retained = self.size
+            latest = self.next_seq - 1
+        series = [
+            {
+                "start": p["start"],
+                "events": p["events"],
+                "anomalies": p["anomalies"],
+                "mean_response_time_ms": round(p["rt_sum"] / p["events"], 2) if p["events"] else None,
+                "max_response_time_ms": p["rt_max"],
+                "mean_anomaly_score": round(p["score_sum"] / p["events"], 4) if p["events"] else None,
+            }
+            for p in series
+        ]
+        n = totals["events"]
+        top_users = sorted(user_anomalies.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        return {
+            "window_seconds": window,
+            "partition_seconds": self.partition_seconds,
+            "events": n,
+            "anomalies": totals["anomalies"],
+            "anomaly_rate": round(totals["anomalies"] / n, 4) if n else 0.0,
+            "events_per_second": round(n / window, 3) if window else None,
+            "mean_response_time_ms": round(totals["rt_sum"] / n, 2) if n else None,
+            "max_response_time_ms": totals["rt_max"] if n else None,
+            "mean_anomaly_score": round(totals["score_sum"] / n, 4) if n else None,
+            "event_types": type_counts,
+            "top_anomalous_users": [{"user": u, "anomalies": c} for u, c in top_users],
+            "series": series,
+            "retained": retained,
+            "cursor": latest,
+        }
+
+    # --- optional disk backing ---
+
+    def _path(self, part):
+        # one interval can span several partitions, told apart by their first seq
+        return os.path.join(self.directory, f"{int(part.start)}-{part.seq_start}.ndjson")
+
+    def _seal(self, part):
+        """Queue a partition that will receive no more events for saving."""
+        if self._writes is not None:
+            self._writes.put(("write", part, len(part.events)))
+
+    def _remove_file(self, part):
+        # queued behind the partition's own write, so a dropped partition's file never reappears
+        if self._writes is not None:
+            self._writes.put(("remove", part, 0))
+
+    def _write_loop(self):
+        while True:
+            action, part, n = self._writes.get()
+            try:
+                if action == "write":
+                    self._write(part, n)
+                else:
+                    try:
+                        os.remove(self._path(part))
+                    except FileNotFoundError:
+                        pass
+            except OSError as e:
+                print(f"History write failed: {e}", file=sys.stderr)
+            finally:
+                self._writes.task_done()
+
+    def _write(self, part, n):
+        # ingest only ever appends, so the first n events are stable without the lock
+        tmp = self._path(part) + ".tmp"
+        with open(tmp, "w") as f:
+            for event, received in zip(part.events[:n], part.received[:n]):
+                f.write(json.dumps({"received": received, "event": event}) + "\n")
+        os.replace(tmp, self._path(part))
+
+    def flush(self):
+        """Save the open partition too (e.g. at shutdown) and wait for pending writes."""
+        if self._writes is None:
+            return
+        with self._lock:
+            if self.partitions:
+                self._seal(self.partitions[-1])
+        self._writes.join()
+
+    def _load(self):
+        now = time.time()
+        # "<start>-<first seq>.ndjson"; other files in the directory are left alone
+        found = sorted(
+            (parsed, name) for name in os.listdir(self.directory)
+            if name.endswith(".ndjson") and (parsed := parse_name(name)) is not None
+        )
+        for (start, seq_start), name in found:
+            path = os.path.join(self.directory, name)
+            if self.retention_seconds and start + self.partition_seconds <= now - self.retention_seconds:
+                os.remove(path)
+                continue
+            # seqs carry on from the saved ones, so cursors stay valid across restarts
+            part = Partition(start, seq_start)
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        event, received = record["event"], float(record["received"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn last line, or not a history record
+                    if isinstance(event, dict):
+                        part.add(event, received)
+            self.partitions.append(part)
+            self.next_seq = max(self.next_seq, part.seq_end)
+            self.size += len(part.events)
+        self._evict(now)
@@ -0,0 +1,162 @@
+# api/metrics.py
+"""Low-overhead counters and latency histograms, rendered in the Prometheus text format.
+
+Every thread records into its own shard (found through a threading.local),
+so the hot path takes no lock: an observation is a bisect and two in-place
+additions. Shards are only summed when /metrics is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# histogram bucket upper bounds, in seconds
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+PREFIX = "guardian_"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+COUNTER_HELP = {
+    "requests_total": "Requests to the ingest endpoints.",
+    "errors_total": "Ingest responses with an error status.",
+    "events_total": "Events scored by the model.",
+    "anomalies_total": "Scored events flagged as anomalies.",
+    "rejected_events_total": "Batch items that failed validation.",
+}
+
+
+class _Shard:
+    __slots__ = ("counts", "counters")
+
+    def __init__(self):
+        self.counts = {}  # stage -> per-bucket counts (last slot is +Inf) followed by the sum
+        self.counters = {}  # (name, labels) -> value
+
+
+class Metrics:
+    """Stage latency histograms and counters, written lock-free per thread."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # only taken when a new thread records for the first time
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def observe(self, stage, seconds):
+        try:
+            counts = self._local.shard.counts[stage]
+        except (AttributeError, KeyError):
+            counts = self._shard().counts.setdefault(stage, [0] * (len(self.buckets) + 1) + [0.0])
+        counts[bisect_left(self.buckets, seconds)] += 1
+        counts[-1] += seconds
+
+    def inc(self, name, n=1, labels=""):
+        try:
+            counters = self._local.shard.counters
+        except AttributeError:
+            counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + n
+
+    def snapshot(self):
+        """Sum all shards: ({stage: (counts, sum)}, {(name, labels): value})."""
+        with self._lock:
+            shards = list(self._shards)
+        histograms = {}
+        counters = {}
+        for shard in shards:
+            # list() copies in one step under the GIL, so a writer adding a key can't break the loop
+            for stage, counts in list(shard.counts.items()):
+                counts = list(counts)
+                total, seconds = histograms.get(stage, ([0] * (len(counts) - 1), 0.0))
+                histograms[stage] = ([a + b for a, b in zip(total, counts)], seconds + counts[-1])
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    def render(self, gauges=()):
+        """Prometheus text exposition; ``gauges`` is a list of (name, help, value, labels)."""
+        histograms, counters = self.snapshot()
+        lines = [
+            f"# HELP {PREFIX}stage_seconds Time spent in each ingest stage.",
+            f"# TYPE {PREFIX}stage_seconds histogram",
+        ]
+        bounds = [repr(b) for b in self.buckets] + ["+Inf"]
+        for stage in sorted(histograms):
+            counts, seconds = histograms[stage]
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{PREFIX}stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}stage_seconds_sum{{stage="{stage}"}} {seconds!r}')
+            lines.append(f'{PREFIX}stage_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        seen = set()
+        for name, labels in sorted(counters):
+            if name not in seen:
+                seen.add(name)
+                if name in COUNTER_HELP:
+                    lines.append(f"# HELP {PREFIX}{name} {COUNTER_HELP[name]}")
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{PREFIX}{name}{suffix} {counters[name, labels]}")
+
+        seen = set()
+        for name, help_text, value, labels in gauges:
+            if value is None:
+                continue
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}{name} gauge")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{PREFIX}{name}{suffix} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing whole requests to ``paths`` as the "total" stage.
+
+    Also counts requests and error responses by status code. Plain ASGI
+    rather than BaseHTTPMiddleware, so it adds no extra task or body copy.
+    """
+
+    def __init__(self, app, metrics, paths):
+        self.app = app
+        self.metrics = metrics
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            metrics = self.metrics
+            metrics.observe("total", time.perf_counter() - start)
+            metrics.inc("requests_total", labels=f'path="{scope["path"]}"')
+            if status >= 400:
+                metrics.inc("errors_total", labels=f'status="{status}"')
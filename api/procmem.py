@@ -0,0 +1,48 @@
+# api/procmem.py
+"""Per-process memory figures from /proc (Linux only; other platforms get None)."""
+import os
+
+
+def _read_kb_fields(path, names):
+    values = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in names:
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def read_memory(pid="self"):
+    """RSS split into anonymous/file-backed/shmem pages, plus PSS, in kB.
+
+    Pages memory-mapped from the model artifact show up as RssFile and are
+    shared between workers; PSS divides shared pages among the processes
+    mapping them, so summing PSS over workers gives the real footprint.
+    """
+    status = _read_kb_fields(f"/proc/{pid}/status", {"VmRSS", "VmHWM", "RssAnon", "RssFile", "RssShmem"})
+    rollup = _read_kb_fields(f"/proc/{pid}/smaps_rollup", {"Pss"})
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_kb": status.get("VmRSS"),
+        "peak_rss_kb": status.get("VmHWM"),
+        "rss_anon_kb": status.get("RssAnon"),
+        "rss_file_kb": status.get("RssFile"),
+        "rss_shmem_kb": status.get("RssShmem"),
+        "pss_kb": rollup.get("Pss"),
+    }
+
+
+def child_pids(pid):
+    """Direct children of ``pid`` (e.g. the uvicorn workers of the supervisor)."""
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return sorted(set(children))
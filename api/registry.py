@@ -0,0 +1,204 @@
+# api/registry.py
+"""Per-tenant models loaded on demand, within a memory budget.
+
+A tenant's model is the artifact ``<directory>/<tenant>.joblib`` (train one
+with ``python -m models.train --out``). It is loaded on the first request
+that names the tenant, together with its own encoder, rolling features and
+score thresholds, since tenants differ in vocabularies and score
+distributions. Tenants without an artifact use the default model.
+
+Loaded models are kept in LRU order. When their estimated size goes over
+``budget_bytes``, the least recently used ones are dropped; requests still
+holding one finish with it. Concurrent first requests for the same tenant
+share one load: the first caller loads, the others wait on its future.
+Tenants found without an artifact are remembered for ``absent_ttl``
+seconds, so their requests skip the file system check. An artifact that
+fails to load is treated the same way: the error is logged once and its
+tenant uses the default model until the file changes.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from models.artifact import ModelArtifact
+from models.encoder import SimpleEncoder
+from models.engines import build_engine
+from models.features import FeatureEngine
+from models.refresh import ModelBundle
+
+# tenant keys become file names, so only allow plain ones
+TENANT_KEY = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class TenantModel:
+    """Everything needed to score one tenant's events."""
+
+    __slots__ = ("tenant", "bundle", "encoder", "features", "thresholds", "nbytes", "loaded_at", "hits")
+
+    def __init__(self, tenant, bundle, encoder, features, thresholds):
+        self.tenant = tenant
+        self.bundle = bundle
+        self.encoder = encoder
+        self.features = features
+        self.thresholds = thresholds
+        self.nbytes = (bundle.scorer.nbytes() + vocabulary_nbytes(encoder.users) + vocabulary_nbytes(encoder.event_types)
+                       + thresholds.nbytes())
+        self.loaded_at = time.time()
+        self.hits = 0
+
+
+def vocabulary_nbytes(vocab):
+    """Rough size of a models.encoder.Vocabulary: id arrays plus ~120 bytes per dict entry."""
+    sketch = vocab.sketch.nbytes if vocab.sketch is not None else 0
+    return vocab.hits.nbytes + 8 * len(vocab.values) + 120 * len(vocab.ids) + sketch
+
+
+def valid_tenant(key):
+    return bool(TENANT_KEY.match(key))
+
+
+class ModelRegistry:
+    def __init__(self, directory, budget_bytes, engine, thresholds_factory, absent_ttl=5.0, max_absent=10_000):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.engine = engine
+        self.thresholds_factory = thresholds_factory  # () -> ScoreThresholds for a new tenant
+        self.models = OrderedDict()  # tenant -> TenantModel, least recently used first
+        self.loading = {}  # tenant -> Future of a load in progress
+        self.absent = OrderedDict()  # tenant -> when no usable artifact was found, oldest first
+        self.broken = OrderedDict()  # tenant -> (mtime_ns, size) of an artifact that failed to load
+        self.absent_ttl = absent_ttl
+        self.max_absent = max_absent
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.load_waits = 0  # requests that waited on another request's load
+        self.evictions = 0
+        self.fallbacks = 0  # requests for tenants without an artifact
+        self.load_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def path(self, tenant):
+        return os.path.join(self.directory, f"{tenant}.joblib")
+
+    def get(self, tenant):
+        """The tenant's TenantModel, or None to use the default model. Blocks while loading."""
+        with self._lock:
+            model = self.models.get(tenant)
+            if model is not None:
+                self.models.move_to_end(tenant)
+                self.hits += 1
+                model.hits += 1
+                return model
+            self.misses += 1
+            checked = self.absent.get(tenant)
+            if checked is not None and time.monotonic() - checked < self.absent_ttl:
+                self.fallbacks += 1
+                return None
+            future = self.loading.get(tenant)
+            owner = future is None
+            if owner:
+                future = self.loading[tenant] = Future()
+            else:
+                self.load_waits += 1
+        if not owner:
+            return future.result()
+        # outside the lock, so lookups of other tenants don't queue behind the file system
+        try:
+            st = os.stat(self.path(tenant))
+        except OSError:
+            return self._fall_back(tenant, future)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            known_broken = self.broken.get(tenant) == signature
+        if known_broken:
+            return self._fall_back(tenant, future)
+        try:
+            model = self._load(tenant)
+        except Exception as e:
+            print(f"Could not load model for tenant {tenant!r} ({e}); using the default model.", file=sys.stderr)
+            with self._lock:
+                self.load_failures += 1
+                self.broken.pop(tenant, None)
+                self.broken[tenant] = signature
+                while len(self.broken) > self.max_absent:
+                    self.broken.popitem(last=False)
+            return self._fall_back(tenant, future)
+        with self._lock:
+            del self.loading[tenant]
+            self.absent.pop(tenant, None)
+            self.broken.pop(tenant, None)
+            self.models[tenant] = model
+            self.used_bytes += model.nbytes
+            self._evict(keep=tenant)
+        future.set_result(model)
+        return model
+
+    def _fall_back(self, tenant, future):
+        """Remember that ``tenant`` has no usable artifact; it and its waiters get the default model."""
+        with self._lock:
+            del self.loading[tenant]
+            self.fallbacks += 1
+            self.absent.pop(tenant, None)
+            self.absent[tenant] = time.monotonic()
+            while len(self.absent) > self.max_absent:
+                self.absent.popitem(last=False)
+        future.set_result(None)
+        return None
+
+    def _load(self, tenant):
+        start = time.perf_counter()
+        artifact = ModelArtifact.load(self.path(tenant), mmap=True)
+        encoder = artifact.restore_encoder(SimpleEncoder())
+        features = FeatureEngine() if artifact.stream_features else None
+        engine, score_min, score_max = build_engine(self.engine, artifact, encoder)
+        bundle = ModelBundle(engine, score_min, score_max, trained_at=artifact.trained_at, n_rows=artifact.n_rows)
+        model = TenantModel(tenant, bundle, encoder, features, self.thresholds_factory())
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += elapsed
+        print(f"Loaded model for tenant {tenant!r} in {elapsed:.3f}s ({model.nbytes} bytes).", file=sys.stderr)
+        return model
+
+    def _evict(self, keep):
+        while self.used_bytes > self.budget_bytes and len(self.models) > 1:
+            tenant, model = next(iter(self.models.items()))
+            if tenant == keep:
+                break
+            del self.models[tenant]
+            self.used_bytes -= model.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            models = [
+                {"tenant": m.tenant, "bytes": m.nbytes, "hits": m.hits, "loaded_at": m.loaded_at,
+                 "engine": m.bundle.scorer.name}
+                for m in reversed(self.models.values())  # most recently used first
+            ]
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "loaded": len(models),
+                "loading": len(self.loading),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "loads": self.loads,
+                "load_failures": self.load_failures,
+                "load_waits": self.load_waits,
+                "evictions": self.evictions,
+                "fallbacks": self.fallbacks,
+                "broken": len(self.broken),
+                "load_seconds": round(self.load_seconds, 3),
+                "models": models,
+            }
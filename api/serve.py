@@ -0,0 +1,54 @@
+# api/serve.py
+"""Run the ingestion API with several worker processes sharing one model.
+
+    python -m api.serve --workers 4 --port 8000 --report-rss 30
+
+Each uvicorn worker loads MODEL_PATH with memory-mapped arrays and scores
+with the compiled forest, so the model's pages are mapped once in the page
+cache and shared by all workers instead of refit and copied per process.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import uvicorn
+
+import config
+from api.procmem import child_pids, read_memory
+
+
+def report_rss(parent_pid, interval):
+    while True:
+        time.sleep(interval)
+        total_pss = 0
+        for pid in child_pids(parent_pid):
+            mem = read_memory(pid)
+            total_pss += mem["pss_kb"] or 0
+            print(
+                f"[rss] worker {pid}: rss={mem['rss_kb']} kB anon={mem['rss_anon_kb']} kB "
+                f"file={mem['rss_file_kb']} kB pss={mem['pss_kb']} kB",
+                file=sys.stderr,
+            )
+        print(f"[rss] workers total pss={total_pss} kB", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--workers", type=int, default=config.WORKERS, help="worker processes (default: WEB_CONCURRENCY)")
+    parser.add_argument("--report-rss", type=float, default=0, metavar="SECONDS",
+                        help="print per-worker memory every SECONDS (Linux only)")
+    args = parser.parse_args(argv)
+
+    # a missing model is fitted during the workers' warm-up, once, and saved for the others
+    os.environ["MODEL_SAVE_IF_MISSING"] = "1"
+    if args.report_rss > 0:
+        threading.Thread(target=report_rss, args=(os.getpid(), args.report_rss), daemon=True).start()
+    uvicorn.run("api.app:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
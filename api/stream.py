@@ -0,0 +1,151 @@
+# api/stream.py
+"""Push annotated events to Server-Sent Events subscribers.
+
+Scoring threads hand each annotated batch to the event loop with one
+``call_soon_threadsafe``; the loop filters it for every subscriber and
+appends the matches to that subscriber's bounded buffer. A subscriber that
+falls behind either loses its oldest buffered events (it is then sent a
+``dropped`` message with the count, and can fill the gap from /events) or
+is disconnected, per ``drop_policy``. With no subscribers publishing is a
+single attribute check.
+"""
+import asyncio
+from collections import deque
+
+from models import codec
+
+
+class Subscriber:
+    __slots__ = ("user", "event_type", "anomalies_only", "min_score", "buffer", "dropped", "closed", "wakeup")
+
+    def __init__(self, user=None, event_type=None, anomalies_only=False, min_score=None, max_queue=1000):
+        self.user = user
+        self.event_type = event_type
+        self.anomalies_only = anomalies_only
+        self.min_score = min_score
+        self.buffer = deque(maxlen=max_queue)  # (seq, event)
+        self.dropped = 0  # events lost since the last "dropped" message
+        self.closed = False
+        self.wakeup = asyncio.Event()
+
+    def matches(self, event):
+        return (
+            (self.user is None or event.get("user") == self.user)
+            and (self.event_type is None or event.get("event_type") == self.event_type)
+            and (not self.anomalies_only or event.get("anomaly_flag"))
+            and (self.min_score is None or (event.get("anomaly_score") or 0.0) >= self.min_score)
+        )
+
+
+def format_sse(seq, event):
+    """One SSE message; flagged events are sent as "alert", others as "event"."""
+    head = f"id: {seq}\n" if seq is not None else ""
+    name = "alert" if event.get("anomaly_flag") else "event"
+    return f"{head}event: {name}\ndata: {codec.dumps(event).decode()}\n\n"
+
+
+class EventBroadcaster:
+    def __init__(self, max_queue=1000, drop_policy="oldest", max_subscribers=100, heartbeat_s=15.0):
+        self.max_queue = max(1, max_queue)
+        self.drop_policy = drop_policy
+        self.max_subscribers = max_subscribers
+        self.heartbeat_s = heartbeat_s
+        self.subscribers = set()
+        self.loop = None
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+
+    def stop(self):
+        for sub in self.subscribers:
+            sub.closed = True
+            sub.wakeup.set()
+        self.subscribers = set()
+        self.loop = None
+
+    def publish(self, events, first_seq=None):
+        """Offer an annotated batch to the subscribers; safe to call from any thread."""
+        if not self.subscribers or self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out, events, first_seq)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    def _fan_out(self, events, first_seq):
+        self.published += len(events)
+        for sub in list(self.subscribers):
+            added = 0
+            for i, event in enumerate(events):
+                if not sub.matches(event):
+                    continue
+                if len(sub.buffer) == self.max_queue:
+                    if self.drop_policy == "disconnect":
+                        self.unsubscribe(sub)
+                        self.disconnected += 1
+                        break
+                    sub.dropped += 1  # deque(maxlen) pushes out the oldest
+                    self.dropped += 1
+                sub.buffer.append((None if first_seq is None else first_seq + i, event))
+                added += 1
+            if added or sub.closed:
+                sub.wakeup.set()
+
+    def subscribe(self, **filters):
+        """Register a subscriber, or return None when max_subscribers are connected."""
+        if len(self.subscribers) >= self.max_subscribers:
+            return None
+        sub = Subscriber(max_queue=self.max_queue, **filters)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.closed = True
+        sub.wakeup.set()
+        self.subscribers.discard(sub)
+
+    async def messages(self, sub, backlog=(), after=None):
+        """SSE text for one subscriber: ``backlog`` (seq, event) pairs first, then live events.
+
+        Each wakeup drains the whole buffer into one chunk. Live events with a
+        seq up to ``after`` or the last backlog seq are skipped. A comment line
+        is sent after ``heartbeat_s`` of silence so proxies keep the
+        connection open.
+        """
+        last_seq = after
+        try:
+            if backlog:
+                yield "".join(format_sse(seq, event) for seq, event in backlog)
+                last_seq = backlog[-1][0]
+            while not sub.closed:
+                try:
+                    await asyncio.wait_for(sub.wakeup.wait(), self.heartbeat_s)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                sub.wakeup.clear()
+                parts = []
+                if sub.dropped:
+                    parts.append(f"event: dropped\ndata: {codec.dumps({'dropped': sub.dropped}).decode()}\n\n")
+                    sub.dropped = 0
+                while sub.buffer:
+                    seq, event = sub.buffer.popleft()
+                    if last_seq is not None and seq is not None and seq <= last_seq:
+                        continue
+                    parts.append(format_sse(seq, event))
+                if parts:
+                    yield "".join(parts)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+            "buffered": sum(len(sub.buffer) for sub in self.subscribers),
+        }
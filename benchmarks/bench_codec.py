@@ -0,0 +1,82 @@
+# benchmarks/bench_codec.py
+"""Measure the JSON/validation layers around the model, default vs FAST_CODEC.
+
+    python -m benchmarks.bench_codec [--events 20000]
+
+Scoring is left out on purpose: both paths feed the model the same dicts.
+"""
+import argparse
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from api.app import Event, fast_event
+from models import codec
+from models.train import build_initial_training_data
+
+
+def api_default(body):
+    # FastAPI: json.loads -> Event -> .dict() -> annotate copy -> jsonable_encoder -> JSONResponse
+    ev = Event(**json.loads(body)).dict()
+    out = ev.copy()
+    out["anomaly_score"] = 0.5
+    out["anomaly_flag"] = False
+    content = jsonable_encoder({"success": True, "annotated_event": out})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def api_fast(body):
+    ev = fast_event(codec.loads(body))
+    ev["anomaly_score"] = 0.5
+    ev["anomaly_flag"] = False
+    return codec.dumps({"success": True, "annotated_event": ev})
+
+
+def detector_default(line):
+    out = json.loads(line).copy()
+    out["anomaly_score"] = 0.5
+    out["anomaly_flag"] = False
+    return json.dumps(out)
+
+
+def detector_fast(line):
+    out = codec.loads(line)
+    out["anomaly_score"] = 0.5
+    out["anomaly_flag"] = False
+    return codec.dumps(out)
+
+
+def per_event_us(fn, items):
+    start = time.perf_counter()
+    results = [fn(item) for item in items]
+    return (time.perf_counter() - start) / len(items) * 1e6, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    bodies = [json.dumps(r).encode() for r in build_initial_training_data(args.events)]
+    lines = [b.decode() for b in bodies]
+
+    print(f"orjson installed: {codec.HAVE_ORJSON}")
+    print(f"{'path':<10} {'default us':>11} {'fast us':>9} {'speedup':>8} {'identical':>9}")
+    for name, default_fn, fast_fn, items in (
+        ("api", api_default, api_fast, bodies),
+        ("detector", detector_default, detector_fast, lines),
+    ):
+        default_us, default_out = per_event_us(default_fn, items)
+        fast_us, fast_out = per_event_us(fast_fn, items)
+        if name == "api":
+            identical = default_out == fast_out
+        else:  # the detector's fast output is compact, compare the values
+            identical = [json.loads(o) for o in default_out] == [json.loads(o) for o in fast_out]
+        print(f"{name:<10} {default_us:>11.2f} {fast_us:>9.2f} {default_us / fast_us:>7.1f}x {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# benchmarks/bench_engines.py
+"""Events/s of each detector engine on the hot path (score, then learn if streaming).
+
+    python -m benchmarks.bench_engines [--sizes 1 64 4096] [--seconds 1.0]
+"""
+import argparse
+import random
+
+import numpy as np
+
+import config
+from benchmarks.bench_scorer import time_call
+from models.artifact import try_load
+from models.encoder import SimpleEncoder
+from models.engines import ENGINES, build_engine
+from models.features import FeatureEngine
+from models.train import build_initial_training_data, train_artifact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 64, 4096])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per case")
+    args = parser.parse_args(argv)
+
+    artifact = try_load(config.MODEL_PATH) or train_artifact(seed=42)
+    encoder = artifact.restore_encoder(SimpleEncoder())
+    engines = {name: build_engine(name, artifact, encoder)[0] for name in ENGINES}
+
+    random.seed(0)
+    rows = build_initial_training_data(max(args.sizes))
+    X_all = encoder.encode_many(rows)
+    if artifact.stream_features:
+        X_all = np.hstack([X_all, FeatureEngine().transform_many(rows, 0)])
+
+    print(f"{'batch':>6} " + " ".join(f"{name + ' ev/s':>14}" for name in ENGINES))
+    for n in args.sizes:
+        X = X_all[:n]
+        rates = [n / time_call(engines[name].score_and_learn, X, args.seconds) * 1e6 for name in ENGINES]
+        print(f"{n:>6} " + " ".join(f"{rate:>14,.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
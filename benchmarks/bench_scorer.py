@@ -0,0 +1,59 @@
+# benchmarks/bench_scorer.py
+"""Compare sklearn IsolationForest.decision_function with the compiled numpy scorer.
+
+    python -m benchmarks.bench_scorer [--sizes 1 64 4096] [--seconds 1.0]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import config
+from models.artifact import try_load
+from models.encoder import SimpleEncoder
+from models.features import FeatureEngine
+from models.scorer import CompiledForest
+from models.train import build_initial_training_data, train_artifact
+
+
+def time_call(fn, X, seconds):
+    """Median latency of fn(X) in microseconds over roughly ``seconds`` of calls."""
+    fn(X)  # warm up
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(samples) < 5:
+        start = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 64, 4096])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per case")
+    args = parser.parse_args(argv)
+
+    artifact = try_load(config.MODEL_PATH) or train_artifact(seed=42)
+    model = artifact.model
+    compiled = CompiledForest.from_sklearn(model)
+
+    random.seed(0)
+    encoder = artifact.restore_encoder(SimpleEncoder())
+    rows = build_initial_training_data(max(args.sizes))
+    X_all = encoder.encode_many(rows)
+    if artifact.stream_features:
+        X_all = np.hstack([X_all, FeatureEngine().transform_many(rows, 0)])
+
+    print(f"{'batch':>6} {'sklearn us':>12} {'compiled us':>12} {'speedup':>8} {'identical':>9}")
+    for n in args.sizes:
+        X = X_all[:n]
+        identical = np.array_equal(model.decision_function(X), compiled.decision_function(X))
+        sk = time_call(model.decision_function, X, args.seconds)
+        cf = time_call(compiled.decision_function, X, args.seconds)
+        print(f"{n:>6} {sk:>12.1f} {cf:>12.1f} {sk / cf:>7.1f}x {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
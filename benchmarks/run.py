@@ -0,0 +1,414 @@
+# benchmarks/run.py
+"""Run the benchmark suite, write JSON results and compare them with a baseline.
+
+    python -m benchmarks.run                       # all cases, compare with benchmarks/baseline.json
+    python -m benchmarks.run --only encode score_batch --seconds 0.5
+    python -m benchmarks.run --out results.json --save-baseline
+
+Every case reports events/s, p50/p99 latency per call (where a call has one)
+and peak RSS in kB. Each case runs in its own process, so the peak RSS is
+that case's, not the high-water mark of everything run before it. A model artifact is trained with a fixed seed into a
+temporary directory, so runs don't depend on whatever MODEL_PATH holds.
+Exits with status 1 when a case regressed beyond ``--tolerance``.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import config
+from api.procmem import read_memory
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def self_peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kB on Linux
+
+
+def summarize(samples, events_per_call=1, elapsed=None):
+    """events/s and p50/p99 per-call latency (µs) from per-call durations in seconds."""
+    samples = np.asarray(samples)
+    elapsed = samples.sum() if elapsed is None else elapsed
+    return {
+        "calls": int(len(samples)),
+        "events_per_s": round(len(samples) * events_per_call / elapsed, 1),
+        "p50_us": round(float(np.percentile(samples, 50)) * 1e6, 2),
+        "p99_us": round(float(np.percentile(samples, 99)) * 1e6, 2),
+    }
+
+
+def time_calls(fn, args_list, seconds, events_per_call=1):
+    """Call fn over ``args_list`` (cycling) for about ``seconds``; per-call timings."""
+    fn(*args_list[0])  # warm up
+    samples = []
+    n = len(args_list)
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline or len(samples) < 20:
+        args = args_list[i % n]
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+        i += 1
+    result = summarize(samples, events_per_call)
+    result["peak_rss_kb"] = read_memory()["peak_rss_kb"] or self_peak_rss_kb()
+    return result
+
+
+def sample_events(n, seed=0):
+    """Simulator events (10% anomalous), as the dashboards and simulator produce them."""
+    from data_simulator.simulator import generate_anomaly_event, generate_normal_event
+
+    random.seed(seed)
+    return [generate_anomaly_event() if random.random() < 0.1 else generate_normal_event() for _ in range(n)]
+
+
+# --- in-process microbenchmarks ---
+
+def case_encode(args):
+    from models.encoder import SimpleEncoder
+
+    encoder = SimpleEncoder()
+    events = sample_events(2000)
+    return {"encode": time_calls(encoder.encode, [(ev,) for ev in events], args.seconds)}
+
+
+def case_annotate_event(args):
+    from api.app import annotate_event, warm_up
+
+    warm_up()
+    events = sample_events(2000)
+    return {"annotate_event": time_calls(annotate_event, [(ev,) for ev in events], args.seconds)}
+
+
+def case_safe_json_dump(args):
+    from models.detector import safe_json_dump
+
+    events = sample_events(2000)
+    for ev in events:
+        ev["anomaly_score"] = np.float64(0.5)
+        ev["anomaly_flag"] = np.bool_(False)
+    return {"safe_json_dump": time_calls(safe_json_dump, [(ev,) for ev in events], args.seconds)}
+
+
+def case_score_batch(args):
+    import api.app as api
+
+    api.warm_up()
+    encoder = api.encoder
+    events = sample_events(max(args.batch_sizes))
+    X_all = encoder.encode_many(events)
+    if api.features is not None:
+        X_all = np.hstack([X_all, api.features.transform_many(events, 0)])
+    scorer = api.bundle.scorer
+    out = {}
+    for n in args.batch_sizes:
+        out[f"score_batch_{n}"] = time_calls(scorer.decision_function, [(X_all[:n],)], args.seconds, n)
+    return out
+
+
+# --- end-to-end ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, proc, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not listen on port {port} within {timeout}s")
+
+
+def start_server(port):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT, env=dict(os.environ), stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for_status(port, proc, path, status=200, timeout=60.0):
+    """Poll GET ``path`` until it answers ``status``; perf_counter() of the first response of any kind."""
+    deadline = time.monotonic() + timeout
+    first = None
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+        except OSError:
+            time.sleep(0.01)
+            continue
+        if first is None:
+            first = time.perf_counter()
+        if resp.status == status:
+            return first
+        time.sleep(0.01)
+    raise RuntimeError(f"GET {path} did not return {status} within {timeout}s")
+
+
+def case_startup(args):
+    """Seconds from launching uvicorn to the first /healthz byte and to /readyz returning 200."""
+    port = free_port()
+    start = time.perf_counter()
+    proc = start_server(port)
+    try:
+        first_byte = wait_for_status(port, proc, "/healthz") - start
+        wait_for_status(port, proc, "/readyz")
+        ready = time.perf_counter() - start
+        return {"startup": {"events_per_s": None, "p50_us": None, "p99_us": None,
+                            "first_byte_s": round(first_byte, 3), "ready_s": round(ready, 3),
+                            "peak_rss_kb": read_memory(proc.pid)["peak_rss_kb"]}}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def case_ingest_http(args):
+    """POST /ingest from ``--concurrency`` keep-alive connections against a local uvicorn."""
+    port = free_port()
+    proc = start_server(port)
+    try:
+        wait_for_port(port, proc)
+        wait_for_status(port, proc, "/readyz")
+        bodies = [json.dumps(ev).encode() for ev in sample_events(5000)]
+        headers = {"Content-Type": "application/json"}
+        samples = [[] for _ in range(args.concurrency)]
+        errors = [0] * args.concurrency
+        stop = threading.Event()
+
+        def worker(k):
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            i = k
+            while not stop.is_set():
+                start = time.perf_counter()
+                conn.request("POST", "/ingest", body=bodies[i % len(bodies)], headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                samples[k].append(time.perf_counter() - start)
+                if resp.status != 200:
+                    errors[k] += 1
+                i += args.concurrency
+            conn.close()
+
+        threads = [threading.Thread(target=worker, args=(k,)) for k in range(args.concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(max(args.seconds, 1.0) * 2)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        result = summarize([s for per in samples for s in per], elapsed=elapsed)
+        result["errors"] = sum(errors)
+        result["concurrency"] = args.concurrency
+        result["peak_rss_kb"] = read_memory(proc.pid)["peak_rss_kb"]
+        return {"ingest_http": result}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def run_detector(extra, stdin):
+    """Run the detector to completion.
+
+    Returns (seconds to the first output line, seconds from there to EOF,
+    output lines, peak RSS kB). Timing from the first output keeps start-up
+    (imports, model load) out of the throughput figure.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "models.detector", *extra], cwd=REPO_ROOT, env=dict(os.environ),
+        stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    first = None
+    lines = 0
+    while True:
+        chunk = proc.stdout.read1(1 << 16)
+        if not chunk:
+            break
+        if first is None:
+            first = time.perf_counter()
+        lines += chunk.count(b"\n")
+    end = time.perf_counter()
+    proc.stdout.close()
+    # wait4 gives this child's own rusage, including its peak RSS
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0 or first is None:
+        raise RuntimeError(f"detector exited with status {proc.returncode} after {lines} lines")
+    return first - start, end - first, lines, usage.ru_maxrss
+
+
+def case_detector_pipe(args):
+    """Pipe NDJSON through `python -m models.detector` in line and streaming mode."""
+    events = sample_events(args.detector_events)
+    out = {}
+    with tempfile.TemporaryFile() as src:
+        src.write(b"".join(json.dumps(ev).encode() + b"\n" for ev in events))
+        for name, extra in (("detector_line", []), ("detector_stream", ["--batch-size", "512"])):
+            src.seek(0)
+            startup, elapsed, lines, peak_rss = run_detector(extra, src)
+            out[name] = {
+                "events_per_s": round(lines / max(elapsed, 1e-3), 1),
+                "p50_us": None,
+                "p99_us": None,
+                "startup_s": round(startup, 3),
+                "peak_rss_kb": peak_rss,
+            }
+    return out
+
+
+CASES = {
+    "encode": case_encode,
+    "annotate_event": case_annotate_event,
+    "safe_json_dump": case_safe_json_dump,
+    "score_batch": case_score_batch,
+    "ingest_http": case_ingest_http,
+    "startup": case_startup,
+    "detector_pipe": case_detector_pipe,
+}
+
+
+def run_case(name, args):
+    """Run one case in a fresh interpreter; the in-process cases' peak RSS is then their own."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(CASES[name], args).result()
+
+
+# cases measured in seconds rather than throughput; lower is better
+SECONDS_FIELDS = ("first_byte_s", "ready_s")
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each shared case, and the names of cases that regressed."""
+    lines = []
+    regressed = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if not base.get("events_per_s"):
+            for field in SECONDS_FIELDS:
+                if not cur.get(field) or not base.get(field):
+                    continue
+                worse = cur[field] > base[field] * (1.0 + tolerance)
+                if worse and name not in regressed:
+                    regressed.append(name)
+                lines.append(
+                    f"{name + ' ' + field:<22} {base[field]:>11.3f}s {cur[field]:>11.3f}s "
+                    f"{cur[field] / base[field]:>7.2f}x{'  REGRESSION' if worse else ''}"
+                )
+            continue
+        ratio = cur["events_per_s"] / base["events_per_s"]
+        worse = ratio < 1.0 - tolerance
+        if cur.get("p99_us") and base.get("p99_us"):
+            worse = worse or cur["p99_us"] > base["p99_us"] * (1.0 + tolerance)
+        if worse:
+            regressed.append(name)
+        lines.append(
+            f"{name:<22} {base['events_per_s']:>12.1f} {cur['events_per_s']:>12.1f} {ratio:>7.2f}x"
+            f"{'  REGRESSION' if worse else ''}"
+        )
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="cases to run (default: all)")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time budget per case")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 1024, 4096])
+    parser.add_argument("--concurrency", type=int, default=8, help="connections for the /ingest load test")
+    parser.add_argument("--detector-events", type=int, default=20000)
+    parser.add_argument("--out", help="write the results JSON here (default: stdout only)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # same model for every run and for the server/detector subprocesses
+        from models.train import train_artifact
+
+        config.MODEL_PATH = os.environ["MODEL_PATH"] = train_artifact(seed=42).save(os.path.join(tmp, "model.joblib"))
+
+        results = {}
+        for name in args.only or CASES:
+            print(f"running {name}...", file=sys.stderr)
+            results.update(run_case(name, args))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seconds": args.seconds,
+            "compiled_scorer": config.COMPILED_SCORER,
+            "detector_engine": config.DETECTOR_ENGINE,
+            "fast_codec": config.FAST_CODEC,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+    status = 0
+    if args.save_baseline:
+        if args.only and os.path.exists(args.baseline):
+            # re-recording some cases keeps the others' baseline numbers
+            with open(args.baseline) as f:
+                report["results"] = {**json.load(f)["results"], **results}
+            text = json.dumps(report, indent=2)
+        with open(args.baseline, "w") as f:
+            f.write(text + "\n")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    elif args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print(f"{'case':<22} {'baseline ev/s':>12} {'current ev/s':>12} {'ratio':>8}", file=sys.stderr)
+        for line in lines:
+            print(line, file=sys.stderr)
+        if regressed:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
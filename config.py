@@ -2,6 +2,8 @@
 import os
 
 # API Configuration
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))  # worker processes for `python -m api.serve`
 API_URL = os.getenv("API_URL", "https://cloud-ai-anomaly-guardian.onrender.com/ingest")
 API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
 
@@ -10,6 +12,98 @@ MAX_EVENTS_DISPLAY = int(os.getenv("MAX_EVENTS_DISPLAY", "1000"))
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "5"))
 MODEL_ESTIMATORS = int(os.getenv("MODEL_ESTIMATORS", "50"))
 TRAINING_DATA_SIZE = int(os.getenv("TRAINING_DATA_SIZE", "500"))
+MODEL_PATH = os.getenv(
+    "MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "artifacts", "model.joblib")
+)
+# Encoder vocabularies: ids beyond these sizes fall back to hashed overflow buckets
+ENCODER_MAX_USERS = int(os.getenv("ENCODER_MAX_USERS", "100000"))
+ENCODER_MAX_EVENT_TYPES = int(os.getenv("ENCODER_MAX_EVENT_TYPES", "1000"))
+ENCODER_OVERFLOW_BUCKETS = int(os.getenv("ENCODER_OVERFLOW_BUCKETS", "64"))
+# Rolling per-user/per-IP features (models/features.py); baked into the artifact at train time
+STREAM_FEATURES = os.getenv("STREAM_FEATURES", "0") == "1"
+FEATURE_MAX_ENTITIES = int(os.getenv("FEATURE_MAX_ENTITIES", "100000"))
+FEATURE_IDLE_SECONDS = int(os.getenv("FEATURE_IDLE_SECONDS", "300"))
+FEATURE_MAX_SKEW_S = int(os.getenv("FEATURE_MAX_SKEW_S", "5"))  # event timestamps beyond now + this are capped
+TRAIN_EVENTS_PER_SECOND = int(os.getenv("TRAIN_EVENTS_PER_SECOND", "20"))
+# Score with the flattened numpy forest (models/scorer.py) instead of sklearn
+COMPILED_SCORER = os.getenv("COMPILED_SCORER", "1") == "1"
+# Detector engine (models/engines.py): "iforest" (batch-fit, refit in the background) or
+# "hst" (streaming Half-Space Trees, learns from every scored event)
+DETECTOR_ENGINE = os.getenv("DETECTOR_ENGINE", "iforest")
+HST_TREES = int(os.getenv("HST_TREES", "25"))
+HST_DEPTH = int(os.getenv("HST_DEPTH", "10"))
+HST_WINDOW = int(os.getenv("HST_WINDOW", "250"))  # events per reference mass window
+# Live score percentiles (models/quantiles.py), shown on GET /scores; with ADAPTIVE_THRESHOLDS=1
+# events are flagged below the THRESHOLD_QUANTILE percentile of recent scores and anomaly_score
+# is the score's percentile rank, instead of the fixed "< 0" cut and -0.5..0.5 scale
+ADAPTIVE_THRESHOLDS = os.getenv("ADAPTIVE_THRESHOLDS", "0") == "1"
+THRESHOLD_QUANTILE = float(os.getenv("THRESHOLD_QUANTILE", "0.02"))
+THRESHOLD_MIN_SAMPLES = int(os.getenv("THRESHOLD_MIN_SAMPLES", "1000"))  # static rule until then
+SCORE_SKETCH_K = int(os.getenv("SCORE_SKETCH_K", "200"))  # sketch size; rank error is roughly 1/k
+SCORE_SKETCH_WINDOW = int(os.getenv("SCORE_SKETCH_WINDOW", "100000"))  # percentiles cover 1-2 windows of events
+SCORE_SKETCH_DIR = os.getenv("SCORE_SKETCH_DIR", "")  # shared dir to merge sketches across worker processes
+SCORE_SKETCH_SYNC_S = float(os.getenv("SCORE_SKETCH_SYNC_S", "5"))
+# Raw-bytes /ingest path: models.codec (orjson if installed) instead of pydantic + FastAPI's encoder
+FAST_CODEC = os.getenv("FAST_CODEC", "0") == "1"
+MAX_BATCH_EVENTS = int(os.getenv("MAX_BATCH_EVENTS", "10000"))
+# Start-up: the model loads and warms in the background; /readyz turns 200 when done.
+# Until then /ingest waits up to WARMUP_WAIT_S (at most WARMUP_QUEUE_MAX requests), else 503
+WARMUP_WAIT_S = float(os.getenv("WARMUP_WAIT_S", "10"))
+WARMUP_QUEUE_MAX = int(os.getenv("WARMUP_QUEUE_MAX", "1000"))
+WARMUP_RETRY_AFTER_S = int(os.getenv("WARMUP_RETRY_AFTER_S", "5"))
+WARMUP_ROWS = int(os.getenv("WARMUP_ROWS", "64"))  # rows scored once before declaring ready
+# Fit and save MODEL_PATH during warm-up when it is missing (api.serve sets this for its workers)
+MODEL_SAVE_IF_MISSING = os.getenv("MODEL_SAVE_IF_MISSING", "0") == "1"
+
+# Micro-batching of concurrent single-event /ingest calls
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "0") == "1"
+MICROBATCH_WINDOW_MS = float(os.getenv("MICROBATCH_WINDOW_MS", "2"))
+MICROBATCH_MAX_SIZE = int(os.getenv("MICROBATCH_MAX_SIZE", "256"))
+MICROBATCH_QUEUE_DEPTH = int(os.getenv("MICROBATCH_QUEUE_DEPTH", "4096"))
+
+# Prometheus-style /metrics with per-stage latency histograms (api/metrics.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Background refit on a reservoir sample of ingested rows (models/refresh.py); 0 disables
+RETRAIN_INTERVAL_S = float(os.getenv("RETRAIN_INTERVAL_S", "0"))
+RESERVOIR_SIZE = int(os.getenv("RESERVOIR_SIZE", "10000"))
+RETRAIN_MIN_ROWS = int(os.getenv("RETRAIN_MIN_ROWS", "1000"))
+
+# Server-side event history behind /events and /stats (api/history.py)
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") == "1"
+HISTORY_MAX_EVENTS = int(os.getenv("HISTORY_MAX_EVENTS", "100000"))
+HISTORY_RETENTION_S = float(os.getenv("HISTORY_RETENTION_S", "3600"))
+HISTORY_PARTITION_S = int(os.getenv("HISTORY_PARTITION_S", "60"))
+HISTORY_DIR = os.getenv("HISTORY_DIR", "")  # save partitions here as NDJSON; empty keeps them in memory only
+HISTORY_QUERY_LIMIT = int(os.getenv("HISTORY_QUERY_LIMIT", "5000"))
+
+# Server-Sent Events push of annotated events on GET /stream (api/stream.py)
+STREAM_ENABLED = os.getenv("STREAM_ENABLED", "1") == "1"
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "1000"))  # buffered events per subscriber
+STREAM_DROP_POLICY = os.getenv("STREAM_DROP_POLICY", "oldest")  # "oldest" or "disconnect" for slow subscribers
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", "100"))
+STREAM_HEARTBEAT_S = float(os.getenv("STREAM_HEARTBEAT_S", "15"))
+
+# Segmented on-disk log of annotated events for replay/retraining (models/sink.py); empty SINK_DIR disables
+SINK_DIR = os.getenv("SINK_DIR", "")
+SINK_FORMAT = os.getenv("SINK_FORMAT", "ndjson")  # "ndjson" (gzip) or "parquet" (needs pyarrow)
+SINK_SEGMENT_MB = float(os.getenv("SINK_SEGMENT_MB", "64"))  # rotate once a segment reaches this size...
+SINK_SEGMENT_S = float(os.getenv("SINK_SEGMENT_S", "300"))  # ...or this age
+SINK_FLUSH_INTERVAL_S = float(os.getenv("SINK_FLUSH_INTERVAL_S", "1"))
+SINK_BUFFER_EVENTS = int(os.getenv("SINK_BUFFER_EVENTS", "100000"))  # batches beyond this are dropped
+SINK_FSYNC = os.getenv("SINK_FSYNC", "rotate")  # "always", "rotate" or "never"
+
+# Per-tenant models (api/registry.py): <TENANT_MODEL_DIR>/<tenant>.joblib, picked with ?tenant= or X-Tenant;
+# empty TENANT_MODEL_DIR disables, tenants without an artifact use the default model
+TENANT_MODEL_DIR = os.getenv("TENANT_MODEL_DIR", "")
+TENANT_MEMORY_MB = float(os.getenv("TENANT_MEMORY_MB", "256"))  # least recently used models are unloaded past this
+
+# Retried /ingest events (api/dedup.py): "key" dedups requests with an Idempotency-Key header,
+# "content" also dedups identical events without one, "off" disables
+DEDUP_MODE = os.getenv("DEDUP_MODE", "key")
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "100000"))  # oldest annotations are dropped past this
+DEDUP_TTL_S = float(os.getenv("DEDUP_TTL_S", "600"))  # a resent event is answered from the cache this long
+DEDUP_WAIT_S = float(os.getenv("DEDUP_WAIT_S", "10"))  # a retry waits this long for the first copy's result
 
 # Dashboard Configuration
 DEFAULT_REFRESH_INTERVAL = int(os.getenv("DEFAULT_REFRESH_INTERVAL", "0"))
@@ -1,4 +1,6 @@
 # dashboard/app.py
+import os
+import sys
 import streamlit as st
 import requests
 import pandas as pd
@@ -7,6 +9,12 @@ from datetime import datetime
 from requests.adapters import HTTPAdapter, Retry
 import altair as alt
 
+# `streamlit run dashboard/app.py` only puts dashboard/ on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.client import SyncIngestClient
+from dashboard.history_feed import HistoryFeed, api_base
+
 # -------------------------
 # CONFIG
 # -------------------------
@@ -35,6 +43,11 @@ if "api_status" not in st.session_state:
 if "processing" not in st.session_state:
     st.session_state.processing = False
 
+# cursor into the API's /events; while available, events come from there
+if "feed" not in st.session_state:
+    st.session_state.feed = HistoryFeed(api_base(API_URL), limit=MAX_EVENTS_DISPLAY, timeout=DEFAULT_TIMEOUT)
+feed = st.session_state.feed
+
 # -------------------------
 # HTTP session with retries
 # -------------------------
@@ -45,6 +58,16 @@ session.mount("https://", adapter)
 session.mount("http://", adapter)
 
 
+@st.cache_resource
+def get_client():
+    # pooled, concurrent sends through /ingest/batch (or /ingest on older servers)
+    return SyncIngestClient(api_base(API_URL), concurrency=5, timeout=DEFAULT_TIMEOUT, batch_size=10, retries=3,
+                            idempotency=True)
+
+
+client = get_client()
+
+
 # -------------------------
 # HELPERS
 # -------------------------
@@ -55,11 +78,47 @@ def pretty_ts(ts_str):
         return str(ts_str or "")
 
 
+def push_events(payloads):
+    """Post payloads to the API; returns (annotated events, error messages)."""
+    annotated, errors = [], []
+    for result in client.send(payloads):
+        if result["success"]:
+            annotated.append(result["annotated_event"])
+        else:
+            errors.append(f"event {result['index'] + 1}: {result['error']}")
+    return annotated, errors
+
+
 def push_event(payload):
     """Post payload to API and return annotated_event dict or raise."""
-    r = session.post(API_URL, json=payload, timeout=DEFAULT_TIMEOUT)
-    r.raise_for_status()
-    return r.json().get("annotated_event", {})
+    annotated, errors = push_events([payload])
+    if errors:
+        raise RuntimeError(errors[0])
+    return annotated[0]
+
+
+def sync_history():
+    """Prepend the events ingested since the last rerun (by anyone) from /events."""
+    try:
+        new_events, reset = feed.poll(session)
+    except Exception as e:
+        st.session_state.last_error = f"history sync failed: {e}"
+        return
+    if reset:
+        st.session_state.events = []
+    if new_events:
+        st.session_state.events = new_events[::-1] + st.session_state.events
+        if len(st.session_state.events) > MAX_EVENTS_DISPLAY:
+            st.session_state.events = st.session_state.events[:MAX_EVENTS_DISPLAY]
+
+
+def add_local(annotated):
+    """Keep an event this session sent, unless it will arrive through /events anyway."""
+    if feed.available:
+        return
+    st.session_state.events.insert(0, annotated)
+    if len(st.session_state.events) > MAX_EVENTS_DISPLAY:
+        st.session_state.events = st.session_state.events[:MAX_EVENTS_DISPLAY]
 
 
 def df_from_events(events):
@@ -108,6 +167,9 @@ def df_from_events(events):
     return df
 
 
+sync_history()
+
+
 # -------------------------
 # SIDEBAR / CONTROLS
 # -------------------------
@@ -142,29 +204,30 @@ with st.sidebar:
         status_text = st.empty()
         
         try:
-            for i in range(int(events_per_click)):
-                status_text.text(f"Sending event {i+1}/{events_per_click}...")
-                progress_bar.progress((i + 1) / events_per_click)
-                
-                payload = {
+            payloads = []
+            for _ in range(int(events_per_click)):
+                payloads.append({
                     "user": f"user_{int(time.time()) % 100}",
                     "event_type": chosen_event_type,
                     "response_time_ms": int(resp_time),
                     "ip": f"10.0.0.{int(time.time() * 1000) % 255}",
-                }
-                
-                annotated = push_event(payload)
+                })
+
+            status_text.text(f"Sending {len(payloads)} events...")
+            annotated_events, errors = push_events(payloads)
+            progress_bar.progress(1.0)
+            for annotated in annotated_events:
                 # normalized timestamp
                 if "timestamp" not in annotated or not annotated["timestamp"]:
                     annotated["timestamp"] = datetime.utcnow().isoformat()
-                st.session_state.events.insert(0, annotated)
-                
-                # Limit events to prevent memory issues
-                if len(st.session_state.events) > MAX_EVENTS_DISPLAY:
-                    st.session_state.events = st.session_state.events[:MAX_EVENTS_DISPLAY]
-                
-                st.session_state.api_status = "Online"
-                
+                add_local(annotated)
+
+            if errors and not annotated_events:
+                raise RuntimeError(errors[0])
+            st.session_state.api_status = "Online"
+            if errors:
+                st.session_state.last_error = f"{len(errors)} of {len(payloads)} events failed; " + "; ".join(errors[:3])
+
         except Exception as e:
             st.session_state.last_error = str(e)
             st.session_state.api_status = "Error"
@@ -181,7 +244,7 @@ with st.sidebar:
 
     st.markdown("---")
     st.markdown("Download")
-    if st.button("Download CSV of local events"):
+    if st.button("Download CSV of loaded events"):
         dfdl = df_from_events(st.session_state.events)
         if not dfdl.empty:
             csv = dfdl.to_csv(index=False)
@@ -283,12 +346,24 @@ with left:
 
 with right:
     st.markdown("### Quick Summary")
-    total = len(df)
-    anomalies = int(df["anomaly_flag"].sum()) if not df.empty else 0
-    normals = total - anomalies
-    st.metric("Total events (local session)", total)
-    st.metric("Anomalies", anomalies)
-    st.metric("Normals", normals)
+    server_stats = None
+    if feed.available:
+        try:
+            server_stats = feed.stats(session)
+        except Exception as e:
+            st.session_state.last_error = f"stats failed: {e}"
+    if server_stats is not None:
+        # precomputed on the server over everything it ingested, not just what is loaded here
+        st.metric("Events (last 5 min, all clients)", server_stats["events"])
+        st.metric("Anomalies", server_stats["anomalies"], delta=f"{server_stats['anomaly_rate'] * 100:.1f}%")
+        st.metric("Events / s", server_stats["events_per_second"])
+    else:
+        total = len(df)
+        anomalies = int(df["anomaly_flag"].sum()) if not df.empty else 0
+        normals = total - anomalies
+        st.metric("Total events (local session)", total)
+        st.metric("Anomalies", anomalies)
+        st.metric("Normals", normals)
 
     st.markdown("### Last error")
     if st.session_state.last_error:
@@ -303,7 +378,7 @@ with right:
             test_payload = {"user": "curl_test", "event_type": "api_access", "response_time_ms": 1000, "ip": "10.0.0.9"}
             annotated = push_event(test_payload)
             st.success("Server-side POST succeeded. Event annotated and added locally.")
-            st.session_state.events.insert(0, annotated)
+            add_local(annotated)
             st.session_state.api_status = "Online"
         except Exception as e:
             st.session_state.last_error = str(e)
@@ -0,0 +1,189 @@
+# dashboard/chart_data.py
+"""Chart payloads with a fixed size, whatever the history length.
+
+``BucketSeries`` keeps count / min / mean / p95 / max of response times and
+the anomaly count per time bucket, updated one event at a time. ``lttb``
+and ``chart_points`` thin the raw points for the scatter layer, always
+keeping flagged events as individual points.
+"""
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+# response-time histogram bin edges (ms) per bucket; p95 is read from the histogram
+RT_EDGES = [0.0] + np.geomspace(1.0, 100_000.0, 64).tolist()
+
+
+class BucketSeries:
+    """Response-time aggregates per time bucket, bounded to ``max_buckets``.
+
+    When a new bucket would exceed ``max_buckets``, the width doubles and
+    neighbouring buckets merge (counts, sums and histograms add up), so
+    memory and chart size stay fixed as history grows. ``trim`` drops the
+    buckets of events the owner no longer keeps, and events older than the
+    trimmed point are ignored, so an old or outlying timestamp only counts
+    while it is retained; ``coarse`` then says whether a rebuild would give
+    narrower buckets.
+    """
+
+    def __init__(self, max_buckets=500, width=1.0):
+        self.max_buckets = max(2, int(max_buckets))
+        self.initial_width = float(width)
+        self.clear()
+
+    def clear(self):
+        self.width = self.initial_width
+        self.buckets = {}  # bucket index -> [count, sum, min, max, anomalies, histogram]
+        self.low = None  # smallest bucket index
+        self.horizon = float("-inf")  # events before this were trimmed (epoch seconds)
+        self.version = getattr(self, "version", 0) + 1
+        self._frame = None
+        self._frame_version = None
+
+    def add(self, t, value, anomaly=False):
+        """One event at ``t`` (epoch seconds) with response time ``value`` (ms)."""
+        if t < self.horizon:
+            return
+        key = int(t // self.width)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_buckets:
+                self._compact()
+                key = int(t // self.width)
+                bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [0, 0.0, value, value, 0, [0] * len(RT_EDGES)]
+                if self.low is None or key < self.low:
+                    self.low = key
+        bucket[0] += 1
+        bucket[1] += value
+        if value < bucket[2]:
+            bucket[2] = value
+        if value > bucket[3]:
+            bucket[3] = value
+        bucket[4] += anomaly
+        bucket[5][bisect_right(RT_EDGES, value) - 1] += 1
+        self.version += 1
+
+    def _compact(self):
+        while len(self.buckets) >= self.max_buckets:
+            self.width *= 2
+            merged = {}
+            for key, (count, total, lo, hi, anomalies, hist) in self.buckets.items():
+                into = merged.get(key // 2)
+                if into is None:
+                    merged[key // 2] = [count, total, lo, hi, anomalies, list(hist)]
+                    continue
+                into[0] += count
+                into[1] += total
+                into[2] = min(into[2], lo)
+                into[3] = max(into[3], hi)
+                into[4] += anomalies
+                into[5] = [a + b for a, b in zip(into[5], hist)]
+            self.buckets = merged
+            self.low //= 2
+
+    def trim(self, before):
+        """Drop the buckets that end at or before ``before`` (epoch seconds)."""
+        if before > self.horizon:
+            self.horizon = before
+        if self.low is None or (self.low + 1) * self.width > before:
+            return
+        cut = int(before // self.width)
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if key >= cut}
+        self.low = min(self.buckets) if self.buckets else None
+        self.version += 1
+
+    def coarse(self):
+        """True when the buckets left could be four times narrower and still fit."""
+        if self.width <= self.initial_width or self.low is None:
+            return False
+        return (max(self.buckets) - self.low + 1) * 4 <= self.max_buckets
+
+    def frame(self):
+        """DataFrame, oldest bucket first: start, count, min, mean, p95, max, anomalies."""
+        if self._frame_version != self.version:
+            keys = sorted(self.buckets)
+            rows = [self.buckets[k] for k in keys]
+            count = np.array([r[0] for r in rows], dtype=np.int64)
+            lo = np.array([r[2] for r in rows], dtype=np.float64)
+            hi = np.array([r[3] for r in rows], dtype=np.float64)
+            p95 = np.empty(len(rows))
+            if rows:
+                hist = np.array([r[5] for r in rows])
+                cumulative = np.cumsum(hist, axis=1)
+                target = 0.95 * count
+                k = np.argmax(cumulative >= target[:, None], axis=1)
+                rows_i = np.arange(len(rows))
+                # interpolate linearly inside the bin that crosses 95%
+                below = cumulative[rows_i, k] - hist[rows_i, k]
+                edges = np.array(RT_EDGES + [RT_EDGES[-1]])
+                p95 = edges[k] + (target - below) / np.maximum(hist[rows_i, k], 1) * (edges[k + 1] - edges[k])
+            self._frame = pd.DataFrame({
+                "start": pd.to_datetime(np.array(keys, dtype=np.float64) * self.width, unit="s"),
+                "count": count,
+                "min": lo,
+                "mean": np.array([r[1] for r in rows], dtype=np.float64) / np.maximum(count, 1),
+                "p95": np.clip(p95, lo, hi),
+                "max": hi,
+                "anomalies": np.array([r[4] for r in rows], dtype=np.int64),
+            })
+            self._frame_version = self.version
+        return self._frame
+
+
+def lttb(x, y, n_out):
+    """Indices of ``n_out`` points picked by Largest-Triangle-Three-Buckets (x ascending)."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets between the ends
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third triangle corner
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        ax, ay = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        px, py = x[prev], y[prev]
+        area = np.abs((px - ax) * (y[lo:hi] - py) - (px - x[lo:hi]) * (ay - py))
+        prev = lo + int(np.argmax(area))
+        out[i + 1] = prev
+    return out
+
+
+def chart_points(store, budget=2000):
+    """At most ``budget`` retained events for the scatter layer, oldest first.
+
+    Every flagged event is kept (the newest ``budget`` if there are more);
+    the remaining budget goes to normal events thinned with LTTB over
+    (timestamp, response time).
+    """
+    idx = store.order(newest_first=False)
+    idx = idx[~np.isnat(store.timestamp[idx])]
+    flagged = store.anomaly_flag[idx]
+    anomalies = idx[flagged][-budget:]
+    normal = idx[~flagged]
+    # stable sort: timestamps come from clients and may arrive out of order
+    normal = normal[np.argsort(store.timestamp[normal], kind="stable")]
+    room = budget - len(anomalies)
+    if room < len(normal):
+        keep = lttb(store.timestamp[normal].astype(np.int64), store.response_time_ms[normal], room) if room > 0 else []
+        normal = normal[keep]
+    picked = np.concatenate([normal, anomalies])
+    picked = picked[np.argsort(store.timestamp[picked], kind="stable")]
+    return pd.DataFrame({
+        "timestamp": store.timestamp[picked],
+        "user": store.user[picked],
+        "event_type": store.event_type[picked],
+        "response_time_ms": store.response_time_ms[picked],
+        "anomaly_score": store.anomaly_score[picked],
+        "anomaly_label": np.where(store.anomaly_flag[picked], "Anomaly", "Normal"),
+    })
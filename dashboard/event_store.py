@@ -0,0 +1,154 @@
+# dashboard/event_store.py
+"""Columnar ring buffer of annotated events for the dashboards."""
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from dashboard.chart_data import BucketSeries
+
+COLUMNS = ["timestamp", "user", "event_type", "response_time_ms", "ip", "anomaly_score", "anomaly_flag"]
+
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH64 = np.datetime64(EPOCH, "us")
+NAT = np.datetime64("NaT")
+
+
+def parse_datetime(value):
+    """ISO-8601 string -> naive UTC datetime; None when missing or unparseable."""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+class EventStore:
+    """Keeps the newest ``capacity`` events in preallocated per-column arrays.
+
+    Appends overwrite the oldest slot, so they are O(1) whatever the size.
+    The anomaly count and per-event-type counts are updated on every append
+    and eviction instead of being recomputed, and ``version`` goes up on
+    every change, which makes it a cheap cache key for derived views
+    (``frame()`` is memoized on it). ``series`` holds time-bucketed response
+    time aggregates of the retained events: buckets before an evicted
+    event's timestamp are dropped, and the series is rebuilt when that
+    leaves its buckets much wider than the retained span needs.
+    """
+
+    def __init__(self, capacity=100_000, max_buckets=500):
+        self.capacity = max(1, int(capacity))
+        self.series = BucketSeries(max_buckets)
+        self.timestamp = np.full(self.capacity, np.datetime64("NaT"), dtype="datetime64[us]")
+        self.user = np.empty(self.capacity, dtype=object)
+        self.event_type = np.empty(self.capacity, dtype=object)
+        self.response_time_ms = np.zeros(self.capacity, dtype=np.int64)
+        self.ip = np.empty(self.capacity, dtype=object)
+        self.anomaly_score = np.zeros(self.capacity, dtype=np.float64)
+        self.anomaly_flag = np.zeros(self.capacity, dtype=bool)
+        self.clear()
+
+    def clear(self):
+        self.next = 0  # slot the next event goes into
+        self.size = 0
+        self.anomaly_count = 0
+        self.type_counts = {}
+        self.total_seen = 0
+        self.series.clear()
+        self.version = getattr(self, "version", 0) + 1
+        self._frame = None
+        self._frame_version = None
+
+    def __len__(self):
+        return self.size
+
+    def append(self, event):
+        """Add one annotated event dict; events without user and event_type are skipped."""
+        if not isinstance(event, dict):
+            return False
+        user = event.get("user") or ""
+        event_type = event.get("event_type") or ""
+        if not user and not event_type:
+            return False
+
+        i = self.next
+        evicted_at = None
+        if self.size == self.capacity:
+            # evict the oldest event from the aggregates before overwriting it
+            if not np.isnat(self.timestamp[i]):
+                evicted_at = (self.timestamp[i] - EPOCH64) / np.timedelta64(1, "s")
+            self.anomaly_count -= int(self.anomaly_flag[i])
+            old = self.event_type[i]
+            left = self.type_counts[old] - 1
+            if left:
+                self.type_counts[old] = left
+            else:
+                del self.type_counts[old]
+        else:
+            self.size += 1
+
+        try:
+            response_time = int(event.get("response_time_ms") or 0)
+        except (TypeError, ValueError):
+            response_time = 0
+        try:
+            score = float(event.get("anomaly_score") or 0.0)
+        except (TypeError, ValueError):
+            score = 0.0
+        flag = bool(event.get("anomaly_flag"))
+
+        ts = parse_datetime(event.get("timestamp"))
+        self.timestamp[i] = NAT if ts is None else np.datetime64(ts, "us")
+        self.user[i] = user
+        self.event_type[i] = event_type
+        self.response_time_ms[i] = response_time
+        self.ip[i] = event.get("ip") or ""
+        self.anomaly_score[i] = score
+        self.anomaly_flag[i] = flag
+
+        if ts is not None:
+            self.series.add((ts - EPOCH).total_seconds(), response_time, flag)
+        if evicted_at is not None:
+            self.series.trim(evicted_at)
+            if self.series.coarse():
+                self._rebuild_series()
+        self.anomaly_count += flag
+        self.type_counts[event_type] = self.type_counts.get(event_type, 0) + 1
+        self.total_seen += 1
+        self.next = (i + 1) % self.capacity
+        self.version += 1
+        return True
+
+    def _rebuild_series(self):
+        horizon = self.series.horizon
+        self.series.clear()
+        self.series.horizon = horizon
+        idx = self.order(newest_first=False)
+        idx = idx[~np.isnat(self.timestamp[idx])]
+        seconds = (self.timestamp[idx] - EPOCH64) / np.timedelta64(1, "s")
+        for t, value, flag in zip(seconds.tolist(), self.response_time_ms[idx].tolist(), self.anomaly_flag[idx].tolist()):
+            self.series.add(t, value, flag)
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def order(self, newest_first=True, limit=None):
+        """Slot indices of the retained events, newest first by default."""
+        idx = (self.next - 1 - np.arange(self.size)) % self.capacity
+        if not newest_first:
+            idx = idx[::-1]
+        return idx if limit is None else idx[:limit]
+
+    def frame(self):
+        """DataFrame of the retained events, newest first; rebuilt only when ``version`` changed."""
+        if self._frame_version != self.version:
+            idx = self.order()
+            self._frame = pd.DataFrame({name: getattr(self, name)[idx] for name in COLUMNS})
+            self._frame_version = self.version
+        return self._frame
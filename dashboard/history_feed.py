@@ -0,0 +1,71 @@
+# dashboard/history_feed.py
+"""Incremental reads of the API's server-side history (/events and /stats).
+
+Each dashboard session keeps a cursor and asks only for events ingested
+since its last rerun, so a rerun costs one small request instead of the
+session re-sending or re-deriving everything it has seen. Against an API
+without /events (older deployments) the feed marks itself unavailable and
+the dashboards fall back to showing the events they sent themselves.
+"""
+import time
+
+
+def api_base(ingest_url):
+    """https://host/ingest -> https://host"""
+    return ingest_url.rsplit("/ingest", 1)[0].rstrip("/")
+
+
+class HistoryFeed:
+    def __init__(self, base_url, limit=1000, timeout=30, retry_s=30.0):
+        self.base_url = base_url
+        self.limit = limit
+        self.timeout = timeout
+        self.retry_s = retry_s  # after a failed request, skip calls for this long
+        self.failed_at = None
+        self.cursor = None  # None until the first poll: start from the newest `limit` events
+        self.available = None  # None = not asked yet, False = API has no /events
+
+    def _get(self, session, path, params):
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_s:
+            return None  # API unreachable a moment ago: don't stall every rerun on it
+        try:
+            r = session.get(self.base_url + path, params=params, timeout=self.timeout)
+        except Exception:
+            self.failed_at = time.monotonic()
+            raise
+        self.failed_at = None
+        if r.status_code == 404:
+            self.available = False
+            return None
+        r.raise_for_status()
+        self.available = True
+        return r.json()
+
+    def poll(self, session):
+        """New events, oldest first, and whether the caller must drop what it holds.
+
+        When more than ``limit`` events arrived since the last poll, the gap is
+        skipped: the newest ``limit`` are returned with reset=True.
+        """
+        if self.available is False:
+            return [], False
+        params = {"limit": self.limit}
+        if self.cursor is not None:
+            params["cursor"] = self.cursor
+        page = self._get(session, "/events", params)
+        if page is None:
+            return [], False
+        reset = False
+        if page["more"]:
+            newest = self._get(session, "/events", {"limit": self.limit})
+            # if that failed, keep the forward page; its cursor continues from there
+            if newest is not None:
+                page, reset = newest, True
+        self.cursor = page["cursor"]
+        return page["events"], reset
+
+    def stats(self, session, window=300):
+        """Server-side rolling aggregates, or None if the API does not provide them."""
+        if self.available is False:
+            return None
+        return self._get(session, "/stats", {"window": window})
@@ -0,0 +1,124 @@
+# dashboard/live_stream.py
+"""Background reader of the API's /stream (Server-Sent Events).
+
+A daemon thread keeps one streaming GET open and parses messages into a
+thread-safe buffer; the dashboard drains it from a small fragment that
+reruns the page only when something arrived. On a dropped connection it
+reconnects with Last-Event-ID, so the API replays what was missed.
+
+Streamlit gives no signal when a browser tab goes away, so the reader
+stops itself once nobody has drained it for ``idle_s`` seconds; otherwise
+every closed tab would keep a thread, a buffer and one of the server's
+STREAM_MAX_CLIENTS slots forever. The reader has its own requests.Session,
+since sessions are not meant to be shared between threads.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+import requests
+
+
+class LiveStream:
+    def __init__(self, url, last_id=None, max_buffer=100_000, retry_s=2.0, idle_s=30.0):
+        self.url = url
+        self.session = requests.Session()
+        self.buffer = deque(maxlen=max_buffer)  # (seq or None, event)
+        self.dropped = 0  # events the server skipped for this client (its queue overflowed)
+        self.error = None
+        self.last_id = last_id  # resume point, e.g. the /events cursor already loaded
+        self.retry_s = retry_s
+        self.idle_s = idle_s
+        self.drained_at = time.monotonic()
+        self._stop = threading.Event()
+        self._response = None
+        self._thread = threading.Thread(target=self._run, name="live-stream", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        response = self._response
+        if response is not None:
+            response.close()  # unblocks iter_lines
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    @property
+    def idle(self):
+        return time.monotonic() - self.drained_at > self.idle_s
+
+    def drain(self):
+        """Everything received since the last call, oldest first."""
+        self.drained_at = time.monotonic()
+        out = []
+        while self.buffer:
+            out.append(self.buffer.popleft())
+        return out
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            self._stop.set()
+            self.buffer.clear()
+            self.session.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self.idle:
+                self.error = "stopped: not read for a while"
+                return
+            headers = {"Accept": "text/event-stream"}
+            if self.last_id is not None:
+                headers["Last-Event-ID"] = str(self.last_id)
+            try:
+                with self.session.get(self.url, headers=headers, stream=True, timeout=(10, 60)) as r:
+                    r.raise_for_status()
+                    self._response = r
+                    self.error = None
+                    self._read(r)
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                self.error = str(e)
+            finally:
+                self._response = None
+            if not self.idle:
+                self._stop.wait(self.retry_s)
+
+    def _read(self, response):
+        seq = name = None
+        data = []
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            # heartbeats arrive at least every STREAM_HEARTBEAT_S, so this runs even when idle
+            if self._stop.is_set() or self.idle:
+                return
+            if line:
+                if line.startswith(":"):
+                    continue  # heartbeat
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "id":
+                    seq = int(value) if value.isdigit() else None
+                elif field == "event":
+                    name = value
+                elif field == "data":
+                    data.append(value)
+                continue
+            # blank line: end of one message
+            if data:
+                payload = json.loads("\n".join(data))
+                if name == "dropped":
+                    self.dropped += payload.get("dropped", 0)
+                else:
+                    self.buffer.append((seq, payload))
+                    if seq is not None:
+                        self.last_id = seq
+            seq = name = None
+            data = []
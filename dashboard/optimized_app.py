@@ -1,4 +1,6 @@
 # dashboard/optimized_app.py
+import os
+import sys
 import streamlit as st
 import requests
 import pandas as pd
@@ -6,17 +8,30 @@ import time
 from datetime import datetime
 from requests.adapters import HTTPAdapter, Retry
 import altair as alt
-import asyncio
-import aiohttp
-from concurrent.futures import ThreadPoolExecutor
+
+# `streamlit run dashboard/optimized_app.py` only puts dashboard/ on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.client import SyncIngestClient
+from dashboard.chart_data import chart_points
+from dashboard.event_store import EventStore
+from dashboard.history_feed import HistoryFeed, api_base
+from dashboard.live_stream import LiveStream
 
 # -------------------------
 # CONFIG
 # -------------------------
 API_URL = "https://cloud-ai-anomaly-guardian.onrender.com/ingest"
 DEFAULT_TIMEOUT = 30
-MAX_EVENTS_DISPLAY = 1000
-BATCH_SIZE = 5  # Process events in batches
+MAX_EVENTS_RETAINED = 100_000  # ring buffer size; older events are dropped
+CHART_POINTS = 2000  # most raw events drawn in the response time chart (anomalies first)
+CHART_BUCKETS = 500  # most time buckets in the response time band
+BATCH_SIZE = 5  # events per /ingest/batch request
+CLIENT_CONCURRENCY = 5  # requests in flight at once
+HISTORY_PAGE = 5000  # max events pulled from /events per rerun
+STATS_WINDOW_S = 300
+LIVE_POLL_S = 0.5  # how often the live fragment checks for streamed events
+LIVE_IDLE_S = 30  # the reader stops once the fragment has not drained it for this long (tab closed)
 
 st.set_page_config(
     page_title="Anomaly Guardian — Dashboard",
@@ -27,8 +42,9 @@ st.set_page_config(
 # -------------------------
 # SESSION STATE init
 # -------------------------
-if "events" not in st.session_state:
-    st.session_state.events = []
+if "store" not in st.session_state:
+    st.session_state.store = EventStore(MAX_EVENTS_RETAINED, CHART_BUCKETS)
+store = st.session_state.store
 
 if "last_error" not in st.session_state:
     st.session_state.last_error = None
@@ -39,11 +55,20 @@ if "api_status" not in st.session_state:
 if "processing" not in st.session_state:
     st.session_state.processing = False
 
+# cursor into the API's /events; while available, events come from there
+if "feed" not in st.session_state:
+    st.session_state.feed = HistoryFeed(api_base(API_URL), limit=HISTORY_PAGE, timeout=DEFAULT_TIMEOUT)
+feed = st.session_state.feed
+
+# /stream reader thread while "Live stream" is on
+if "live" not in st.session_state:
+    st.session_state.live = None
+    st.session_state.live_dropped = 0
+
 # -------------------------
 # Optimized HTTP session
 # -------------------------
-@st.cache_resource
-def get_session():
+def make_session():
     session = requests.Session()
     retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
     adapter = HTTPAdapter(max_retries=retries, pool_connections=10, pool_maxsize=10)
@@ -51,75 +76,129 @@ def get_session():
     session.mount("http://", adapter)
     return session
 
-session = get_session()
+# one per browser session: requests.Session is not safe to share between the sessions' threads
+if "http" not in st.session_state:
+    st.session_state.http = make_session()
+session = st.session_state.http
+
+
+@st.cache_resource
+def get_client():
+    # one connection pool for all sessions and reruns
+    return SyncIngestClient(api_base(API_URL), CLIENT_CONCURRENCY, DEFAULT_TIMEOUT, BATCH_SIZE, retries=3, idempotency=True)
+
+client = get_client()
 
 # -------------------------
 # HELPERS
 # -------------------------
-@st.cache_data(ttl=60)
-def cached_dataframe_operations(events_hash):
-    """Cache expensive dataframe operations"""
-    return df_from_events(st.session_state.events)
-
-def push_event_batch(payloads):
-    """Send multiple events in parallel"""
-    results = []
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(push_event, payload) for payload in payloads]
-        for future in futures:
-            try:
-                result = future.result(timeout=DEFAULT_TIMEOUT)
-                results.append(result)
-            except Exception as e:
-                raise e
-    return results
-
-def push_event(payload):
-    """Post payload to API and return annotated_event dict or raise."""
-    r = session.post(API_URL, json=payload, timeout=DEFAULT_TIMEOUT)
-    r.raise_for_status()
-    return r.json().get("annotated_event", {})
-
-def df_from_events(events):
-    """Return a safe dataframe with required columns and sanitized values."""
-    if not events:
-        return pd.DataFrame(columns=[
-            "timestamp", "ts_pretty", "user", "event_type", "response_time_ms",
-            "ip", "anomaly_score", "anomaly_flag"
-        ])
-
-    # Use list comprehension for better performance
-    safe_events = [
-        {
-            "timestamp": e.get("timestamp") or "",
-            "user": e.get("user") or "",
-            "event_type": e.get("event_type") or "",
-            "response_time_ms": e.get("response_time_ms") if e.get("response_time_ms") is not None else 0,
-            "ip": e.get("ip") or "",
-            "anomaly_score": e.get("anomaly_score") if e.get("anomaly_score") is not None else 0.0,
-            "anomaly_flag": bool(e.get("anomaly_flag")) if e.get("anomaly_flag") is not None else False,
-        }
-        for e in events if isinstance(e, dict)
-    ]
-
-    if not safe_events:
-        return pd.DataFrame(columns=[
-            "timestamp", "ts_pretty", "user", "event_type", "response_time_ms",
-            "ip", "anomaly_score", "anomaly_flag"
-        ])
-
-    df = pd.DataFrame(safe_events)
-
-    # Optimize pandas operations
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df["ts_pretty"] = df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S").fillna("")
-    df["response_time_ms"] = pd.to_numeric(df["response_time_ms"], errors="coerce").fillna(0).astype(int)
-    df["anomaly_score"] = pd.to_numeric(df["anomaly_score"], errors="coerce").fillna(0.0).astype(float)
-    df["anomaly_flag"] = df["anomaly_flag"].astype(bool)
-
-    # Filter out empty rows
-    df = df[~((df["user"] == "") & (df["event_type"] == ""))].reset_index(drop=True)
-    return df
+def send_events(payloads):
+    """Send events concurrently; returns (annotated events, error messages) - one failure doesn't lose the rest."""
+    annotated, errors = [], []
+    for result in client.send(payloads):
+        if result["success"]:
+            annotated.append(result["annotated_event"])
+        else:
+            errors.append(f"event {result['index'] + 1}: {result['error']}")
+    return annotated, errors
+
+def sync_history():
+    """Append the events ingested since the last rerun (by any client) from /events."""
+    live = st.session_state.live
+    if live is not None and live.running and feed.cursor is not None:
+        return  # the stream delivers new events
+    try:
+        new_events, reset = feed.poll(session)
+    except Exception as e:
+        st.session_state.last_error = f"History sync failed: {e}"
+        return
+    if reset:
+        store.clear()
+    store.extend(new_events)
+
+
+def add_local(annotated):
+    """Keep an event this session sent, unless it will arrive through /events anyway."""
+    if feed.available:
+        return
+    if "timestamp" not in annotated or not annotated["timestamp"]:
+        annotated["timestamp"] = datetime.utcnow().isoformat()
+    store.append(annotated)
+
+
+def set_live(enabled):
+    """Start or stop the /stream reader; it resumes from the /events cursor already loaded."""
+    live = st.session_state.live
+    # a reader that stopped itself while the tab was away is replaced
+    if enabled and (live is None or not live.running) and feed.available:
+        st.session_state.live = LiveStream(feed.base_url + "/stream", last_id=feed.cursor, idle_s=LIVE_IDLE_S).start()
+        st.session_state.live_dropped = 0
+    elif not enabled and live is not None:
+        live.stop()
+        st.session_state.live = None
+
+
+def apply_live():
+    """Move streamed events into the store; True if anything changed."""
+    live = st.session_state.live
+    items = live.drain()
+    if live.dropped != st.session_state.live_dropped:
+        # the server skipped events for us: refill from /events instead
+        st.session_state.live_dropped = live.dropped
+        before = store.version
+        try:
+            new_events, reset = feed.poll(session)
+        except Exception as e:
+            st.session_state.last_error = f"History sync failed: {e}"
+            return False
+        if reset:
+            store.clear()
+        store.extend(new_events)
+        return store.version != before
+    changed = False
+    for seq, event in items:
+        if seq is not None:
+            if feed.cursor is not None and seq <= feed.cursor:
+                continue
+            feed.cursor = seq
+        changed = store.append(event) or changed
+    return changed
+
+
+@st.fragment(run_every=LIVE_POLL_S)
+def live_updates():
+    """Cheap check every LIVE_POLL_S; the page reruns only when events arrived."""
+    live = st.session_state.live
+    if live is None:
+        return
+    if live.error:
+        st.caption(f"🔴 Stream: {live.error}")
+    else:
+        st.caption(f"🟢 Streaming · {live.dropped} dropped")
+    if apply_live():
+        st.rerun()
+
+
+def cached_chart_points():
+    """chart_points() of the store, recomputed only when it changed."""
+    cached = st.session_state.get("chart_points")
+    if cached is None or cached[0] != store.version:
+        cached = (store.version, chart_points(store, CHART_POINTS))
+        st.session_state.chart_points = cached
+    return cached[1]
+
+
+def server_stats():
+    if not feed.available:
+        return None
+    try:
+        return feed.stats(session, STATS_WINDOW_S)
+    except Exception as e:
+        st.session_state.last_error = f"Stats failed: {e}"
+        return None
+
+
+sync_history()
 
 # -------------------------
 # SIDEBAR / CONTROLS
@@ -128,7 +207,13 @@ with st.sidebar:
     st.title("🛡️ Controls")
     st.markdown("Generate synthetic events and send them to the cloud API.")
 
-    refresh_interval = st.number_input("Auto refresh (s, 0 = off)", value=0, min_value=0, step=1)
+    live_enabled = st.toggle("⚡ Live stream", value=True, disabled=feed.available is False,
+                             help="Push new events from the API's /stream instead of polling")
+    set_live(live_enabled and feed.available)
+    live_updates()
+    refresh_interval = st.number_input(
+        "Auto refresh (s, 0 = off)", value=0, min_value=0, step=1, disabled=st.session_state.live is not None
+    )
     events_per_click = st.number_input("Events per click", value=1, min_value=1, max_value=20, step=1)
     chosen_event_type = st.selectbox("Event type", ["api_access", "login_success", "login_failed", "password_change"])
     resp_time = st.slider("Response time (ms)", 50, 2000, value=300)
@@ -180,35 +265,21 @@ with st.sidebar:
                     }
                     payloads.append(payload)
                 
-                # Process in batches for better performance
-                for batch_start in range(0, len(payloads), BATCH_SIZE):
-                    batch_end = min(batch_start + BATCH_SIZE, len(payloads))
-                    batch = payloads[batch_start:batch_end]
-                    
-                    status_text.text(f"Processing batch {batch_start//BATCH_SIZE + 1}...")
-                    progress_bar.progress((batch_end) / len(payloads))
-                    
-                    if len(batch) == 1:
-                        # Single event
-                        annotated = push_event(batch[0])
-                        if "timestamp" not in annotated or not annotated["timestamp"]:
-                            annotated["timestamp"] = datetime.utcnow().isoformat()
-                        st.session_state.events.insert(0, annotated)
-                    else:
-                        # Batch processing
-                        results = push_event_batch(batch)
-                        for annotated in results:
-                            if "timestamp" not in annotated or not annotated["timestamp"]:
-                                annotated["timestamp"] = datetime.utcnow().isoformat()
-                            st.session_state.events.insert(0, annotated)
-                
-                # Memory management
-                if len(st.session_state.events) > MAX_EVENTS_DISPLAY:
-                    st.session_state.events = st.session_state.events[:MAX_EVENTS_DISPLAY]
-                
+                status_text.text(f"Sending {len(payloads)} events...")
+                annotated_events, errors = send_events(payloads)
+                progress_bar.progress(1.0)
+                for annotated in annotated_events:
+                    add_local(annotated)
+
+                if errors and not annotated_events:
+                    raise RuntimeError(errors[0])
                 st.session_state.api_status = "Online"
-                status_text.text("✅ All events sent successfully!")
-                
+                if errors:
+                    st.session_state.last_error = f"{len(errors)} of {len(payloads)} events failed; " + "; ".join(errors[:3])
+                    status_text.text(f"⚠️ {len(annotated_events)} sent, {len(errors)} failed")
+                else:
+                    status_text.text("✅ All events sent successfully!")
+
         except Exception as e:
             st.session_state.last_error = str(e)
             st.session_state.api_status = "Error"
@@ -219,16 +290,21 @@ with st.sidebar:
             st.rerun()
 
     if clear_button:
-        st.session_state.events = []
+        store.clear()
         st.session_state.last_error = None
         st.rerun()
 
     st.markdown("---")
     st.markdown("**📊 Quick Stats**")
-    total = len(st.session_state.events)
-    if total > 0:
-        df_temp = df_from_events(st.session_state.events)
-        anomalies = int(df_temp["anomaly_flag"].sum()) if not df_temp.empty else 0
+    stats = server_stats()
+    total = len(store)
+    if stats is not None:
+        # rolling aggregates precomputed by the API over all clients' events
+        st.metric(f"Events (last {STATS_WINDOW_S // 60} min)", stats["events"])
+        st.metric("Anomalies", stats["anomalies"], delta=f"{stats['anomaly_rate'] * 100:.1f}%")
+        st.metric("Events / s", stats["events_per_second"])
+    elif total > 0:
+        anomalies = store.anomaly_count
         st.metric("Total Events", total)
         st.metric("Anomalies", anomalies, delta=f"{(anomalies/total*100):.1f}%" if total > 0 else "0%")
     else:
@@ -239,9 +315,8 @@ with st.sidebar:
 # -------------------------
 st.markdown("## 🛡️ Anomaly Guardian — Live Dashboard")
 
-# Create hash for caching
-events_hash = hash(str(st.session_state.events))
-df = cached_dataframe_operations(events_hash)
+# rebuilt only when the store's version changed since the last rerun
+df = store.frame()
 
 if df.empty:
     st.info("🎯 No events yet. Click 'Generate & Send' in the sidebar to start monitoring!")
@@ -252,18 +327,20 @@ else:
         with col_a:
             user_filter = st.text_input("👤 Filter user contains", value="")
         with col_b:
-            event_types = sorted(df["event_type"].dropna().unique().tolist()) if "event_type" in df.columns else []
+            event_types = sorted(store.type_counts)
             event_filter = st.selectbox("📋 Event type filter", options=["ALL"] + event_types)
         with col_c:
             show_count = st.number_input("📄 Show rows", min_value=5, max_value=200, value=50)
 
     # Apply filters
-    view_df = df.copy()
+    view_df = df
     if user_filter:
-        view_df = view_df[view_df["user"].str.contains(user_filter, na=False, case=False)]
+        view_df = view_df[view_df["user"].str.contains(user_filter, na=False, case=False, regex=False)]
     if event_filter != "ALL":
         view_df = view_df[view_df["event_type"] == event_filter]
-    view_df = view_df.head(int(show_count))
+    view_df = view_df.head(int(show_count)).copy()
+    # format only the rows on screen
+    view_df["ts_pretty"] = view_df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S").fillna("")
 
     # Display table with better formatting
     display_df = view_df[[
@@ -291,10 +368,7 @@ else:
         try:
             summary = pd.DataFrame({
                 "type": ["Normal", "Anomaly"],
-                "count": [
-                    int((df["anomaly_flag"] == False).sum()), 
-                    int((df["anomaly_flag"] == True).sum())
-                ]
+                "count": [len(store) - store.anomaly_count, store.anomaly_count]
             })
             
             bar_chart = alt.Chart(summary).mark_bar(cornerRadius=5).encode(
@@ -314,24 +388,37 @@ else:
     with chart_col2:
         st.markdown("**Response Time Trends**")
         try:
-            if not df.empty and "timestamp" in df.columns:
-                df_rt = df.dropna(subset=["timestamp"]).copy()
-                if not df_rt.empty:
-                    df_rt["anomaly_label"] = df_rt["anomaly_flag"].map({True: "Anomaly", False: "Normal"})
-                    
-                    scatter_chart = alt.Chart(df_rt).mark_circle(size=80, opacity=0.8).encode(
-                        x=alt.X("timestamp:T", title="Time"),
-                        y=alt.Y("response_time_ms:Q", title="Response Time (ms)"),
-                        color=alt.Color(
-                            "anomaly_label:N", 
-                            scale=alt.Scale(domain=["Normal", "Anomaly"], range=["#2E8B57", "#DC143C"])
-                        ),
-                        tooltip=["user", "event_type", "response_time_ms", "anomaly_score"]
-                    ).properties(height=200)
-                    
-                    st.altair_chart(scatter_chart, use_container_width=True)
-                else:
-                    st.info("No timestamped data available")
+            # fixed-size payload: <= CHART_BUCKETS aggregates + <= CHART_POINTS raw events
+            buckets = store.series.frame()
+            points = cached_chart_points()
+            if not points.empty:
+                band = alt.Chart(buckets).mark_area(opacity=0.2, color="#2E8B57").encode(
+                    x=alt.X("start:T", title="Time"),
+                    y=alt.Y("min:Q", title="Response Time (ms)"),
+                    y2="max:Q",
+                    tooltip=["start:T", "count:Q", "min:Q", "mean:Q", "p95:Q", "max:Q", "anomalies:Q"],
+                )
+                mean_line = alt.Chart(buckets).mark_line(color="#2E8B57").encode(x="start:T", y="mean:Q")
+                p95_line = alt.Chart(buckets).mark_line(color="#2E8B57", strokeDash=[4, 3]).encode(
+                    x="start:T", y="p95:Q"
+                )
+                scatter_chart = alt.Chart(points).mark_circle(size=40, opacity=0.8).encode(
+                    x=alt.X("timestamp:T", title="Time"),
+                    y=alt.Y("response_time_ms:Q", title="Response Time (ms)"),
+                    color=alt.Color(
+                        "anomaly_label:N",
+                        scale=alt.Scale(domain=["Normal", "Anomaly"], range=["#2E8B57", "#DC143C"])
+                    ),
+                    tooltip=["user", "event_type", "response_time_ms", "anomaly_score"]
+                )
+
+                st.altair_chart(
+                    (band + mean_line + p95_line + scatter_chart).properties(height=200),
+                    use_container_width=True,
+                )
+                st.caption("Band: min–max per time bucket · solid: mean · dashed: p95 · dots: sampled events, all anomalies")
+            else:
+                st.info("No timestamped data available")
         except Exception as e:
             st.error(f"Chart error: {e}")
 
@@ -339,7 +426,7 @@ else:
 if st.session_state.last_error:
     st.error(f"🚨 Last Error: {st.session_state.last_error}")
 
-# Auto-refresh (optimized)
-if refresh_interval > 0 and not st.session_state.processing:
+# Auto-refresh (optimized); the live stream replaces it while on
+if refresh_interval > 0 and st.session_state.live is None and not st.session_state.processing:
     time.sleep(refresh_interval)
     st.rerun()
\ No newline at end of file
@@ -0,0 +1,113 @@
+# data_simulator/evaluate.py
+"""Score detector output against the simulator's ground-truth labels.
+
+    python data_simulator/simulator.py --seed 7 --rate 1000 --duration 300 --bulk \\
+        --scenario credential_stuffing:at=120,duration=30 \\
+      | python models/detector.py --batch-size 512 \\
+      | python data_simulator/evaluate.py
+
+Reads annotated NDJSON (``anomaly`` label, ``anomaly_flag`` prediction and
+optionally ``scenario``) and reports precision/recall overall, the share of
+each scenario's events that were flagged, and the throughput at which lines
+arrived (overall and while each scenario's events were flowing).
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+
+
+class Tally:
+    __slots__ = ("events", "labelled", "flagged", "hits", "first", "last")
+
+    def __init__(self):
+        self.events = 0
+        self.labelled = 0  # events labelled anomalous
+        self.flagged = 0  # events the detector flagged
+        self.hits = 0  # labelled and flagged
+        self.first = None
+        self.last = None
+
+    def add(self, label, flag, now):
+        self.events += 1
+        self.labelled += label
+        self.flagged += flag
+        self.hits += label and flag
+        if self.first is None:
+            self.first = now
+        self.last = now
+
+    def summary(self):
+        precision = self.hits / self.flagged if self.flagged else None
+        recall = self.hits / self.labelled if self.labelled else None
+        f1 = None
+        if precision and recall:
+            f1 = 2 * precision * recall / (precision + recall)
+        span = (self.last - self.first) if self.events > 1 else 0.0
+        return {
+            "events": self.events,
+            "labelled_anomalies": self.labelled,
+            "flagged": self.flagged,
+            "flag_rate": round(self.flagged / self.events, 4) if self.events else None,
+            "precision": None if precision is None else round(precision, 4),
+            "recall": None if recall is None else round(recall, 4),
+            "f1": None if f1 is None else round(f1, 4),
+            "events_per_s": round(self.events / span, 1) if span > 0 else None,
+        }
+
+
+def evaluate(lines, clock=time.perf_counter):
+    """Tally annotated NDJSON lines; returns (overall Tally, {scenario: Tally}, skipped lines)."""
+    overall = Tally()
+    per_scenario = defaultdict(Tally)
+    skipped = 0
+    for line in lines:
+        try:
+            event = json.loads(line)
+            label = bool(event["anomaly"])
+            flag = bool(event["anomaly_flag"])
+        except (ValueError, KeyError, TypeError):
+            skipped += 1
+            continue
+        now = clock()
+        overall.add(label, flag, now)
+        per_scenario[event.get("scenario", "anomaly" if label else "normal")].add(label, flag, now)
+    return overall, per_scenario, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precision/recall of detector output per scenario.")
+    parser.add_argument("input", nargs="?", default="-", help="annotated NDJSON file (default: stdin)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    try:
+        overall, per_scenario, skipped = evaluate(source)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    report = {
+        "overall": overall.summary(),
+        "scenarios": {name: tally.summary() for name, tally in sorted(per_scenario.items())},
+        "skipped_lines": skipped,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    def fmt(value):
+        return "-" if value is None else str(value)
+
+    columns = ["events", "labelled_anomalies", "flagged", "flag_rate", "precision", "recall", "f1", "events_per_s"]
+    print(f"{'scenario':<22}" + "".join(f"{c:>20}" for c in columns))
+    for name, summary in [("overall", report["overall"]), *report["scenarios"].items()]:
+        print(f"{name:<22}" + "".join(f"{fmt(summary[c]):>20}" for c in columns))
+    if skipped:
+        print(f"({skipped} lines without anomaly/anomaly_flag skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# data_simulator/scenarios.py
+"""Composable traffic scenarios for the simulator, with ground-truth labels.
+
+A scenario can reshape the base arrival rate (diurnal), add its own events
+on top (burst, credential_stuffing) or alter base events (drift). Specs look
+like ``name:key=value,...`` with times in seconds from the start:
+
+    burst:at=60,duration=5,factor=100
+    credential_stuffing:at=120,duration=30,rate=200,user=7
+    drift:start=0,duration=3600,shift_ms=600,anomaly_above_ms=400
+    diurnal:period=600,amplitude=0.8
+
+Every generated line carries ``anomaly`` (the label) and ``scenario`` (which
+pattern produced it), so detector output can be scored per pattern by
+data_simulator/evaluate.py.
+"""
+import numpy as np
+
+from data_simulator.simulator import CHUNK, EVENT_TYPES, IP_PREFIXES, format_lines, generate_columns
+
+# values of the "scenario" field; base traffic is "normal" or "slow_response"
+BASE_LABELS = ["normal", "slow_response"]
+
+LOGIN_FAILED = EVENT_TYPES.index("login_failed")
+LOGIN_SUCCESS = EVENT_TYPES.index("login_success")
+API_ACCESS = EVENT_TYPES.index("api_access")
+
+
+class Scenario:
+    """Hooks a scenario may implement; times are seconds since the start."""
+
+    name = None
+
+    def rate_multiplier(self, t):
+        """Factor applied to the base arrival rate at times ``t`` (array), or None."""
+        return None
+
+    def overlay(self, t0, t1, rng):
+        """Extra (offsets, columns) arriving in [t0, t1), or None."""
+        return None
+
+    def modify(self, offsets, columns, label):
+        """Alter base-traffic columns in place; ``label`` is this scenario's index."""
+
+
+def poisson_arrivals(rate, t0, t1, rng):
+    n = rng.poisson(rate * (t1 - t0))
+    return np.sort(rng.uniform(t0, t1, n))
+
+
+class Burst(Scenario):
+    """A ``factor``-times jump in volume for ``duration`` seconds, from a few scraper IPs."""
+
+    name = "burst"
+
+    def __init__(self, base_rate, at=60.0, duration=5.0, factor=100.0, sources=8):
+        self.rate = base_rate * max(float(factor) - 1.0, 0.0)
+        self.start = float(at)
+        self.end = self.start + float(duration)
+        self.sources = int(sources)
+
+    def overlay(self, t0, t1, rng):
+        lo, hi = max(t0, self.start), min(t1, self.end)
+        if lo >= hi:
+            return None
+        offsets = poisson_arrivals(self.rate, lo, hi, rng)
+        n = len(offsets)
+        return offsets, {
+            "user": rng.integers(1, 21, n),
+            "event_type": np.full(n, API_ACCESS),
+            "response_time_ms": rng.integers(50, 301, n),
+            "ip_prefix": np.full(n, IP_PREFIXES.index("172.16.0.")),
+            "ip_octet": rng.integers(1, self.sources + 1, n),
+            "anomaly": np.ones(n, dtype=bool),
+        }
+
+
+class CredentialStuffing(Scenario):
+    """A brute-force login storm on one user from many addresses, mostly failing fast."""
+
+    name = "credential_stuffing"
+
+    def __init__(self, base_rate, at=120.0, duration=30.0, rate=200.0, user=7, success_ratio=0.02):
+        self.rate = float(rate)
+        self.start = float(at)
+        self.end = self.start + float(duration)
+        self.user = int(user)
+        self.success_ratio = float(success_ratio)
+
+    def overlay(self, t0, t1, rng):
+        lo, hi = max(t0, self.start), min(t1, self.end)
+        if lo >= hi:
+            return None
+        offsets = poisson_arrivals(self.rate, lo, hi, rng)
+        n = len(offsets)
+        return offsets, {
+            "user": np.full(n, self.user),
+            "event_type": np.where(rng.random(n) < self.success_ratio, LOGIN_SUCCESS, LOGIN_FAILED),
+            "response_time_ms": rng.integers(20, 81, n),
+            "ip_prefix": np.full(n, IP_PREFIXES.index("203.0.113.")),
+            "ip_octet": rng.integers(1, 255, n),
+            "anomaly": np.ones(n, dtype=bool),
+        }
+
+
+class Drift(Scenario):
+    """Response times of base traffic creep up linearly by ``shift_ms`` over ``duration``.
+
+    Drifted events count as anomalies once their added latency reaches
+    ``anomaly_above_ms``; by default drift is benign and only tests how many
+    false positives a slowly moving baseline causes.
+    """
+
+    name = "drift"
+
+    def __init__(self, base_rate, start=0.0, duration=3600.0, shift_ms=500.0, anomaly_above_ms=float("inf")):
+        self.start = float(start)
+        self.duration = max(float(duration), 1e-9)
+        self.shift_ms = float(shift_ms)
+        self.anomaly_above_ms = float(anomaly_above_ms)
+
+    def modify(self, offsets, columns, label):
+        added = self.shift_ms * np.clip((offsets - self.start) / self.duration, 0.0, 1.0)
+        drifted = (added > 0) & ~columns["anomaly"]
+        columns["response_time_ms"] = columns["response_time_ms"] + added.astype(np.int64)
+        columns["scenario"][drifted] = label
+        columns["anomaly"] |= drifted & (added >= self.anomaly_above_ms)
+
+
+class Diurnal(Scenario):
+    """Sine-wave volume: the base rate times 1 + amplitude * sin(2*pi*(t + phase) / period)."""
+
+    name = "diurnal"
+
+    def __init__(self, base_rate, period=86400.0, amplitude=0.5, phase=0.0):
+        self.period = float(period)
+        self.amplitude = min(abs(float(amplitude)), 1.0)
+        self.phase = float(phase)
+
+    def rate_multiplier(self, t):
+        return 1.0 + self.amplitude * np.sin(2.0 * np.pi * (t + self.phase) / self.period)
+
+
+SCENARIOS = {cls.name: cls for cls in (Burst, CredentialStuffing, Drift, Diurnal)}
+
+
+def parse_scenario(spec, base_rate):
+    """Build a scenario from ``name:key=value,...``."""
+    name, _, params = spec.partition(":")
+    if name not in SCENARIOS:
+        raise ValueError(f"unknown scenario {name!r}; choose from {', '.join(sorted(SCENARIOS))}")
+    kwargs = {}
+    for item in filter(None, params.split(",")):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"bad scenario parameter {item!r} in {spec!r}")
+        kwargs[key.strip()] = float(value)
+    return SCENARIOS[name](base_rate, **kwargs)
+
+
+class ScenarioStream:
+    """Base traffic at ``rate`` with the scenarios applied, generated window by window.
+
+    Base arrivals use time rescaling: arrivals of a unit-rate process (Poisson
+    or evenly spaced) are mapped through the inverse of the integrated rate,
+    so any rate_multiplier shape stays vectorized.
+    """
+
+    def __init__(self, scenarios, rate=1.0, seed=None, poisson=False, anomaly_ratio=0.1, chunk=CHUNK):
+        self.scenarios = list(scenarios)
+        self.rate = float(rate)
+        self.poisson = poisson
+        self.anomaly_ratio = anomaly_ratio
+        self.window = chunk / self.rate
+        self.rng = np.random.default_rng(seed)
+        self.labels = BASE_LABELS + [s.name for s in self.scenarios]
+        self._carry = 0.0  # operational time of the next evenly spaced arrival
+
+    def _base_offsets(self, t0, t1):
+        grid = np.linspace(t0, t1, 1025)
+        intensity = np.full(grid.shape, self.rate)
+        for scenario in self.scenarios:
+            factor = scenario.rate_multiplier(grid)
+            if factor is not None:
+                intensity = intensity * np.maximum(factor, 0.0)
+        cumulative = np.concatenate([[0.0], np.cumsum((intensity[1:] + intensity[:-1]) * 0.5 * np.diff(grid))])
+        total = cumulative[-1]
+        if self.poisson:
+            ops = np.sort(self.rng.uniform(0.0, total, self.rng.poisson(total)))
+        else:
+            ops = np.arange(self._carry, total, 1.0)
+            self._carry = (ops[-1] + 1.0 - total) if len(ops) else self._carry - total
+        return np.interp(ops, cumulative, grid)
+
+    def window_columns(self, t0, t1):
+        """(offsets, columns) of everything arriving in [t0, t1), in arrival order."""
+        offsets = self._base_offsets(t0, t1)
+        columns = generate_columns(len(offsets), self.rng, self.anomaly_ratio)
+        columns["scenario"] = columns["anomaly"].astype(np.int64)  # normal / slow_response
+        for label, scenario in enumerate(self.scenarios, start=len(BASE_LABELS)):
+            scenario.modify(offsets, columns, label)
+
+        parts = [(offsets, columns)]
+        for label, scenario in enumerate(self.scenarios, start=len(BASE_LABELS)):
+            extra = scenario.overlay(t0, t1, self.rng)
+            if extra is not None and len(extra[0]):
+                extra_offsets, extra_columns = extra
+                extra_columns["scenario"] = np.full(len(extra_offsets), label)
+                parts.append((extra_offsets, extra_columns))
+        if len(parts) == 1:
+            return offsets, columns
+
+        offsets = np.concatenate([p[0] for p in parts])
+        order = np.argsort(offsets, kind="stable")
+        merged = {key: np.concatenate([p[1][key] for p in parts])[order] for key in columns}
+        return offsets[order], merged
+
+    def chunks(self, base, count=None, duration=None):
+        """Yield (offsets, lines) like simulator.generate_chunks, until ``count`` events or ``duration`` seconds."""
+        done = 0
+        t0 = 0.0
+        while (count is None or done < count) and (duration is None or t0 < duration):
+            t1 = t0 + self.window if duration is None else min(t0 + self.window, duration)
+            offsets, columns = self.window_columns(t0, t1)
+            t0 = t1
+            if count is not None and done + len(offsets) > count:
+                keep = count - done
+                offsets = offsets[:keep]
+                columns = {key: value[:keep] for key, value in columns.items()}
+            if not len(offsets):
+                continue
+            stamps = base + (offsets * 1e6).astype("timedelta64[us]")
+            lines = format_lines(columns, np.datetime_as_string(stamps, unit="us").tolist(), self.labels)
+            yield offsets, lines
+            done += len(offsets)
@@ -1,10 +1,45 @@
+"""Synthetic event generator.
+
+    python data_simulator/simulator.py                                   # one event per second
+    python data_simulator/simulator.py --seed 7 --rate 5000 --poisson    # open-loop Poisson arrivals
+    python data_simulator/simulator.py --seed 7 --count 5000000 --bulk --start 2024-01-01T00:00:00 > events.ndjson
+    python data_simulator/simulator.py --rate 2000 --count 100000 --sink http://localhost:8000 \\
+        --concurrency 32 --batch-size 50
+    python data_simulator/simulator.py --seed 7 --rate 1000 --duration 600 --bulk \\
+        --scenario diurnal:period=600 --scenario burst:at=60,duration=5,factor=100
+
+
+Events are generated in NumPy chunks; with ``--seed`` and ``--start`` the
+output is byte-for-byte reproducible. ``--scenario`` (repeatable) mixes in
+the traffic patterns of data_simulator/scenarios.py and adds a ``scenario``
+field naming the pattern behind each event. ``--sink`` posts to /ingest (or
+/ingest/batch with --batch-size > 1) through the pooled client in
+api/client.py and prints throughput and latency percentiles to stderr.
+"""
+import argparse
+import asyncio
+import json
+import os
 import random
+import sys
 import time
-import json
 from datetime import datetime
 
+import numpy as np
+
+if __package__ in (None, ""):
+    # allow `python data_simulator/simulator.py` as well as `python -m data_simulator.simulator`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 EVENT_TYPES = ["login_success", "login_failed", "api_access", "password_change"]
 
+# "ip_prefix" column values index into this list
+IP_PREFIXES = ["192.168.1.", "10.0.0.", "203.0.113.", "172.16.0."]
+
+# events generated per NumPy pass
+CHUNK = 65536
+
+
 def generate_normal_event():
     return {
         "timestamp": datetime.utcnow().isoformat(),
@@ -25,23 +60,232 @@ def generate_anomaly_event():
         "anomaly": True
     }
 
-def run_simulator():
-    print("\nEvent Simulator Running...")
-    print("Press CTRL + C to stop.\n")
 
-    try:
+def generate_columns(n, rng, anomaly_ratio=0.1):
+    """n events as NumPy columns, with the distributions of the two generators above."""
+    anomaly = rng.random(n) < anomaly_ratio
+    return {
+        "user": rng.integers(1, 21, n),
+        "event_type": rng.integers(0, len(EVENT_TYPES), n),
+        "response_time_ms": np.where(anomaly, rng.integers(800, 2001, n), rng.integers(50, 301, n)),
+        "ip_prefix": anomaly.astype(np.int64),  # 10.0.0.x for anomalies
+        "ip_octet": rng.integers(1, 256, n),
+        "anomaly": anomaly,
+    }
+
+
+def arrival_offsets(n, rate, rng, poisson=False, after=0.0):
+    """Seconds since the start for the next n arrivals, following the last one at ``after``."""
+    if poisson:
+        gaps = rng.exponential(1.0 / rate, n)
+    else:
+        gaps = np.full(n, 1.0 / rate)
+    return after + np.cumsum(gaps)
+
+
+def format_lines(columns, timestamps, scenario_names=None):
+    """NDJSON lines (bytes, no newline) matching json.dumps() of the dict generators.
+
+    With ``scenario_names`` a ``scenario`` field is appended, looked up from
+    the "scenario" column.
+    """
+    names = [json.dumps(t) for t in EVENT_TYPES]
+    rows = zip(
+        timestamps,
+        columns["user"].tolist(),
+        columns["event_type"].tolist(),
+        columns["response_time_ms"].tolist(),
+        columns["ip_prefix"].tolist(),
+        columns["ip_octet"].tolist(),
+        columns["anomaly"].tolist(),
+    )
+    lines = [
+        f'{{"timestamp": "{ts}", "user": "user_{u}", "event_type": {names[et]}, '
+        f'"response_time_ms": {rt}, "ip": "{IP_PREFIXES[p]}{o}", "anomaly": {"true" if a else "false"}'
+        for ts, u, et, rt, p, o, a in rows
+    ]
+    if scenario_names is None:
+        return [(line + "}").encode() for line in lines]
+    labels = [f', "scenario": {json.dumps(name)}}}' for name in scenario_names]
+    return [(line + labels[s]).encode() for line, s in zip(lines, columns["scenario"].tolist())]
+
+
+def generate_chunks(count=None, rate=1.0, seed=None, poisson=False, anomaly_ratio=0.1, start=None, chunk=CHUNK):
+    """Yield (offsets, lines) chunks: arrival times in seconds since ``start`` and NDJSON lines.
+
+    ``count`` None means forever. Timestamps are ``start`` (default: now, UTC)
+    plus the arrival offsets, so the stream has the requested rate even when
+    it is written faster than real time.
+    """
+    rng = np.random.default_rng(seed)
+    base = np.datetime64(start or datetime.utcnow().isoformat(), "us")
+    done = 0
+    last = 0.0
+    while count is None or done < count:
+        n = chunk if count is None else min(chunk, count - done)
+        offsets = arrival_offsets(n, rate, rng, poisson, last)
+        last = float(offsets[-1])
+        stamps = base + (offsets * 1e6).astype("timedelta64[us]")
+        lines = format_lines(generate_columns(n, rng, anomaly_ratio), np.datetime_as_string(stamps, unit="us").tolist())
+        yield offsets, lines
+        done += n
+
+
+def paced(chunks, t0):
+    """Yield groups of (offset, line) as their arrival time comes (open loop).
+
+    Arrivals are scheduled from ``t0`` up front; a slow consumer makes the
+    next groups bigger instead of shifting the schedule.
+    """
+    for offsets, lines in chunks:
+        i = 0
+        n = len(lines)
+        while i < n:
+            now = time.perf_counter() - t0
+            if offsets[i] > now:
+                time.sleep(min(offsets[i] - now, 0.05))
+                continue
+            j = int(np.searchsorted(offsets, now, side="right"))
+            yield offsets[i:j], lines[i:j]
+            i = j
+
+
+def write_ndjson(chunks, out, pace=True):
+    t0 = time.perf_counter()
+    groups = paced(chunks, t0) if pace else chunks
+    for _, lines in groups:
+        out.write(b"\n".join(lines) + b"\n")
+        if pace:
+            out.flush()
+    out.flush()
+
+
+def percentiles_ms(latencies):
+    if not latencies:
+        return {}
+    arr = np.asarray(latencies) * 1e3
+    out = {f"p{q}": round(float(np.percentile(arr, q)), 3) for q in (50, 90, 99)}
+    out["max"] = round(float(arr.max()), 3)
+    return out
+
+
+async def drive_http(chunks, url, concurrency=8, batch_size=1, pace=True, timeout=30.0):
+    """POST the events to ``url`` from ``concurrency`` workers sharing one connection pool.
+
+    When paced, each request's latency is measured from its scheduled send
+    time, so time spent queued behind a slow server is counted (no
+    coordinated omission). Returns a summary dict.
+    """
+    import aiohttp
+
+    from api.client import RETRY_STATUSES, IngestClient
+
+    path = "/ingest/batch" if batch_size > 1 else "/ingest"
+    queue = asyncio.Queue(maxsize=concurrency * 4)
+    latencies = []
+    stats = {"requests": 0, "events": 0, "errors": 0, "throttled": 0}
+    t0 = time.perf_counter()
+
+    async def worker(client):
         while True:
-            # 90% normal, 10% anomaly
-            if random.random() < 0.9:
-                event = generate_normal_event()
-            else:
-                event = generate_anomaly_event()
+            item = await queue.get()
+            if item is None:
+                return
+            scheduled, body, n = item
+            start = scheduled if scheduled is not None else time.perf_counter()
+            try:
+                status, _ = await client.post(path, body)
+                if status >= 400:
+                    stats["errors"] += 1
+                if status in RETRY_STATUSES:
+                    stats["throttled"] += 1  # backpressure (429/503), not retried
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                stats["errors"] += 1
+            latencies.append(time.perf_counter() - start)
+            stats["requests"] += 1
+            stats["events"] += n
+
+    # no retries and no Idempotency-Key: each request is measured once, as the server answered it
+    async with IngestClient(url, concurrency, timeout, retries=0, idempotency=False) as client:
+        workers = [asyncio.create_task(worker(client)) for _ in range(concurrency)]
+        for offsets, lines in chunks:
+            for i in range(0, len(lines), batch_size):
+                group = lines[i:i + batch_size]
+                scheduled = None
+                if pace:
+                    scheduled = t0 + float(offsets[i + len(group) - 1])
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                body = b"[" + b",".join(group) + b"]" if batch_size > 1 else group[0]
+                await queue.put((scheduled, body, len(group)))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "endpoint": client.base_url + path,
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "elapsed_s": round(elapsed, 3),
+        **stats,
+        "events_per_s": round(stats["events"] / elapsed, 1),
+        "requests_per_s": round(stats["requests"] / elapsed, 1),
+        "latency_ms": percentiles_ms(latencies),
+    }
+
+
+def run_simulator(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic security events as NDJSON.")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible output")
+    parser.add_argument("--rate", type=float, default=1.0, help="events per second (default: 1)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival gaps instead of fixed ones")
+    parser.add_argument("--count", type=int, default=None, help="stop after this many events (default: run forever)")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds of event time")
+    parser.add_argument("--anomaly-ratio", type=float, default=0.1)
+    parser.add_argument("--start", default=None, help="ISO timestamp of the first arrival (default: now, UTC)")
+    parser.add_argument("--bulk", action="store_true", help="write as fast as possible instead of in real time")
+    parser.add_argument(
+        "--scenario", action="append", default=[], metavar="NAME:K=V,...",
+        help="traffic pattern from data_simulator/scenarios.py (repeatable)",
+    )
+    parser.add_argument("--sink", default=None, help="API base URL to POST the events to instead of stdout")
+    parser.add_argument("--concurrency", type=int, default=8, help="sink: parallel connections")
+    parser.add_argument("--batch-size", type=int, default=1, help="sink: events per request (>1 uses /ingest/batch)")
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
 
-            print(json.dumps(event))
-            time.sleep(1)
+    if args.scenario or args.duration is not None:
+        from data_simulator.scenarios import ScenarioStream, parse_scenario
 
+        try:
+            scenarios = [parse_scenario(spec, args.rate) for spec in args.scenario]
+        except (TypeError, ValueError) as e:
+            parser.error(str(e))
+        stream = ScenarioStream(scenarios, args.rate, args.seed, args.poisson, args.anomaly_ratio)
+        base = np.datetime64(args.start or datetime.utcnow().isoformat(), "us")
+        chunks = stream.chunks(base, args.count, args.duration)
+    else:
+        chunks = generate_chunks(args.count, args.rate, args.seed, args.poisson, args.anomaly_ratio, args.start)
+    if args.sink:
+        report = asyncio.run(
+            drive_http(chunks, args.sink, args.concurrency, max(1, args.batch_size), pace=not args.bulk)
+        )
+        print(json.dumps(report), file=sys.stderr)
+        return
+
+    if not args.bulk:
+        print("\nEvent Simulator Running...", file=sys.stderr)
+        print("Press CTRL + C to stop.\n", file=sys.stderr)
+    try:
+        write_ndjson(chunks, sys.stdout.buffer, pace=not args.bulk)
     except KeyboardInterrupt:
-        print("\n Simulator Stopped")
+        print("\n Simulator Stopped", file=sys.stderr)
+    except BrokenPipeError:
+        # downstream (e.g. the detector) went away
+        pass
 
 if __name__ == "__main__":
     run_simulator()
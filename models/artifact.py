@@ -0,0 +1,133 @@
+# models/artifact.py
+import os
+import pickle
+import sys
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+from models.encoder import SimpleEncoder
+from models.scorer import CompiledForest
+
+# v2 adds the compiled forest arrays and stores the sklearn model as a lazily
+# unpickled byte array; v1 files (model pickled inline) still load
+ARTIFACT_VERSION = 2
+
+# decision_function output is mapped onto 0..1 using these bounds
+DEFAULT_SCORE_MIN = -0.5
+DEFAULT_SCORE_MAX = 0.5
+
+
+class ModelArtifact:
+    """Everything needed to score events without refitting.
+
+    Holds the fitted IsolationForest, the encoder vocabularies it was trained
+    with and the constants used to normalize decision_function scores.
+
+    On disk the forest is also stored as CompiledForest arrays. Loaded with
+    ``mmap=True`` those arrays stay memory-mapped from the file, so every
+    process scoring from the same artifact shares one copy in the page cache,
+    and the sklearn object is only unpickled if ``.model`` is used.
+    """
+
+    def __init__(self, model, user_map, event_map, score_min=DEFAULT_SCORE_MIN,
+                 score_max=DEFAULT_SCORE_MAX, trained_at=None, n_rows=None, compiled=None,
+                 feature_names=None, training_rows=None):
+        # either a fitted model or the pickled bytes of one (see .model)
+        self._model = model
+        self._compiled = compiled
+        self.user_map = dict(user_map)
+        self.event_map = dict(event_map)
+        self.score_min = float(score_min)
+        self.score_max = float(score_max)
+        self.trained_at = trained_at or datetime.now(timezone.utc).isoformat()
+        self.n_rows = n_rows
+        # model input columns: the encoder's, plus models.features ones if trained with them
+        self.feature_names = list(feature_names or SimpleEncoder.FEATURE_NAMES)
+        # encoded training matrix, if saved; the "hst" engine is fitted on it
+        self.training_rows = training_rows
+
+    @property
+    def stream_features(self):
+        """True if the model expects the rolling per-entity features appended."""
+        return len(self.feature_names) > len(SimpleEncoder.FEATURE_NAMES)
+
+    @property
+    def model(self):
+        """The sklearn IsolationForest (unpickled on first use)."""
+        if isinstance(self._model, np.ndarray):
+            self._model = pickle.loads(memoryview(self._model))
+        return self._model
+
+    @property
+    def compiled(self):
+        """CompiledForest for the model, built from the saved arrays when present."""
+        if self._compiled is None:
+            self._compiled = CompiledForest.from_sklearn(self.model)
+        return self._compiled
+
+    @classmethod
+    def from_encoder(cls, model, encoder, **kwargs):
+        return cls(model, encoder.user_map, encoder.event_map, **kwargs)
+
+    def restore_encoder(self, encoder):
+        """Load the saved vocabularies into a SimpleEncoder instance."""
+        return encoder.load_maps(self.user_map, self.event_map)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        model_bytes = pickle.dumps(self.model, protocol=pickle.HIGHEST_PROTOCOL)
+        payload = {
+            "version": ARTIFACT_VERSION,
+            # raw bytes in a numpy array, so joblib memory-maps it like the rest
+            "model_pickle": np.frombuffer(model_bytes, dtype=np.uint8),
+            "compiled": {k: np.asarray(v) for k, v in self.compiled.arrays().items()},
+            "user_map": self.user_map,
+            "event_map": self.event_map,
+            "score_min": self.score_min,
+            "score_max": self.score_max,
+            "trained_at": self.trained_at,
+            "n_rows": self.n_rows,
+            "feature_names": self.feature_names,
+        }
+        if self.training_rows is not None:
+            payload["training_rows"] = np.asarray(self.training_rows, dtype=np.float64)
+        # write next to the target and rename, so a reader never sees half a file
+        tmp_path = f"{path}.tmp"
+        # uncompressed on purpose: joblib can only memory-map raw arrays
+        joblib.dump(payload, tmp_path, compress=0)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Read an artifact; numpy arrays are memory-mapped when ``mmap`` is set."""
+        payload = joblib.load(path, mmap_mode="r" if mmap else None)
+        if not isinstance(payload, dict) or payload.get("version") not in (1, ARTIFACT_VERSION):
+            raise ValueError(f"{path}: unsupported model artifact format")
+        compiled = payload.get("compiled")
+        return cls(
+            payload["model"] if payload["version"] == 1 else payload["model_pickle"],
+            payload["user_map"],
+            payload["event_map"],
+            score_min=payload["score_min"],
+            score_max=payload["score_max"],
+            trained_at=payload["trained_at"],
+            n_rows=payload.get("n_rows"),
+            feature_names=payload.get("feature_names"),
+            compiled=CompiledForest.from_arrays(compiled) if compiled is not None else None,
+            training_rows=payload.get("training_rows"),
+        )
+
+
+def try_load(path, mmap=True):
+    """Return the artifact at ``path``, or None (with a note on stderr) if unusable."""
+    if not path or not os.path.exists(path):
+        print(f"No model artifact at {path}; fitting a fresh model.", file=sys.stderr)
+        return None
+    try:
+        return ModelArtifact.load(path, mmap=mmap)
+    except Exception as e:
+        print(f"Could not load model artifact {path} ({e}); fitting a fresh model.", file=sys.stderr)
+        return None
@@ -0,0 +1,38 @@
+# models/codec.py
+"""JSON helpers for the hot paths; use orjson when it is installed.
+
+``dumps`` returns compact UTF-8 bytes, the same bytes as
+``json.dumps(obj, separators=(",", ":"), ensure_ascii=False)`` (which is what
+FastAPI/Starlette send). Anything orjson refuses falls back to the stdlib.
+One known difference: orjson writes NaN/Infinity floats as null.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib path gives the same results
+    orjson = None
+
+HAVE_ORJSON = orjson is not None
+
+
+def loads(data):
+    """Parse JSON from bytes or str; raises ValueError on invalid input."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN/Infinity literals and other stdlib-only inputs
+            pass
+    return json.loads(data)
+
+
+def dumps(obj):
+    """Serialize ``obj`` to compact JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. integers above 64 bits; let the stdlib have a go
+            pass
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -1,66 +1,25 @@
 # models/detector.py
+import argparse
+import os
+import select
 import sys
 import json
+import time
 import numpy as np
-from sklearn.ensemble import IsolationForest
-
-# Simple encoder for categorical fields on the fly
-class SimpleEncoder:
-    def __init__(self):
-        self.user_map = {}
-        self.event_map = {}
-        self.next_user = 1
-        self.next_event = 1
-
-    def encode(self, event):
-        # user -> numeric id
-        u = event.get("user", "user_0")
-        if u not in self.user_map:
-            self.user_map[u] = self.next_user
-            self.next_user += 1
-        user_id = self.user_map[u]
-
-        # event_type -> numeric id
-        e = event.get("event_type", "unknown")
-        if e not in self.event_map:
-            self.event_map[e] = self.next_event
-            self.next_event += 1
-        event_id = self.event_map[e]
-
-        # use last octet of ip as numeric proxy
-        ip = event.get("ip", "0.0.0.0")
-        try:
-            last_octet = int(ip.strip().split(".")[-1])
-        except Exception:
-            last_octet = 0
-
-        # response_time as int
-        try:
-            resp = int(event.get("response_time_ms", 0))
-        except Exception:
-            resp = 0
-
-        return [user_id, event_id, last_octet, resp]
-
-
-def build_initial_training_data(n=300):
-    """Create a synthetic 'normal' dataset for training the IsolationForest."""
-    import random
-    rows = []
-    for _ in range(n):
-        user = f"user_{random.randint(1, 20)}"
-        event_type = random.choice(["login_success", "api_access", "password_change"])
-        ip = f"192.168.1.{random.randint(1, 240)}"
-        response_time = random.randint(50, 400)
-        rows.append(
-            {
-                "user": user,
-                "event_type": event_type,
-                "ip": ip,
-                "response_time_ms": response_time,
-            }
-        )
-    return rows
+
+if __package__ in (None, ""):
+    # allow `python models/detector.py` as well as `python -m models.detector`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from models import codec
+from models.artifact import try_load
+from models.encoder import SimpleEncoder
+from models.engines import ENGINES, build_engine
+from models.features import FeatureEngine
+from models.quantiles import ScoreThresholds
+from models.sink import EventSink
+from models.train import train_artifact
 
 
 def safe_json_dump(obj):
@@ -82,62 +41,218 @@ def safe_json_dump(obj):
     return json.dumps(safe)
 
 
-def main():
-    encoder = SimpleEncoder()
+def dump_event(event):
+    """Serialize one annotated event (use safe fallback)."""
+    try:
+        return json.dumps(event)
+    except TypeError:
+        return safe_json_dump(event)
+
+
+def dump_event_fast(event):
+    """Compact JSON bytes for one annotated event via models.codec (use safe fallback)."""
+    try:
+        return codec.dumps(event)
+    except TypeError:
+        return safe_json_dump(event).encode()
+
+
+def annotate_batch(scorer, encoder, events, score_min, score_max, features=None, thresholds=None):
+    """Score a list of event dicts as one matrix and return annotated copies.
+
+    ``features`` is the FeatureEngine to append rolling per-entity columns with,
+    for models trained with them; ``thresholds`` a ScoreThresholds for live
+    percentile cut-offs instead of the static ones.
+    """
+    X = encoder.encode_many(events)
+    if features is not None:
+        # events count at their own timestamps; time.time() only for those without one
+        X = np.hstack([X, features.transform_many(events, time.time())])
+    # higher is more normal, < 0 = anomaly; a streaming engine also learns the batch
+    learn = getattr(scorer, "score_and_learn", None)
+    scores = learn(X) if learn is not None else scorer.decision_function(X)
+    if thresholds is not None:
+        anomaly_scores, flags = thresholds.score(scores, score_min, score_max)
+    else:
+        # approximate scaling (clamp to 0..1)
+        anomaly_scores = np.clip((scores - score_min) / (score_max - score_min), 0.0, 1.0)
+        flags = scores < 0
+    out = []
+    for event, anomaly_flag, anomaly_score in zip(events, flags.tolist(), anomaly_scores.tolist()):
+        event_out = event.copy()
+        event_out["anomaly_score"] = round(anomaly_score, 4)
+        event_out["anomaly_flag"] = anomaly_flag
+        out.append(event_out)
+    return out
+
+
+# bytes requested from stdin per read in streaming mode
+READ_CHUNK = 1 << 16
+
+
+def stream_events(score_batch, batch_size, max_latency_ms, fast_json=False, infile=None, outfile=None):
+    """High-throughput loop: chunked stdin reads, batched scoring, one write per batch.
+
+    Complete lines are parsed and scored ``batch_size`` at a time. A partial
+    batch is flushed once its oldest line has waited ``max_latency_ms``.
+    Uses select() on the input, so it needs a POSIX pipe/file/tty.
+    With ``fast_json`` lines are parsed and written through models.codec.
+    """
+    fd = (infile or sys.stdin.buffer).fileno()
+    out = outfile or sys.stdout.buffer
+    max_delay = max(0.0, max_latency_ms) / 1000.0
+    pending = []
+    partial = b""
+    deadline = None
+    eof = False
+    loads = codec.loads if fast_json else json.loads
+
+    def flush(lines):
+        events = []
+        for line in lines:
+            try:
+                event = loads(line)
+            except ValueError:
+                # ignore lines that aren't JSON
+                continue
+            if isinstance(event, dict):
+                events.append(event)
+        if events:
+            if fast_json:
+                data = b"\n".join(dump_event_fast(ev) for ev in score_batch(events))
+            else:
+                data = "\n".join(dump_event(ev) for ev in score_batch(events)).encode()
+            out.write(data + b"\n")
+            out.flush()
+
+    while not eof:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        ready, _, _ = select.select([fd], [], [], timeout)
+        if ready:
+            chunk = os.read(fd, READ_CHUNK)
+            if chunk:
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                pending.extend(line for line in lines if line.strip())
+            else:
+                eof = True
+                if partial.strip():
+                    pending.append(partial)
+                partial = b""
+        if pending and deadline is None:
+            deadline = time.monotonic() + max_delay
+
+        # full batches go out right away; the remainder waits for the timer
+        while len(pending) >= batch_size:
+            flush(pending[:batch_size])
+            del pending[:batch_size]
+        if pending and (eof or time.monotonic() >= deadline):
+            flush(pending)
+            pending = []
+        if not pending:
+            deadline = None
 
-    # 1) Build training data and fit IsolationForest
-    print(
-        "Building synthetic training data and fitting IsolationForest (this may take a sec)...",
-        file=sys.stderr,
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Annotate JSON events read from stdin.")
+    parser.add_argument("--model", default=config.MODEL_PATH, help="model artifact (default: MODEL_PATH)")
+    parser.add_argument(
+        "--batch-size", type=int, default=1,
+        help="events scored per model call; above 1 enables the streaming mode (default: 1, line by line)",
+    )
+    parser.add_argument(
+        "--max-latency-ms", type=float, default=50.0,
+        help="streaming mode: longest an event waits for its batch to fill (default: 50)",
+    )
+    parser.add_argument(
+        "--fast-json", action="store_true", default=config.FAST_CODEC,
+        help="parse/write with models.codec (orjson if installed); output is compact JSON (default: FAST_CODEC)",
+    )
+    parser.add_argument(
+        "--engine", choices=ENGINES, default=config.DETECTOR_ENGINE,
+        help="detector engine; hst keeps learning from the stream (default: DETECTOR_ENGINE)",
+    )
+    parser.add_argument(
+        "--adaptive-thresholds", action=argparse.BooleanOptionalAction, default=config.ADAPTIVE_THRESHOLDS,
+        help="flag below the THRESHOLD_QUANTILE percentile of recent scores (default: ADAPTIVE_THRESHOLDS)",
+    )
+    parser.add_argument(
+        "--sink", default=config.SINK_DIR, metavar="DIR",
+        help="also write annotated events to rotating segment files in DIR (default: SINK_DIR)",
     )
-    train_rows = build_initial_training_data(1000)
-    X_train = np.array([encoder.encode(r) for r in train_rows], dtype=float)
-
-    model = IsolationForest(n_estimators=50, contamination=0.02, random_state=42)
-    model.fit(X_train)
-    print(
-        "Model trained on synthetic normal data. Waiting for incoming events on stdin...",
-        file=sys.stderr,
+    parser.add_argument(
+        "--sink-format", choices=["ndjson", "parquet"], default=config.SINK_FORMAT,
+        help="segment format for --sink (default: SINK_FORMAT)",
     )
+    args = parser.parse_args(argv)
+
+    encoder = SimpleEncoder()
+
+    # 1) Load the trained artifact, or build training data and fit IsolationForest
+    artifact = try_load(args.model)
+    if artifact is not None:
+        print(f"Loaded model artifact {args.model}. Waiting for incoming events on stdin...", file=sys.stderr)
+    else:
+        print(
+            "Building synthetic training data and fitting IsolationForest (this may take a sec)...",
+            file=sys.stderr,
+        )
+        artifact = train_artifact(1000, 50)
+        print(
+            "Model trained on synthetic normal data. Waiting for incoming events on stdin...",
+            file=sys.stderr,
+        )
+    artifact.restore_encoder(encoder)
+    scorer, score_min, score_max = build_engine(args.engine, artifact, encoder)
+    features = FeatureEngine() if artifact.stream_features else None
+
+    # offline runs must not lose events, so the sink blocks instead of dropping when it falls behind
+    sink = EventSink(
+        args.sink,
+        args.sink_format,
+        max_segment_bytes=int(config.SINK_SEGMENT_MB * (1 << 20)),
+        max_segment_seconds=config.SINK_SEGMENT_S,
+        flush_interval=config.SINK_FLUSH_INTERVAL_S,
+        max_buffer=config.SINK_BUFFER_EVENTS,
+        fsync=config.SINK_FSYNC,
+        block=True,
+    ).start() if args.sink else None
+
+    thresholds = ScoreThresholds(
+        config.SCORE_SKETCH_K, config.SCORE_SKETCH_WINDOW, config.THRESHOLD_QUANTILE, config.THRESHOLD_MIN_SAMPLES,
+    ) if args.adaptive_thresholds else None
+
+    def score_batch(events):
+        out = annotate_batch(scorer, encoder, events, score_min, score_max, features, thresholds)
+        if sink is not None:
+            sink.submit(out)
+        return out
 
-    # 2) Read JSON events from stdin line-by-line
     try:
+        if args.batch_size > 1 and os.name != "nt":
+            # 2) Stream JSON events from stdin in chunks, scored in batches
+            stream_events(score_batch, args.batch_size, args.max_latency_ms, fast_json=args.fast_json)
+            return
+
+        # 2) Read JSON events from stdin line-by-line
         for line in sys.stdin:
             line = line.strip()
             if not line:
                 continue
             try:
-                event = json.loads(line)
+                event = codec.loads(line) if args.fast_json else json.loads(line)
             except json.JSONDecodeError:
                 # ignore lines that aren't JSON
                 continue
 
             # encode and predict
-            x = np.array(encoder.encode(event), dtype=float).reshape(1, -1)
-            score = model.decision_function(x)[0]  # higher is more normal
-            pred = model.predict(x)[0]  # 1 = normal, -1 = anomaly
+            event_out = score_batch([event])[0]
 
-            # convert to native python floats / bools
-            try:
-                raw_score = float(score)
-            except Exception:
-                raw_score = float(np.asarray(score).item())
-
-            # approximate scaling (clamp to 0..1)
-            anomaly_score = (raw_score - (-0.5)) / (0.5 - (-0.5))
-            anomaly_score = max(0.0, min(1.0, float(anomaly_score)))
-
-            anomaly_flag = bool(pred == -1)
-
-            event_out = event.copy()
-            event_out["anomaly_score"] = round(anomaly_score, 4)
-            event_out["anomaly_flag"] = anomaly_flag
-
-            # print annotated JSON to stdout (use safe fallback)
-            try:
-                print(json.dumps(event_out), flush=True)
-            except TypeError:
-                print(safe_json_dump(event_out), flush=True)
+            # print annotated JSON to stdout
+            if args.fast_json:
+                print(dump_event_fast(event_out).decode(), flush=True)
+            else:
+                print(dump_event(event_out), flush=True)
 
     except KeyboardInterrupt:
         print("\nDetector stopped by user.", file=sys.stderr)
@@ -146,6 +261,11 @@ def main():
         print("Broken pipe (simulator ended). Exiting.", file=sys.stderr)
     except Exception as e:
         print(f"Unhandled error: {e}", file=sys.stderr)
+    finally:
+        if sink is not None:
+            sink.stop()
+            print(f"Event sink: {sink.stats()}", file=sys.stderr)
+        print(f"Encoder vocabularies: {encoder.stats()}", file=sys.stderr)
 
 
 if __name__ == "__main__":
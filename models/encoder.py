@@ -0,0 +1,207 @@
+# models/encoder.py
+"""Categorical/numeric encoding of events, shared by the API and the detector."""
+import threading
+import zlib
+
+import numpy as np
+
+import config
+
+
+def _hash(value, seed=0):
+    # crc32 rather than hash(): stable across processes and PYTHONHASHSEED
+    return zlib.crc32(str(value).encode("utf-8", "surrogatepass"), seed)
+
+
+class Vocabulary:
+    """Bounded value -> integer id map.
+
+    Ids ``1..capacity`` belong to known values. Once the vocabulary is full,
+    new values are counted in a small count-min sketch and share one of
+    ``n_buckets`` hashed fallback ids (``capacity + 1`` onwards). A fallback
+    value that turns out to be frequent takes over the slot of the least-used
+    known value (an eviction), so memory stays fixed however many distinct
+    values the stream carries.
+
+    Lookups of known values are a single dict read and take no lock; only
+    inserting or evicting takes ``_lock``. Hit counts are bumped without the
+    lock too, so they are approximate under concurrency, which is fine for
+    choosing eviction victims.
+    """
+
+    __slots__ = (
+        "capacity", "n_buckets", "ids", "values", "hits", "sketch", "sketch_adds",
+        "next_id", "overflows", "evictions", "_victim", "_lock",
+    )
+
+    SKETCH_DEPTH = 4
+    SKETCH_WIDTH = 2048
+
+    def __init__(self, capacity, n_buckets=64):
+        self.capacity = max(1, int(capacity))
+        self.n_buckets = max(1, int(n_buckets))
+        self.ids = {}
+        self.values = [None] * (self.capacity + 1)  # slot id -> value, index 0 unused
+        self.hits = np.zeros(self.capacity + 1, dtype=np.int64)
+        self.sketch = None  # allocated the first time the vocabulary overflows
+        self.sketch_adds = 0
+        self.next_id = 1
+        self.overflows = 0
+        self.evictions = 0
+        self._victim = 0  # cached least-used slot; 0 = unknown (hits[0] stays 0)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, value):
+        idx = self.ids.get(value)
+        if idx is None:
+            return self._miss(value)
+        self.hits[idx] += 1
+        return idx
+
+    def lookup_many(self, values):
+        get = self.ids.get
+        ids = [get(v) for v in values]
+        for i, idx in enumerate(ids):
+            if idx is None:
+                ids[i] = self._miss(values[i])
+        out = np.fromiter(ids, dtype=np.int64, count=len(ids))
+        np.add.at(self.hits, out[out <= self.capacity], 1)
+        return out
+
+    def _miss(self, value):
+        with self._lock:
+            idx = self.ids.get(value)
+            if idx is not None:
+                return idx
+            if self.next_id <= self.capacity:
+                idx = self.next_id
+                self.next_id += 1
+                self._assign(idx, value, 1)
+                return idx
+
+            count = self._sketch_add(value)
+            # other slots' hits only grow, so the cached victim stays the
+            # minimum and the O(capacity) scan runs only when it may lose
+            if count > 1 and count > self.hits[self._victim]:
+                self._victim = victim = int(np.argmin(self.hits[1:])) + 1
+                if count > self.hits[victim]:
+                    del self.ids[self.values[victim]]
+                    self._assign(victim, value, count)
+                    self.evictions += 1
+                    self._victim = 0
+                    return victim
+            self.overflows += 1
+            return self.capacity + 1 + _hash(value) % self.n_buckets
+
+    def _assign(self, idx, value, hits):
+        self.values[idx] = value
+        self.hits[idx] = hits
+        self.ids[value] = idx
+
+    def _sketch_add(self, value):
+        if self.sketch is None:
+            self.sketch = np.zeros((self.SKETCH_DEPTH, self.SKETCH_WIDTH), dtype=np.int64)
+        cols = [_hash(value, row) % self.SKETCH_WIDTH for row in range(self.SKETCH_DEPTH)]
+        rows = np.arange(self.SKETCH_DEPTH)
+        self.sketch[rows, cols] += 1
+        self.sketch_adds += 1
+        if self.sketch_adds >= 10 * self.SKETCH_WIDTH:
+            # age both sketch and hit counts so old popularity fades
+            self.sketch >>= 1
+            self.hits >>= 1
+            self.sketch_adds = 0
+        return int(self.sketch[rows, cols].min())
+
+    def mapping(self):
+        """Snapshot of the known value -> id map."""
+        return dict(self.ids)
+
+    def load(self, mapping):
+        """Replace the contents with ``mapping`` (e.g. from a model artifact)."""
+        with self._lock:
+            self.ids = {}
+            self.values = [None] * (self.capacity + 1)
+            self.hits[:] = 0
+            self.next_id = 1
+            self._victim = 0
+            for value, idx in sorted(mapping.items(), key=lambda kv: kv[1]):
+                if 1 <= idx <= self.capacity:
+                    self._assign(idx, value, 0)
+                    self.next_id = max(self.next_id, idx + 1)
+
+    def stats(self):
+        return {
+            "size": len(self.ids),
+            "capacity": self.capacity,
+            "overflows": self.overflows,
+            "evictions": self.evictions,
+        }
+
+
+def last_octet(ip):
+    # use last octet of ip as numeric proxy
+    try:
+        return int(ip.strip().split(".")[-1])
+    except Exception:
+        return 0
+
+
+def response_time(value):
+    # response_time as int
+    try:
+        return int(value)
+    except Exception:
+        return 0
+
+
+class SimpleEncoder:
+    """Encode an event as [user_id, event_type_id, last ip octet, response time]."""
+
+    __slots__ = ("users", "event_types")
+
+    FEATURE_NAMES = ["user_id", "event_type_id", "ip_last_octet", "response_time_ms"]
+
+    def __init__(self, max_users=None, max_event_types=None, n_buckets=None):
+        n_buckets = config.ENCODER_OVERFLOW_BUCKETS if n_buckets is None else n_buckets
+        self.users = Vocabulary(config.ENCODER_MAX_USERS if max_users is None else max_users, n_buckets)
+        self.event_types = Vocabulary(
+            config.ENCODER_MAX_EVENT_TYPES if max_event_types is None else max_event_types, n_buckets
+        )
+
+    @property
+    def user_map(self):
+        return self.users.mapping()
+
+    @property
+    def event_map(self):
+        return self.event_types.mapping()
+
+    def load_maps(self, user_map, event_map):
+        self.users.load(user_map)
+        self.event_types.load(event_map)
+        return self
+
+    def encode(self, event):
+        return [
+            self.users.lookup(event.get("user", "user_0")),
+            self.event_types.lookup(event.get("event_type", "unknown")),
+            last_octet(event.get("ip", "0.0.0.0")),
+            response_time(event.get("response_time_ms", 0)),
+        ]
+
+    def encode_many(self, events):
+        """Encode a list of events into an (n, 4) float matrix."""
+        X = np.empty((len(events), 4), dtype=float)
+        if not events:
+            return X
+        X[:, 0] = self.users.lookup_many([ev.get("user", "user_0") for ev in events])
+        X[:, 1] = self.event_types.lookup_many([ev.get("event_type", "unknown") for ev in events])
+        X[:, 2] = [last_octet(ev.get("ip", "0.0.0.0")) for ev in events]
+        X[:, 3] = [response_time(ev.get("response_time_ms", 0)) for ev in events]
+        return X
+
+    def stats(self):
+        return {"users": self.users.stats(), "event_types": self.event_types.stats()}
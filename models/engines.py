@@ -0,0 +1,278 @@
+# models/engines.py
+"""Detector engines behind one interface, selected with DETECTOR_ENGINE.
+
+Every engine scores an encoded matrix like ``IsolationForest.decision_function``
+(higher is more normal, below 0 is an anomaly) and may learn from what it
+scores:
+
+* ``decision_function(X)`` scores without changing the engine.
+* ``learn_many(X)`` updates a streaming engine; a no-op for batch ones.
+* ``score_and_learn(X)`` scores and then learns, in one pass where the
+  engine can. The API and the detector call this on their hot path.
+
+``iforest`` is the batch-fit IsolationForest (compiled or sklearn), only
+updated by background refits. ``hst`` is Half-Space Trees (Tan, Ting & Liu,
+2011), which keeps learning from the stream at a fixed cost per event.
+"""
+import threading
+
+import numpy as np
+
+import config
+
+ENGINES = ("iforest", "hst")
+
+
+class DetectorEngine:
+    streaming = False
+
+    def decision_function(self, X):
+        raise NotImplementedError
+
+    def learn_many(self, X):
+        pass
+
+    def score_and_learn(self, X):
+        scores = self.decision_function(X)
+        self.learn_many(X)
+        return scores
+
+    def nbytes(self):
+        """Estimated memory held by the engine's arrays."""
+        return 0
+
+    def stats(self):
+        return {"engine": self.name, "streaming": self.streaming}
+
+
+class IsolationForestEngine(DetectorEngine):
+    """A fitted IsolationForest or CompiledForest; refitting replaces the whole engine."""
+
+    name = "iforest"
+
+    def __init__(self, model):
+        self.model = model
+
+    def decision_function(self, X):
+        return self.model.decision_function(X)
+
+    def score_and_learn(self, X):
+        return self.model.decision_function(X)
+
+    def nbytes(self):
+        arrays = [v for v in vars(self.model).values() if isinstance(v, np.ndarray)]
+        if arrays:  # CompiledForest
+            return sum(a.nbytes for a in arrays)
+        # sklearn: one feature and threshold per node, plus the tree objects
+        return sum(e.tree_.node_count * 64 + 1024 for e in getattr(self.model, "estimators_", ()))
+
+
+class HalfSpaceTrees(DetectorEngine):
+    """Streaming Half-Space Trees over fixed-size complete binary trees.
+
+    Each tree splits a randomly perturbed copy of the training range in half
+    at every node, on a random feature, down to ``depth``. Nodes count the
+    events that pass through them in two windows of ``window`` events: the
+    reference masses score events, the latest masses learn them, and when
+    ``window`` events have been learned the latest become the reference.
+    An event's mass score sums ``mass * 2**level`` along its path, stopping
+    below a node with fewer than ``size_limit`` reference events; sparse
+    regions score low.
+
+    Trees are flat arrays in heap order (children of node i are 2i+1 and
+    2i+2), so a batch walks every tree at once with one gather per level.
+    Every event ends in a leaf, so only leaf counts are learned (one
+    scatter-add per batch); inner masses and the summed path score of every
+    leaf are rebuilt once per window. Scoring is then one lookup per tree,
+    and time and memory per event stay fixed however long the stream runs.
+
+    Scores map onto IsolationForest's scale: ``score_samples`` lies in
+    [-1, 0] (log2 of the mass score over the window, divided by depth + 1,
+    minus 1). ``offset_`` is set at fit time so that a ``contamination``
+    share of the training rows scores below 0. Masses are kept in units of
+    one window, so the threshold carries over as windows roll.
+    """
+
+    name = "hst"
+    streaming = True
+
+    def __init__(self, n_trees=25, depth=10, window=250, size_limit=None, contamination=0.02,
+                 random_state=None):
+        self.n_trees = max(1, int(n_trees))
+        self.depth = max(1, int(depth))
+        self.window = max(1, int(window))
+        self.size_limit = 0.1 * self.window if size_limit is None else float(size_limit)
+        self.contamination = contamination
+        self.random_state = random_state
+        self.n_internal = (1 << self.depth) - 1
+        self.n_leaves = 1 << self.depth
+        self.windows = 0  # reference windows completed since fit
+        self.learned = 0
+        self._lock = threading.Lock()
+        # flat offset of each tree's first internal node
+        self._internal_base = (np.arange(self.n_trees, dtype=np.intp) * self.n_internal)[None, :]
+        self._child_offset = 1 - self._internal_base
+        # n_leaves = n_internal + 1, so leaf j of tree t moves to t * n_leaves + j
+        self._leaf_offset = np.arange(self.n_trees, dtype=np.intp)[None, :] - self.n_internal
+
+    def fit(self, X):
+        """Build the trees around ``X``'s ranges, take its masses as the reference and calibrate the threshold."""
+        X = np.asarray(X, dtype=np.float64)
+        rng = np.random.default_rng(self.random_state)
+        n_features = X.shape[1]
+        lo, hi = X.min(axis=0), X.max(axis=0)
+        feature = np.empty((self.n_trees, self.n_internal), dtype=np.intp)
+        split = np.empty((self.n_trees, self.n_internal), dtype=np.float64)
+        n_nodes = self.n_internal + self.n_leaves
+        for t in range(self.n_trees):
+            # random work space per tree: centred on a point in range, twice the wider side
+            centre = rng.uniform(lo, hi)
+            half = 2.0 * np.maximum(centre - lo, hi - centre)
+            half[half == 0] = 1.0
+            node_lo = np.empty((n_nodes, n_features))
+            node_hi = np.empty((n_nodes, n_features))
+            node_lo[0], node_hi[0] = centre - half, centre + half
+            dims = rng.integers(0, n_features, self.n_internal)
+            for i in range(self.n_internal):  # parents come before children in heap order
+                q = dims[i]
+                mid = 0.5 * (node_lo[i, q] + node_hi[i, q])
+                feature[t, i] = q
+                split[t, i] = mid
+                for child in (2 * i + 1, 2 * i + 2):
+                    node_lo[child], node_hi[child] = node_lo[i], node_hi[i]
+                node_hi[2 * i + 1, q] = mid
+                node_lo[2 * i + 2, q] = mid
+        self.n_features = n_features
+        self.feature = feature.ravel()
+        self.split = split.ravel()
+
+        # training masses, rescaled to one window
+        counts = np.bincount(self._leaves(X).ravel(), minlength=self.n_trees * self.n_leaves)
+        self._set_reference(counts * (self.window / max(len(X), 1)))
+        self.latest = np.zeros(self.n_trees * self.n_leaves)
+        self.count = 0
+        self.offset_ = 0.0
+        decision = self.decision_function(X)
+        self.offset_ = float(np.percentile(decision, 100.0 * self.contamination))
+        decision = decision - self.offset_
+        # bounds for the 0..1 anomaly_score, like the artifact's score_min/score_max
+        self.score_min = float(min(decision.min(), -1e-6))
+        self.score_max = float(max(decision.max(), 1e-6))
+        return self
+
+    def _set_reference(self, leaf_mass):
+        """Summed path score of every leaf from the reference leaf masses."""
+        levels = [np.asarray(leaf_mass, dtype=np.float64).reshape(self.n_trees, self.n_leaves)]
+        while levels[-1].shape[1] > 1:
+            levels.append(levels[-1][:, 0::2] + levels[-1][:, 1::2])
+        levels.reverse()  # root first
+        score = levels[0].copy()
+        is_open = levels[0] >= self.size_limit
+        for d in range(1, self.depth + 1):
+            # a level counts while every node above it held at least size_limit events
+            parent_open = np.repeat(is_open, 2, axis=1)
+            score = np.repeat(score, 2, axis=1) + parent_open * levels[d] * float(1 << d)
+            is_open = parent_open & (levels[d] >= self.size_limit)
+        # scoring threads read this once per call, so replacing it is safe
+        self.leaf_score = score.ravel()
+
+    def _leaves(self, X):
+        """Flat leaf index for every (row, tree), shape (n_samples, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (n, {self.n_features}), got {X.shape}")
+        flat = X.ravel()
+        row_base = (np.arange(X.shape[0], dtype=np.intp) * self.n_features)[:, None]
+        # flat index t * n_internal + k of node k in tree t; its children are
+        # 2 * flat + 1 - t * n_internal (+1 for the right one)
+        nodes = np.repeat(self._internal_base, X.shape[0], axis=0)
+        for _ in range(self.depth):
+            values = flat.take(row_base + self.feature.take(nodes))
+            nodes = 2 * nodes + self._child_offset + (values > self.split.take(nodes))
+        # nodes now index past the internal ones: leaf j of tree t is t * n_internal + n_internal + j
+        return nodes + self._leaf_offset
+
+    def _score(self, leaves):
+        # the root always holds the whole window, so the ratio is at least 1
+        ratio = np.maximum(self.leaf_score.take(leaves).mean(axis=1) / self.window, 1.0)
+        return np.log2(ratio) / (self.depth + 1) - 1.0
+
+    def score_samples(self, X):
+        return self._score(self._leaves(X))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def _learn(self, leaves):
+        n = len(leaves)
+        with self._lock:
+            start = 0
+            while start < n:
+                take = min(n - start, self.window - self.count)
+                if self.count + take >= self.window and n - start - take >= self.window:
+                    # a later window in this batch completes too and replaces this one
+                    start += take
+                    self.count = 0
+                    self.latest[:] = 0.0
+                    self.windows += 1
+                    continue
+                idx = leaves[start:start + take].ravel()
+                if len(idx) * 4 > len(self.latest):
+                    self.latest += np.bincount(idx, minlength=len(self.latest))
+                else:
+                    np.add.at(self.latest, idx, 1.0)
+                self.count += take
+                start += take
+                if self.count >= self.window:
+                    self._set_reference(self.latest)
+                    self.latest = np.zeros_like(self.latest)
+                    self.count = 0
+                    self.windows += 1
+            self.learned += n
+
+    def learn_many(self, X):
+        self._learn(self._leaves(X))
+
+    def score_and_learn(self, X):
+        leaves = self._leaves(X)
+        scores = self._score(leaves) - self.offset_
+        self._learn(leaves)
+        return scores
+
+    def nbytes(self):
+        return self.feature.nbytes + self.split.nbytes + self.leaf_score.nbytes + self.latest.nbytes
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "trees": self.n_trees,
+            "depth": self.depth,
+            "window": self.window,
+            "windows": self.windows,
+            "learned": self.learned,
+            "in_window": self.count,
+        }
+
+
+def build_engine(name, artifact, encoder=None):
+    """The engine called ``name`` for a loaded artifact; returns (engine, score_min, score_max).
+
+    ``iforest`` scores with the artifact's forest. ``hst`` is fitted on the
+    rows the artifact was trained on, with a fixed seed, so every worker
+    loading the same artifact scores alike. Artifacts saved without their
+    rows fall back to seeded synthetic rows encoded with ``encoder`` (the
+    one restored from the artifact).
+    """
+    if name == "iforest":
+        scorer = artifact.compiled if config.COMPILED_SCORER else artifact.model
+        return IsolationForestEngine(scorer), artifact.score_min, artifact.score_max
+    if name == "hst":
+        X = artifact.training_rows
+        if X is None:
+            from models.train import training_matrix
+
+            X, _ = training_matrix(artifact.n_rows or config.TRAINING_DATA_SIZE, seed=42,
+                                   stream_features=artifact.stream_features, encoder=encoder)
+        engine = HalfSpaceTrees(config.HST_TREES, config.HST_DEPTH, config.HST_WINDOW, random_state=42).fit(X)
+        return engine, engine.score_min, engine.score_max
+    raise ValueError(f"unknown detector engine {name!r}; choose from {', '.join(ENGINES)}")
@@ -0,0 +1,179 @@
+# models/features.py
+"""Rolling per-user and per-IP features computed incrementally as events arrive."""
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+import config
+
+WINDOW = 60  # seconds of per-second counts kept per entity
+
+# EWMA weight of the newest event for the failure ratio and response time stats
+ALPHA = 0.1
+
+ENTITY_FEATURES = ["rate_1s", "rate_5s", "rate_60s", "fail_ratio", "rt_ewma", "rt_std"]
+FEATURE_NAMES = [f"user_{f}" for f in ENTITY_FEATURES] + [f"ip_{f}" for f in ENTITY_FEATURES]
+
+
+def event_second(event, now):
+    """Whole epoch second of the event's timestamp (ISO, UTC if no offset, or epoch
+    seconds), or of ``now`` when it has none or it does not parse."""
+    ts = event.get("timestamp")
+    if not ts:
+        return int(now)
+    if isinstance(ts, (int, float)):
+        return int(ts)
+    try:
+        t = datetime.fromisoformat(ts)
+    except (TypeError, ValueError):
+        return int(now)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return int(t.timestamp())
+
+
+class EntityStats:
+    """O(1)-update rolling statistics for one user or IP.
+
+    Event counts live in a 60-slot ring of per-second buckets with running
+    sums for the 5 s and 60 s windows; advancing the clock clears at most 60
+    slots, so updates cost amortized O(1). Failure ratio and response time
+    mean/variance are exponentially weighted.
+    """
+
+    __slots__ = ("second", "ring", "sum5", "sum60", "fail_ratio", "rt_mean", "rt_var", "last_seen")
+
+    def __init__(self, second):
+        self.second = second
+        self.ring = [0] * WINDOW
+        self.sum5 = 0
+        self.sum60 = 0
+        self.fail_ratio = 0.0
+        self.rt_mean = None
+        self.rt_var = 0.0
+        self.last_seen = second
+
+    def _advance(self, second):
+        gap = second - self.second
+        if gap <= 0:
+            return
+        if gap >= WINDOW:
+            self.ring = [0] * WINDOW
+            self.sum5 = self.sum60 = 0
+        else:
+            ring = self.ring
+            for s in range(self.second + 1, second + 1):
+                # the 5 s window loses second s-5, the 60 s ring reuses slot s
+                self.sum5 -= ring[(s - 5) % WINDOW]
+                self.sum60 -= ring[s % WINDOW]
+                ring[s % WINDOW] = 0
+        self.second = second
+
+    def update(self, second, failed, response_time):
+        second = max(second, self.second)  # late events count towards the current second
+        self._advance(second)
+        self.ring[second % WINDOW] += 1
+        self.sum5 += 1
+        self.sum60 += 1
+        self.last_seen = second
+
+        self.fail_ratio += ALPHA * ((1.0 if failed else 0.0) - self.fail_ratio)
+        if self.rt_mean is None:
+            self.rt_mean = float(response_time)
+        else:
+            diff = response_time - self.rt_mean
+            incr = ALPHA * diff
+            self.rt_mean += incr
+            self.rt_var = (1.0 - ALPHA) * (self.rt_var + diff * incr)
+
+    def features(self):
+        return (
+            self.ring[self.second % WINDOW],
+            self.sum5 / 5.0,
+            self.sum60 / float(WINDOW),
+            self.fail_ratio,
+            self.rt_mean,
+            math.sqrt(self.rt_var),
+        )
+
+
+class FeatureEngine:
+    """Keeps EntityStats per user and per IP and turns events into feature rows.
+
+    Entities idle for ``idle_seconds`` are dropped, and each table holds at
+    most ``max_entities`` (least recently seen go first), so memory is bounded.
+    Time is whole seconds of each event's own timestamp, or of the clock
+    passed in by the caller for events without one; idle entities are
+    swept by the caller's clock.
+    """
+
+    def __init__(self, max_entities=None, idle_seconds=None):
+        self.max_entities = config.FEATURE_MAX_ENTITIES if max_entities is None else max_entities
+        self.idle_seconds = config.FEATURE_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self.users = OrderedDict()
+        self.ips = OrderedDict()
+        self.evictions = 0
+        self._last_sweep = None
+        self._lock = threading.Lock()
+
+    def _touch(self, table, key, second):
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = EntityStats(second)
+            if len(table) > self.max_entities:
+                table.popitem(last=False)
+                self.evictions += 1
+        else:
+            table.move_to_end(key)
+        return stats
+
+    def _sweep(self, second):
+        # tables are ordered by last update, so idle entities sit at the front
+        cutoff = second - self.idle_seconds
+        for table in (self.users, self.ips):
+            while table:
+                stats = next(iter(table.values()))
+                if stats.last_seen >= cutoff:
+                    break
+                table.popitem(last=False)
+                self.evictions += 1
+        self._last_sweep = second
+
+    def transform_many(self, events, now):
+        """Update the rolling stats with ``events`` and return their features.
+
+        Each event counts at its own timestamp, capped at ``now`` plus
+        FEATURE_MAX_SKEW_S; ``now`` stands in for events without one. Events
+        older than the window are scored against the current stats without
+        being counted. Idle sweeps follow ``now``, never event time.
+        """
+        current = int(now)
+        latest = current + config.FEATURE_MAX_SKEW_S
+        oldest = current - WINDOW
+        seconds = [min(event_second(ev, now), latest) for ev in events]
+        rows = []
+        with self._lock:
+            if self._last_sweep is None or current > self._last_sweep:
+                self._sweep(current)
+            for ev, second in zip(events, seconds):
+                failed = ev.get("event_type") == "login_failed"
+                try:
+                    rt = float(ev.get("response_time_ms", 0))
+                except (TypeError, ValueError):
+                    rt = 0.0
+                stale = second < oldest
+                if stale:
+                    second = current
+                user = self._touch(self.users, ev.get("user", "user_0"), second)
+                ip = self._touch(self.ips, ev.get("ip", "0.0.0.0"), second)
+                if not stale:
+                    user.update(second, failed, rt)
+                    ip.update(second, failed, rt)
+                rows.append(user.features() + ip.features())
+        return np.array(rows, dtype=float).reshape(len(events), len(FEATURE_NAMES))
+
+    def stats(self):
+        return {"users": len(self.users), "ips": len(self.ips), "evictions": self.evictions}
@@ -0,0 +1,290 @@
+# models/quantiles.py
+"""Streaming quantiles of anomaly scores with fixed memory.
+
+``KLLSketch`` is a KLL quantile sketch (Karnin, Lang & Liberty, 2016): a
+stack of compactors where level h holds items of weight 2**h. A full level
+is sorted and every other item (random offset) moves up, so about ``k``
+items summarize any number of values with rank error ~1/k, and two
+sketches merge by concatenating their levels. Items arrive in numpy
+batches.
+
+``ScoreThresholds`` keeps sketches of recent decision_function scores and
+turns them into live cut-offs: an event is flagged when its raw score is
+below the ``quantile`` percentile of recent traffic, and its normalized
+score is its percentile rank (0..1, higher is more normal, like the static
+mapping). Lookups go through a sorted, cumulative-weight view rebuilt every
+``refresh_every`` events, so each event costs one binary search, O(log k).
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+class KLLSketch:
+    def __init__(self, k=200, seed=None):
+        self.k = max(8, int(k))
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.retained = 0
+        self._capacities = [self.k]
+        self._max_size = self.k
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self, n_levels):
+        while len(self.levels) < n_levels:
+            self.levels.append(np.empty(0))
+        # top level holds k items, each level below 2/3 of the one above
+        top = len(self.levels) - 1
+        self._capacities = [max(int(np.ceil(self.k * (2.0 / 3.0) ** (top - h))), 2) for h in range(len(self.levels))]
+        self._max_size = sum(self._capacities)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self.retained += len(values)
+        if self.retained >= self._max_size:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold ``other`` into this sketch (other is left unchanged)."""
+        if len(self.levels) < len(other.levels):
+            self._grow(len(other.levels))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self.retained += other.retained
+        self._compress()
+        return self
+
+    def _compress(self):
+        while self.retained >= self._max_size:
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) >= self._capacities[h]:
+                    if h + 1 == len(self.levels):
+                        self._grow(h + 2)
+                    level = np.sort(self.levels[h])
+                    odd = len(level) % 2
+                    # an odd leftover stays behind so the promoted items pair up evenly
+                    promoted = level[self._rng.integers(2):len(level) - odd:2]
+                    self.levels[h] = level[len(level) - odd:]
+                    self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                    self.retained -= len(promoted)
+                    break
+
+    def view(self):
+        """(sorted items, cumulative weights) for quantile and rank lookups."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 1 << h, dtype=np.int64) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        return SketchView(*self.view()).quantile(q)
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["k"])
+        levels = [np.asarray(level, dtype=np.float64) for level in state["levels"]] or [np.empty(0)]
+        sketch._grow(len(levels))
+        sketch.levels = levels
+        sketch.n = int(state["n"])
+        sketch.retained = sum(len(level) for level in levels)
+        return sketch
+
+
+class SketchView:
+    """Immutable lookup tables from a sketch; safe to share between threads."""
+
+    __slots__ = ("items", "cumulative", "count")
+
+    def __init__(self, items, cumulative):
+        self.items = items
+        self.cumulative = cumulative
+        self.count = int(cumulative[-1]) if len(cumulative) else 0
+
+    def quantile(self, q):
+        """Value below which a ``q`` share of the summarized values lie (nan if empty)."""
+        if not self.count:
+            return float("nan")
+        i = np.searchsorted(self.cumulative, np.asarray(q, dtype=np.float64) * self.count, side="left")
+        out = self.items[np.minimum(i, len(self.items) - 1)]
+        return float(out) if np.ndim(out) == 0 else out
+
+    def rank(self, values):
+        """Share of the summarized values at or below each of ``values`` (0..1)."""
+        i = np.searchsorted(self.items, np.asarray(values, dtype=np.float64), side="right")
+        below = np.where(i > 0, self.cumulative[np.maximum(i - 1, 0)], 0)
+        return below / max(self.count, 1)
+
+
+class ScoreThresholds:
+    """Live score percentiles over the last one to two ``window``s of events.
+
+    Scores go into the current sketch; once it has seen ``window`` events it
+    becomes the previous one and a fresh sketch starts, so the view always
+    covers between one and two windows and follows traffic as it drifts.
+    With ``directory`` set, ``sync`` shares this process's sketches with
+    other workers through one JSON file each and merges theirs into the view.
+    """
+
+    def __init__(self, k=200, window=100_000, quantile=0.02, min_samples=1000, adaptive=True,
+                 refresh_every=1000, directory="", peer_ttl=60.0):
+        self.k = k
+        self.window = max(1, int(window))
+        self.quantile = float(quantile)
+        self.min_samples = int(min_samples)
+        self.adaptive = adaptive
+        self.refresh_every = max(1, int(refresh_every))
+        self.directory = directory
+        self.peer_ttl = peer_ttl  # peer files older than this belong to workers that are gone
+        self.current = KLLSketch(k)
+        self.previous = None
+        self.peers = None  # merged sketches of the other workers, refreshed by sync()
+        self.observed = 0
+        self._stale = 0  # events observed since the view was rebuilt
+        self._live = (None, None)  # (SketchView, threshold), swapped as one tuple
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def nbytes(self):
+        """Rough ceiling on the memory of the two sketches (about 3k float64 items
+        each) and the lookup view over them (an item and a cumulative weight per item)."""
+        items = 3 * self.k
+        return 2 * items * 8 + 2 * items * 16
+
+    def score(self, raw, score_min, score_max):
+        """(normalized scores, flags) for raw decision_function ``raw``, then record them.
+
+        Until the view holds ``min_samples`` scores (or with ``adaptive``
+        off) this is the static mapping: flags below 0 and a linear
+        ``score_min``..``score_max`` scale.
+        """
+        view, threshold = self._live
+        if self.adaptive and view is not None and view.count >= self.min_samples:
+            normalized, flags = view.rank(raw), raw < threshold
+        else:
+            normalized = np.clip((raw - score_min) / (score_max - score_min), 0.0, 1.0)
+            flags = raw < 0
+        self.observe(raw)
+        return normalized, flags
+
+    def observe(self, raw):
+        with self._lock:
+            self.current.add_many(raw)
+            self.observed += len(raw)
+            self._stale += len(raw)
+            if self.current.n >= self.window:
+                self.previous, self.current = self.current, KLLSketch(self.k)
+                self._stale = self.refresh_every
+            view = self._live[0]
+            # rebuild early while the view is small, so warm-up ends soon after min_samples
+            if view is None or self._stale >= min(self.refresh_every, view.count):
+                self._rebuild()
+
+    def _merged(self, include_peers=True):
+        merged = KLLSketch(self.k).merge(self.current)
+        if self.previous is not None:
+            merged.merge(self.previous)
+        if include_peers and self.peers is not None:
+            merged.merge(self.peers)
+        return merged
+
+    def _rebuild(self):
+        view = SketchView(*self._merged().view())
+        # readers take the tuple without the lock
+        self._live = (view, view.quantile(self.quantile))
+        self._stale = 0
+
+    # --- sharing between worker processes ---
+
+    def start(self, interval):
+        if self.directory and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="score-sketch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.directory:
+            try:
+                os.remove(self._path(os.getpid()))
+            except OSError:
+                pass
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Score sketch sync failed: {e}", file=sys.stderr)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"scores-{pid}.json")
+
+    def sync(self):
+        """Write this worker's sketch and merge the other workers' recent ones into the view."""
+        with self._lock:
+            state = self._merged(include_peers=False).to_dict()
+        path = self._path(os.getpid())
+        # write next to the target and rename, so a reader never sees half a file
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+        peers = None
+        now = time.time()
+        for other in glob.glob(os.path.join(self.directory, "scores-*.json")):
+            if other == path:
+                continue
+            try:
+                if now - os.path.getmtime(other) > self.peer_ttl:
+                    continue
+                with open(other) as f:
+                    sketch = KLLSketch.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue  # removed or being replaced
+            peers = sketch if peers is None else peers.merge(sketch)
+        with self._lock:
+            self.peers = peers
+            self._rebuild()
+
+    def stats(self, points=(0.001, 0.01, 0.02, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99), sketch=False):
+        with self._lock:
+            merged = self._merged()
+            view, threshold = self._live
+        current = SketchView(*merged.view())
+        out = {
+            "adaptive": self.adaptive,
+            "active": bool(self.adaptive and view is not None and view.count >= self.min_samples),
+            "quantile": self.quantile,
+            "threshold": threshold,
+            "observed": self.observed,
+            "window": self.window,
+            "summarized": current.count,
+            "retained": merged.retained,
+            "peers": self.peers.n if self.peers is not None else 0,
+            "quantiles": {f"p{q * 100:g}": current.quantile(q) for q in points} if current.count else {},
+        }
+        if sketch:
+            out["sketch"] = merged.to_dict()
+        return out
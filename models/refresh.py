@@ -0,0 +1,193 @@
+# models/refresh.py
+"""Background refitting of the IsolationForest on recently scored traffic.
+
+Scored rows are sampled into a fixed-size reservoir; every ``interval``
+seconds a ModelRefresher fits a new forest on that sample in a child process
+and hands the result over as a new ModelBundle. Scoring code reads the
+current bundle once per call, so swapping it is a single assignment and never
+waits on a fit.
+"""
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+import config
+from models.engines import IsolationForestEngine
+from models.scorer import CompiledForest
+
+
+class ModelBundle:
+    """A detector engine (models/engines.py) together with the constants used to normalize its scores."""
+
+    __slots__ = ("scorer", "score_min", "score_max", "version", "trained_at", "n_rows")
+
+    def __init__(self, scorer, score_min, score_max, version=0, trained_at=None, n_rows=None):
+        self.scorer = scorer
+        self.score_min = score_min
+        self.score_max = score_max
+        self.version = version
+        self.trained_at = trained_at or datetime.now(timezone.utc).isoformat()
+        self.n_rows = n_rows
+
+
+class Reservoir:
+    """Uniform sample of at most ``size`` rows from everything passed to add_many().
+
+    Vectorized Algorithm R: row t of the stream replaces a random slot with
+    probability size / (t + 1), so the sample stays uniform over the stream.
+    """
+
+    def __init__(self, size, seed=None):
+        self.size = max(1, int(size))
+        self.rows = None  # allocated on the first add, once the width is known
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.seen, self.size)
+
+    def add_many(self, X):
+        X = np.asarray(X, dtype=float)
+        if not len(X):
+            return
+        with self._lock:
+            if self.rows is None or self.rows.shape[1] != X.shape[1]:
+                # a different feature layout starts a new sample
+                self.rows = np.empty((self.size, X.shape[1]), dtype=float)
+                self.seen = 0
+            start = self.seen
+            fill = max(0, min(len(X), self.size - start))
+            if fill:
+                self.rows[start:start + fill] = X[:fill]
+            if fill < len(X):
+                t = np.arange(start + fill, start + len(X))
+                slots = self._rng.integers(0, t + 1)
+                keep = slots < self.size
+                # fancy assignment applies in order, so later rows win like in the sequential version
+                self.rows[slots[keep]] = X[fill:][keep]
+            self.seen += len(X)
+
+    def snapshot(self):
+        """Copy of the rows sampled so far."""
+        with self._lock:
+            if self.rows is None:
+                return np.empty((0, 0))
+            return self.rows[:len(self)].copy()
+
+    def stats(self):
+        return {"size": self.size, "filled": len(self), "seen": self.seen}
+
+
+def _warm_up():
+    # pay for the sklearn import when the worker starts, not in the first fit
+    import sklearn.ensemble  # noqa: F401
+
+
+def fit_forest(X, n_estimators, random_state=42):
+    """Fit an IsolationForest like models.train does (runs in the child process).
+
+    Returns the model and the fit time, measured without the IPC around it.
+    """
+    from sklearn.ensemble import IsolationForest
+
+    start = time.perf_counter()
+    model = IsolationForest(n_estimators=n_estimators, contamination=0.02, random_state=random_state)
+    model.fit(X)
+    return model, time.perf_counter() - start
+
+
+class ModelRefresher:
+    """Refit on the reservoir every ``interval`` seconds and pass new bundles to ``on_swap``.
+
+    ``current`` is a callable returning the bundle in use; its score bounds
+    carry over to the refitted model. Fits run one at a time in a single
+    spawned worker process, so neither the event loop nor the scoring threads
+    compete with them for the GIL.
+    """
+
+    def __init__(self, reservoir, current, on_swap, interval=None, min_rows=None, n_estimators=None):
+        self.reservoir = reservoir
+        self.current = current
+        self.on_swap = on_swap
+        self.interval = config.RETRAIN_INTERVAL_S if interval is None else interval
+        self.min_rows = config.RETRAIN_MIN_ROWS if min_rows is None else min_rows
+        self.n_estimators = config.MODEL_ESTIMATORS if n_estimators is None else n_estimators
+        self.retrains = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_fit_seconds = None
+        self.total_fit_seconds = 0.0
+        self.last_retrain_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        # spawn, not fork: the parent runs threads (uvicorn, scoring pool)
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        self._executor.submit(_warm_up)
+        self._thread = threading.Thread(target=self._run, name="model-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+        self._executor = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.failures += 1
+                print(f"Model refresh failed: {e}", file=sys.stderr)
+
+    def refresh(self):
+        """Fit on the current sample and swap the result in; returns the new bundle or None."""
+        X = self.reservoir.snapshot()
+        if len(X) < self.min_rows:
+            self.skipped += 1
+            return None
+        model, elapsed = self._executor.submit(fit_forest, X, self.n_estimators).result()
+        if self._stop.is_set():
+            return None
+
+        if config.COMPILED_SCORER:
+            model = CompiledForest.from_sklearn(model)
+        old = self.current()
+        bundle = ModelBundle(IsolationForestEngine(model), old.score_min, old.score_max, version=old.version + 1, n_rows=len(X))
+        self.on_swap(bundle)
+
+        self.retrains += 1
+        self.last_fit_seconds = elapsed
+        self.total_fit_seconds += elapsed
+        self.last_retrain_at = bundle.trained_at
+        return bundle
+
+    def stats(self):
+        return {
+            "interval_s": self.interval,
+            "min_rows": self.min_rows,
+            "retrains": self.retrains,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_fit_seconds": self.last_fit_seconds,
+            "total_fit_seconds": self.total_fit_seconds,
+            "last_retrain_at": self.last_retrain_at,
+            "reservoir": self.reservoir.stats(),
+        }
@@ -0,0 +1,141 @@
+# models/scorer.py
+import numpy as np
+
+# rows traversed together; keeps the (rows x trees) working set cache-sized
+CHUNK_ROWS = 512
+
+
+class CompiledForest:
+    """A fitted IsolationForest flattened into contiguous node arrays.
+
+    All trees live in one set of arrays (feature, threshold, children and the
+    per-node path length adjustment), so a batch is scored by walking
+    every tree at once with a handful of numpy operations per depth level
+    instead of one sklearn call per estimator. ``decision_function`` returns
+    the same float64 values as ``IsolationForest.decision_function``.
+
+    The arrays are used as given (no copies), so they can be memory-mapped
+    from a model artifact and shared between processes.
+    """
+
+    def __init__(self, feature, threshold, children, path_adj, roots, max_depth,
+                 denominator, offset, n_features):
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        # children[2 * node] is the left child, children[2 * node + 1] the right
+        self.children = np.asarray(children)
+        self.path_adj = np.asarray(path_adj)
+        self.roots = np.asarray(roots)
+        self.max_depth = int(max_depth)
+        self.denominator = np.asarray(denominator, dtype=np.float64).reshape(-1)
+        self.offset = float(offset)
+        self.n_features = int(n_features)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Inverse of arrays()."""
+        return cls(**arrays)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        # imported here so loading saved arrays does not pull in sklearn
+        from sklearn.ensemble._iforest import _average_path_length
+
+        n_features = model.n_features_in_
+        subsample_features = model._max_features != n_features
+
+        features, thresholds, children, adjs, roots = [], [], [], [], []
+        base = 0
+        max_depth = 0
+        for est, est_features in zip(model.estimators_, model.estimators_features_):
+            tree = est.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            # the tree was fit on X[:, est_features] only when features were subsampled
+            feature = tree.feature.astype(np.intp)
+            if subsample_features:
+                feature = np.asarray(est_features, dtype=np.intp)[np.where(is_leaf, 0, feature)]
+            # leaves point at themselves, so extra traversal steps are no-ops
+            feature = np.where(is_leaf, 0, feature)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            left = np.where(is_leaf, node_ids, tree.children_left) + base
+            right = np.where(is_leaf, node_ids, tree.children_right) + base
+
+            # number of nodes on the path from the root, as sklearn counts it
+            path_nodes = np.zeros(n_nodes, dtype=np.float64)
+            path_nodes[0] = 1.0
+            for node in range(n_nodes):  # children always come after their parent
+                if not is_leaf[node]:
+                    path_nodes[tree.children_left[node]] = path_nodes[node] + 1.0
+                    path_nodes[tree.children_right[node]] = path_nodes[node] + 1.0
+            adj = path_nodes + _average_path_length(tree.n_node_samples) - 1.0
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.stack([left, right], axis=1).ravel())
+            adjs.append(adj)
+            roots.append(base)
+            base += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        denominator = len(model.estimators_) * _average_path_length([model._max_samples])
+        return cls(
+            np.concatenate(features).astype(np.intp),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(children).astype(np.intp),
+            np.concatenate(adjs),
+            np.asarray(roots, dtype=np.intp),
+            max_depth,
+            denominator,
+            model.offset_,
+            n_features,
+        )
+
+    def arrays(self):
+        """The node arrays plus scalars, e.g. for saving with numpy."""
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "path_adj": self.path_adj,
+            "roots": self.roots,
+            "max_depth": np.asarray(self.max_depth),
+            "denominator": self.denominator,
+            "offset": np.asarray(self.offset),
+            "n_features": np.asarray(self.n_features),
+        }
+
+    def leaves(self, X):
+        """Leaf node index for every (row, tree) pair, shape (n_samples, n_trees)."""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (n, {self.n_features}), got {X.shape}")
+        flat = X.ravel()
+        row_base = (np.arange(X.shape[0], dtype=np.intp) * self.n_features)[:, None]
+        nodes = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            values = flat.take(row_base + self.feature.take(nodes))
+            go_right = ~(values <= self.threshold.take(nodes))
+            nodes = self.children.take(2 * nodes + go_right)
+        return nodes
+
+    def score_samples(self, X):
+        X = np.asarray(X)
+        if X.ndim == 2 and X.shape[0] > CHUNK_ROWS:
+            return np.concatenate(
+                [self.score_samples(X[i:i + CHUNK_ROWS]) for i in range(0, X.shape[0], CHUNK_ROWS)]
+            )
+        adj = self.path_adj[self.leaves(X)]
+        # sklearn adds the trees one at a time; cumsum keeps that summation
+        # order, so the totals match to the last bit
+        depths = np.cumsum(adj, axis=1)[:, -1] if adj.shape[1] else np.zeros(adj.shape[0])
+        scores = 2 ** (
+            -np.divide(depths, self.denominator, out=np.ones_like(depths), where=self.denominator != 0)
+        )
+        return -scores
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset
@@ -0,0 +1,364 @@
+# models/sink.py
+"""Append-only, segmented log of annotated events on disk.
+
+Producers call ``EventSink.submit(events)``, which only appends the batch
+to a bounded in-memory buffer; a background thread serializes the buffer,
+writes it to the open segment and rotates segments by size or age.
+
+Formats:
+
+* ``ndjson`` - gzip-compressed NDJSON. Every flush is appended as its own
+  gzip member, so a segment is readable up to the last completed flush even
+  while it is open or after a crash.
+* ``parquet`` - columnar segments (needs pyarrow), one row group per flush.
+  A Parquet file is only readable once its footer is written, so open
+  segments carry a ``.open`` suffix that is dropped when they are closed.
+
+``fsync`` is ``always`` (after every flush), ``rotate`` (when a segment is
+closed) or ``never`` (left to the OS). ``read_table`` and ``iter_events``
+read closed segments back, Parquet through memory-mapped column scans.
+"""
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from models import codec
+
+# typed Parquet columns; any other keys go into "extra" as a JSON object
+COLUMNS = ["timestamp", "user", "event_type", "response_time_ms", "ip", "anomaly_score", "anomaly_flag"]
+
+INT64_MAX = (1 << 63) - 1
+
+
+def _string(value):
+    return value if type(value) is str else ValueError
+
+
+def _int64(value):
+    return value if type(value) is int and -INT64_MAX - 1 <= value <= INT64_MAX else ValueError
+
+
+def _float(value):
+    return float(value) if type(value) in (int, float) else ValueError
+
+
+def _bool(value):
+    return value if type(value) is bool else ValueError
+
+
+# column value, or ValueError when the event's value does not fit the column type
+# (the detector takes any JSON, e.g. a string response_time_ms); those stay in "extra"
+COERCE = {
+    "timestamp": _string,
+    "user": _string,
+    "event_type": _string,
+    "response_time_ms": _int64,
+    "ip": _string,
+    "anomaly_score": _float,
+    "anomaly_flag": _bool,
+}
+
+SUFFIXES = {"ndjson": ".ndjson.gz", "parquet": ".parquet"}
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("ingested_at", pa.timestamp("us", tz="UTC")),
+        ("timestamp", pa.string()),
+        ("user", pa.string()),
+        ("event_type", pa.string()),
+        ("response_time_ms", pa.int64()),
+        ("ip", pa.string()),
+        ("anomaly_score", pa.float64()),
+        ("anomaly_flag", pa.bool_()),
+        ("extra", pa.string()),
+    ])
+
+
+class NdjsonSegment:
+    def __init__(self, path, compress_level=6):
+        self.path = path
+        self.compress_level = compress_level
+        self.file = open(path, "ab")
+        self.bytes = 0
+
+    def write(self, batches):
+        lines = [codec.dumps(event) for _, events in batches for event in events]
+        data = gzip.compress(b"\n".join(lines) + b"\n", self.compress_level)
+        self.file.write(data)
+        self.file.flush()
+        self.bytes += len(data)
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+        return self.path
+
+
+class ParquetSegment:
+    def __init__(self, path, compress_level=6):
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.schema = _parquet_schema()
+        self.file = open(path + ".open", "wb")
+        self.writer = pq.ParquetWriter(self.file, self.schema, compression="zstd", compression_level=compress_level)
+        self.bytes = 0
+
+    def write(self, batches):
+        import pyarrow as pa
+
+        columns = {name: [] for name in self.schema.names}
+        for received, events in batches:
+            stamp = datetime.fromtimestamp(received, timezone.utc)
+            for event in events:
+                columns["ingested_at"].append(stamp)
+                rest = {k: v for k, v in event.items() if k not in COERCE}
+                for name, coerce in COERCE.items():
+                    value = event.get(name)
+                    if value is not None:
+                        value = coerce(value)
+                        if value is ValueError:
+                            rest[name] = event[name]  # kept as is; iter_events puts it back
+                            value = None
+                    columns[name].append(value)
+                columns["extra"].append(codec.dumps(rest).decode() if rest else None)
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        self.file.flush()
+        self.bytes = self.file.tell()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.writer.close()
+        self.file.flush()
+        os.fsync(self.file.fileno())  # the rename below must not expose a half-written footer
+        self.file.close()
+        os.replace(self.path + ".open", self.path)
+        return self.path
+
+
+SEGMENT_TYPES = {"ndjson": NdjsonSegment, "parquet": ParquetSegment}
+
+
+class EventSink:
+    """Buffered, rotating writer of annotated events; see the module docstring."""
+
+    def __init__(self, directory, fmt="ndjson", max_segment_bytes=64 << 20, max_segment_seconds=300.0,
+                 flush_interval=1.0, max_buffer=100_000, fsync="rotate", block=False, prefix="events",
+                 compress_level=6):
+        if fmt not in SEGMENT_TYPES:
+            raise ValueError(f"unknown sink format {fmt!r}; choose from {', '.join(SEGMENT_TYPES)}")
+        if fsync not in ("always", "rotate", "never"):
+            raise ValueError(f"unknown fsync policy {fsync!r}; choose always, rotate or never")
+        if fmt == "parquet":
+            import pyarrow  # noqa: F401  (fail at startup, not in the flusher)
+        self.directory = directory
+        self.fmt = fmt
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self.flush_interval = flush_interval
+        self.max_buffer = max(1, int(max_buffer))
+        self.fsync = fsync
+        self.block = block  # when the buffer is full: wait for the flusher (True) or drop the batch
+        self.prefix = prefix
+        self.compress_level = compress_level
+
+        self._batches = []  # (received, events)
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self._segment = None
+        self._segment_opened = None
+        self._segment_seq = 0
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.lost = 0  # taken from the buffer but not written because the write failed
+        self.segments_closed = 0
+        self.write_errors = 0
+        self.last_error = None
+        os.makedirs(directory, exist_ok=True)
+
+    # --- producer side ---
+
+    def submit(self, events):
+        """Queue annotated events for writing; returns False if they were dropped."""
+        if not events:
+            return True
+        n = len(events)
+        with self._cond:
+            while self._pending + n > self.max_buffer and self._pending and not self._stop:
+                if not self.block:
+                    self.dropped += n
+                    return False
+                self._cond.notify_all()
+                self._cond.wait()
+            self._batches.append((time.time(), events))
+            self._pending += n
+            self.submitted += n
+            if self._pending * 2 >= self.max_buffer:
+                self._cond.notify_all()  # half full: don't wait for the interval
+        return True
+
+    # --- background flusher ---
+
+    def start(self):
+        if self._thread is None:
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Write out everything buffered and close the open segment."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stop and self._pending * 2 < self.max_buffer:
+                    self._cond.wait(self.flush_interval)
+                batches, self._batches = self._batches, []
+                self._pending = 0
+                stopping = self._stop
+                self._cond.notify_all()  # wake producers blocked on a full buffer
+            try:
+                if batches:
+                    self._write(batches)
+                if stopping or self._segment_due():
+                    self._close_segment()
+            except Exception as e:
+                self.write_errors += 1
+                self.last_error = str(e)
+                print(f"Event sink write failed: {e}", file=sys.stderr)
+                self._end_segment_after_error()
+            if stopping:
+                return
+
+    def _write(self, batches):
+        n = sum(len(events) for _, events in batches)
+        try:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(batches)
+            if self.fsync == "always":
+                self._segment.sync()
+        except Exception:
+            self.lost += n  # already out of the buffer, so submitted = written + dropped + lost + buffered
+            raise
+        self.written += n
+
+    def _segment_due(self):
+        return self._segment is not None and (
+            self._segment.bytes >= self.max_segment_bytes
+            or time.monotonic() - self._segment_opened >= self.max_segment_seconds
+        )
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        name = f"{self.prefix}-{stamp}-{os.getpid()}-{self._segment_seq:06d}{SUFFIXES[self.fmt]}"
+        self._segment = SEGMENT_TYPES[self.fmt](os.path.join(self.directory, name), self.compress_level)
+        self._segment_opened = time.monotonic()
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        segment, self._segment = self._segment, None
+        if self.fsync != "never":
+            segment.sync()
+        segment.close()
+        self.segments_closed += 1
+
+    def _end_segment_after_error(self):
+        # start over in a fresh segment; close this one normally if it still can be,
+        # so a Parquet segment gets its footer and stays readable
+        segment, self._segment = self._segment, None
+        if segment is None:
+            return
+        try:
+            segment.close()
+            self.segments_closed += 1
+        except Exception:
+            try:
+                segment.file.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            buffered = self._pending
+        return {
+            "format": self.fmt,
+            "directory": self.directory,
+            "submitted": self.submitted,
+            "written": self.written,
+            "buffered": buffered,
+            "dropped": self.dropped,
+            "lost": self.lost,
+            "segments_closed": self.segments_closed,
+            "open_segment": self._segment.path if self._segment is not None else None,
+            "write_errors": self.write_errors,
+            "last_error": self.last_error,
+        }
+
+
+# --- readers for replay / retraining ---
+
+def segment_paths(directory, fmt="ndjson", prefix="events"):
+    """Closed segments (plus open NDJSON ones, which are readable) in write order."""
+    paths = glob.glob(os.path.join(directory, f"{prefix}-*{SUFFIXES[fmt]}"))
+    return sorted(paths, key=lambda p: os.path.basename(p).split("-", 1)[1])
+
+
+def iter_events(directory, fmt="ndjson", prefix="events"):
+    """Yield annotated event dicts from every segment, oldest first."""
+    for path in segment_paths(directory, fmt, prefix):
+        if fmt == "parquet":
+            for row in read_table([path]).to_pylist():
+                extra = row.pop("extra")
+                row.pop("ingested_at")
+                if extra:
+                    row.update(json.loads(extra))
+                yield row
+            continue
+        with gzip.open(path, "rb") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield codec.loads(line)
+            except EOFError:
+                pass  # last member cut short by a crash
+
+
+def read_table(paths_or_directory, columns=None, prefix="events"):
+    """One pyarrow Table from Parquet segments, memory-mapped and limited to ``columns``."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    paths = paths_or_directory
+    if isinstance(paths, str):
+        paths = segment_paths(paths, "parquet", prefix)
+    tables = [pq.read_table(path, columns=columns, memory_map=True) for path in paths]
+    if not tables:
+        schema = _parquet_schema()
+        return schema.empty_table() if columns is None else pa.schema([schema.field(c) for c in columns]).empty_table()
+    return pa.concat_tables(tables)